@@ -3,31 +3,79 @@
 Расширенный скрипт для преобразования аудио в текст с поддержкой различных форматов
 """
 
-import whisper
 import os
 import sys
 import argparse
+import glob
+import json
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
 from pydub import AudioSegment
 import tempfile
+import backends
+from audio_io import SAMPLE_RATE, decode_audio
+from checkpoints import checkpoint_for
+from cpu_threads import configure_worker, partition_cores, threads_per_worker
+from language_detect import DETECT_MODEL, detect_language, detection_key
+from long_audio import transcribe_incremental, transcribe_long_audio
+from vad import transcribe_speech_only
+from model_cache import ModelCache
+from result_cache import ResultCache, hash_file, make_key
+from transcript_formats import FORMATS, format_timestamp, write_transcript
+from transcription_daemon import transcribe_via_daemon
+
+SUPPORTED_FORMATS = ['.mp3', '.wav', '.m4a', '.flac', '.aac', '.ogg', '.wma']
+
+# Общий кэш моделей для всех конвертеров процесса
+model_cache = ModelCache(
+    backends.load_model,
+    memory_budget_mb=int(os.environ.get('MODEL_CACHE_BUDGET_MB', 0)),
+    idle_timeout=int(os.environ.get('MODEL_IDLE_TIMEOUT', 0))
+)
 
 class AudioToTextConverter:
-    def __init__(self, model_size="base"):
+    def __init__(self, model_size="base", cache=None, result_cache=None,
+                 long_audio_workers=0, chunk_seconds=600, verbose=True, vad=False,
+                 word_timestamps=False, use_daemon=False, threads=None, resume=False,
+                 checkpoint_seconds=120):
         """Инициализация конвертера"""
         self.model_size = model_size
-        self.model = None
-        self.supported_formats = ['.mp3', '.wav', '.m4a', '.flac', '.aac', '.ogg', '.wma']
+        self.verbose = verbose
+        # Транскрибировать только участки речи, пропуская тишину
+        self.vad = vad
+        # Время каждого слова в сегментах
+        self.word_timestamps = word_timestamps
+        # Отдавать файлы запущенному демону транскрипции (transcription_daemon.py)
+        self.use_daemon = use_daemon
+        # Потоков PyTorch; задается при первой загрузке модели, чтобы
+        # без нее (кэш, демон) не импортировать torch
+        self.threads = threads
+        self.model_cache = cache or model_cache
+        self.result_cache = result_cache
+        # Параллельная обработка длинных записей по кускам (0 - выключено)
+        self.long_audio_workers = long_audio_workers
+        self.chunk_seconds = chunk_seconds
+        # Сохранять контрольные точки каждые checkpoint_seconds секунд записи
+        # и продолжать прерванную транскрипцию с последней из них
+        self.resume = resume
+        self.checkpoint_seconds = checkpoint_seconds
+        self.supported_formats = list(SUPPORTED_FORMATS)
     
     def load_model(self):
-        """Загружает модель Whisper"""
-        if self.model is None:
-            print(f"Загружаем модель Whisper {self.model_size}...")
-            self.model = whisper.load_model(self.model_size)
-            print("Модель загружена успешно!")
+        """Возвращает модель Whisper из кэша, загружая её при необходимости"""
+        if self.threads:
+            configure_worker(self.threads)
+            self.threads = None
+        return self.model_cache.get(self.model_size)
     
     def convert_audio_format(self, input_path, output_path=None):
         """
-        Конвертирует аудио в формат WAV для лучшей совместимости
+        Конвертирует аудио в формат WAV
+        
+        Для транскрипции не требуется: transcribe_audio декодирует файл
+        напрямую через ffmpeg. Метод оставлен для экспорта аудио в WAV.
         
         Args:
             input_path (str): Путь к входному файлу
@@ -63,63 +111,173 @@ class AudioToTextConverter:
             print(f"Ошибка при конвертации аудио: {e}")
             return None
     
-    def transcribe_audio(self, audio_file_path, language=None):
+    def transcribe_audio(self, audio_file_path, language=None, audio=None):
         """
         Преобразует аудиофайл в текст
         
         Args:
             audio_file_path (str): Путь к аудиофайлу
             language (str): Язык аудио (None для автоопределения)
+            audio (np.ndarray): Уже декодированное аудио файла (если None, файл декодируется)
         
         Returns:
             dict: Результат транскрипции с текстом и метаданными
         """
         try:
-            # Загружаем модель если еще не загружена
-            self.load_model()
-            
             # Проверяем существование файла
             if not os.path.exists(audio_file_path):
                 raise FileNotFoundError(f"Файл {audio_file_path} не найден")
             
+            # Проверяем кэш результатов до загрузки модели; тот же ключ
+            # определяет контрольную точку файла
+            cache_key = None
+            if self.result_cache is not None or self.resume:
+                options = {'vad': True} if self.vad else {}
+                if self.word_timestamps:
+                    options['word_timestamps'] = True
+                audio_hash = hash_file(audio_file_path)
+                cache_key = make_key(audio_hash, self.model_size, language, **options)
+            if self.result_cache is not None:
+                cached = self.result_cache.get(cache_key)
+                if cached is not None:
+                    print(f"Результат для {audio_file_path} найден в кэше")
+                    segments = cached.get('segments', [])
+                    return {
+                        'text': cached['text'],
+                        'language': cached.get('language', 'unknown'),
+                        'segments': segments,
+                        # В записях без длительности - по концу последнего сегмента
+                        'duration': cached.get('duration') or max((s['end'] for s in segments), default=0)
+                    }
+                # Язык уже определен (--detect-only) - модель не определяет его повторно
+                if language is None:
+                    detected = self.result_cache.get(detection_key(audio_hash))
+                    if detected is not None:
+                        language = detected['language']
+                        print(f"Язык из кэша определения: {language}")
+            
             print(f"Обрабатываем файл: {audio_file_path}")
             
-            # Определяем нужно ли конвертировать
+            # Проверяем формат файла
             file_ext = Path(audio_file_path).suffix.lower()
-            temp_file = None
-            
-            if file_ext != '.wav':
-                # Конвертируем в WAV для лучшей совместимости
-                temp_file = self.convert_audio_format(audio_file_path)
-                if temp_file is None:
-                    raise Exception("Не удалось конвертировать аудио")
-                audio_path = temp_file
-            else:
-                audio_path = audio_file_path
-            
-            # Транскрибируем аудио
-            print("Выполняем транскрипцию...")
-            result = self.model.transcribe(
-                audio_path,
-                language=language,
-                verbose=True
-            )
+            if file_ext not in self.supported_formats:
+                raise ValueError(f"Неподдерживаемый формат: {file_ext}")
             
-            # Очищаем временный файл если создавали
-            if temp_file and os.path.exists(temp_file):
-                os.unlink(temp_file)
+            # Запущенный демон уже держит модель в памяти (но не сохраняет контрольные точки)
+            transcription = None
+            if self.use_daemon and not self.resume and audio is None and self.long_audio_workers <= 1:
+                transcription = transcribe_via_daemon(
+                    audio_file_path,
+                    self.model_size,
+                    language=language,
+                    vad=self.vad,
+                    word_timestamps=self.word_timestamps
+                )
+                if transcription is not None:
+                    print("Транскрипция выполнена демоном")
             
-            return {
-                'text': result['text'],
-                'language': result.get('language', 'unknown'),
-                'segments': result.get('segments', []),
-                'duration': result.get('duration', 0)
-            }
+            if transcription is None:
+                # Декодируем сразу в 16 кГц моно массив, без промежуточного WAV
+                if audio is None:
+                    audio = decode_audio(audio_file_path)
+                
+                # Транскрибируем аудио
+                print("Выполняем транскрипцию...")
+                duration = len(audio) / SAMPLE_RATE
+                checkpoint = checkpoint_for(cache_key) if self.resume else None
+                if self.vad:
+                    result = transcribe_speech_only(
+                        lambda speech, **options: self._transcribe(speech, checkpoint=checkpoint, **options),
+                        audio,
+                        language=language
+                    )
+                else:
+                    result = self._transcribe(audio, language=language, checkpoint=checkpoint)
+                if checkpoint is not None:
+                    checkpoint.remove()
+                
+                transcription = {
+                    'text': result['text'],
+                    'language': result.get('language', 'unknown'),
+                    'segments': result.get('segments', []),
+                    'duration': duration
+                }
+            if self.result_cache is not None:
+                self.result_cache.put(cache_key, transcription)
+            return transcription
             
         except Exception as e:
             print(f"Ошибка при обработке файла: {e}")
             return None
     
+    def detect_language(self, audio_file_path, audio=None):
+        """
+        Определяет язык по первым 30 секундам самой маленькой модели
+        
+        Args:
+            audio_file_path (str): Путь к аудиофайлу
+            audio (np.ndarray): Уже декодированное аудио файла
+        
+        Returns:
+            dict: {'language': код, 'probabilities': {код: вероятность}} или None
+        """
+        try:
+            if not os.path.exists(audio_file_path):
+                raise FileNotFoundError(f"Файл {audio_file_path} не найден")
+            
+            key = None
+            if self.result_cache is not None:
+                key = detection_key(hash_file(audio_file_path))
+                cached = self.result_cache.get(key)
+                if cached is not None:
+                    return cached
+            
+            if audio is None:
+                audio = decode_audio(audio_file_path)
+            detected = detect_language(self.model_cache.get(DETECT_MODEL), audio)
+            if key is not None:
+                self.result_cache.put(key, detected)
+            return detected
+        
+        except Exception as e:
+            print(f"Ошибка при определении языка: {e}")
+            return None
+    
+    def _transcribe(self, audio, language=None, checkpoint=None):
+        """
+        Транскрибирует массив аудио: длинные записи по кускам в нескольких процессах
+        
+        С контрольной точкой после каждого куска сохраняется готовая часть; без
+        параллельной обработки запись идет последовательно кусками по checkpoint_seconds.
+        """
+        if self.long_audio_workers > 1 and len(audio) / SAMPLE_RATE >= 2 * self.chunk_seconds:
+            return transcribe_long_audio(
+                audio,
+                self.model_size,
+                workers=self.long_audio_workers,
+                chunk_seconds=self.chunk_seconds,
+                language=language,
+                checkpoint=checkpoint,
+                word_timestamps=self.word_timestamps
+            )
+        # Загружаем модель если еще не загружена
+        model = self.load_model()
+        if checkpoint is not None and len(audio) / SAMPLE_RATE > self.checkpoint_seconds:
+            return transcribe_incremental(
+                lambda chunk, **options: model.transcribe(chunk, verbose=self.verbose, **options),
+                audio,
+                self.checkpoint_seconds,
+                checkpoint=checkpoint,
+                language=language,
+                word_timestamps=self.word_timestamps
+            )
+        return model.transcribe(
+            audio,
+            language=language,
+            verbose=self.verbose,
+            word_timestamps=self.word_timestamps
+        )
+    
     def save_transcription(self, result, output_file, format='txt'):
         """
         Сохраняет результат транскрипции в файл
@@ -127,69 +285,296 @@ class AudioToTextConverter:
         Args:
             result (dict): Результат транскрипции
             output_file (str): Путь к выходному файлу
-            format (str): Формат файла ('txt', 'srt', 'vtt')
+            format (str): Формат файла ('txt', 'srt', 'vtt', 'tsv', 'json')
         """
         try:
-            if format == 'txt':
-                with open(output_file, 'w', encoding='utf-8') as f:
-                    f.write(result['text'])
-            
-            elif format == 'srt':
-                # Создаем SRT субтитры
-                with open(output_file, 'w', encoding='utf-8') as f:
-                    for i, segment in enumerate(result['segments'], 1):
-                        start_time = self._format_time(segment['start'])
-                        end_time = self._format_time(segment['end'])
-                        f.write(f"{i}\n")
-                        f.write(f"{start_time} --> {end_time}\n")
-                        f.write(f"{segment['text'].strip()}\n\n")
-            
-            elif format == 'vtt':
-                # Создаем WebVTT субтитры
-                with open(output_file, 'w', encoding='utf-8') as f:
-                    f.write("WEBVTT\n\n")
-                    for segment in result['segments']:
-                        start_time = self._format_time_vtt(segment['start'])
-                        end_time = self._format_time_vtt(segment['end'])
-                        f.write(f"{start_time} --> {end_time}\n")
-                        f.write(f"{segment['text'].strip()}\n\n")
-            
+            write_transcript(result, output_file, format)
             print(f"Транскрипция сохранена в: {output_file}")
             
         except Exception as e:
             print(f"Ошибка при сохранении файла: {e}")
+
+def collect_input_files(inputs, supported_formats=SUPPORTED_FORMATS):
+    """
+    Раскрывает входные пути в список аудиофайлов
+    
+    Args:
+        inputs (list): Файлы, папки (обходятся рекурсивно), glob-шаблоны
+            и файлы-манифесты в виде @список.txt (по одному пути в строке)
+        supported_formats (list): Допустимые расширения
+    
+    Returns:
+        list: Уникальные пути к файлам в порядке появления
+    """
+    files = []
+    for item in inputs:
+        if item.startswith('@'):
+            manifest = Path(item[1:])
+            with open(manifest, 'r', encoding='utf-8') as f:
+                lines = [line.strip() for line in f]
+            entries = [
+                str(manifest.parent / line) if not os.path.isabs(line) else line
+                for line in lines if line and not line.startswith('#')
+            ]
+            files.extend(collect_input_files(entries, supported_formats))
+        elif os.path.isdir(item):
+            files.extend(
+                str(path) for path in sorted(Path(item).rglob('*'))
+                if path.is_file() and path.suffix.lower() in supported_formats
+            )
+        elif glob.has_magic(item):
+            files.extend(
+                path for path in sorted(glob.glob(item, recursive=True))
+                if os.path.isfile(path) and Path(path).suffix.lower() in supported_formats
+            )
+        else:
+            files.append(item)
+    return list(dict.fromkeys(files))
+
+def batch_output_path(input_file, output_dir, format):
+    """Путь к файлу результата для входного файла в пакетном режиме"""
+    input_path = Path(input_file)
+    directory = Path(output_dir) if output_dir else input_path.parent
+    return str(directory / f"{input_path.stem}_transcription.{format}")
+
+def _decode_for_batch(input_file):
+    """Декодирует файл в фоновом потоке; ошибку вернет transcribe_audio"""
+    try:
+        return decode_audio(input_file)
+    except Exception:
+        return None
+
+def run_batch_shard(files, options):
+    """
+    Обрабатывает список файлов одним конвертером (одна загрузка модели)
+    
+    Декодирование следующего файла идет в фоновом потоке одновременно с
+    инференсом текущего.
+    
+    Returns:
+        list: Записи о каждом файле для итогового отчета
+    """
+    configure_worker(options['threads'], options.get('cpus'))
+    converter = AudioToTextConverter(
+        options['model'],
+        result_cache=None if options['no_cache'] else ResultCache(),
+        long_audio_workers=options['long_audio_workers'],
+        chunk_seconds=options['chunk_seconds'],
+        verbose=None,
+        vad=options['vad'],
+        word_timestamps=options.get('word_timestamps', False),
+        resume=options.get('resume', False)
+    )
+    records = []
+    with ThreadPoolExecutor(max_workers=1) as decoder:
+        pending = decoder.submit(_decode_for_batch, files[0]) if files else None
+        for i, input_file in enumerate(files):
+            audio = pending.result()
+            pending = decoder.submit(_decode_for_batch, files[i + 1]) if i + 1 < len(files) else None
+            
+            output_file = batch_output_path(input_file, options['output_dir'], options['format'])
+            started = time.time()
+            result = converter.transcribe_audio(input_file, options['language'], audio=audio)
+            elapsed = time.time() - started
+            del audio
+            
+            record = {'file': input_file, 'output': output_file, 'seconds': round(elapsed, 3)}
+            if result:
+                converter.save_transcription(result, output_file, options['format'])
+                duration = result['duration']
+                record.update({
+                    'status': 'done',
+                    'language': result['language'],
+                    'duration': round(duration, 3),
+                    'real_time_factor': round(elapsed / duration, 4) if duration else None
+                })
+            else:
+                record['status'] = 'failed'
+            records.append(record)
+            print(f"[{record['status']}] {input_file} ({elapsed:.1f} с)")
+    return records
+
+def _split_into_shards(files, count):
+    """Распределяет файлы по процессам, выравнивая суммарный размер"""
+    shards = [[] for _ in range(count)]
+    loads = [0] * count
+    for path in sorted(files, key=lambda p: os.path.getsize(p) if os.path.exists(p) else 0, reverse=True):
+        i = loads.index(min(loads))
+        shards[i].append(path)
+        loads[i] += os.path.getsize(path) if os.path.exists(path) else 0
+    return [shard for shard in shards if shard]
+
+def run_batch(inputs, options, workers=1, overwrite=False, summary_path=None,
+              threads=None, pin_cpus=False):
+    """
+    Пакетная транскрипция файлов, папок, шаблонов и манифестов
+    
+    Args:
+        inputs (list): Входные пути (см. collect_input_files)
+        options (dict): model, language, format, output_dir, no_cache,
+            long_audio_workers, chunk_seconds, vad
+        workers (int): Количество процессов, каждый со своей моделью
+        overwrite (bool): Обрабатывать файлы, для которых результат уже есть
+        summary_path (str): Куда сохранить отчет о запуске (JSON)
+        threads (int): Потоков PyTorch на процесс (None - ядра поровну между процессами)
+        pin_cpus (bool): Привязать каждый процесс к своим ядрам
+    
+    Returns:
+        dict: Итоговый отчет
+    """
+    files = collect_input_files(inputs)
+    records = []
+    todo = []
+    for input_file in files:
+        output_file = batch_output_path(input_file, options['output_dir'], options['format'])
+        if not overwrite and os.path.exists(output_file):
+            records.append({'file': input_file, 'output': output_file, 'status': 'skipped'})
+        else:
+            todo.append(input_file)
+    
+    print(f"Файлов найдено: {len(files)}, к обработке: {len(todo)}, пропущено: {len(files) - len(todo)}")
+    if options['output_dir']:
+        os.makedirs(options['output_dir'], exist_ok=True)
     
-    def _format_time(self, seconds):
-        """Форматирует время для SRT"""
-        hours = int(seconds // 3600)
-        minutes = int((seconds % 3600) // 60)
-        secs = int(seconds % 60)
-        millisecs = int((seconds % 1) * 1000)
-        return f"{hours:02d}:{minutes:02d}:{secs:02d},{millisecs:03d}"
-    
-    def _format_time_vtt(self, seconds):
-        """Форматирует время для WebVTT"""
-        hours = int(seconds // 3600)
-        minutes = int((seconds % 3600) // 60)
-        secs = int(seconds % 60)
-        millisecs = int((seconds % 1) * 1000)
-        return f"{hours:02d}:{minutes:02d}:{secs:02d}.{millisecs:03d}"
+    started = time.time()
+    if todo:
+        shards = _split_into_shards(todo, max(1, workers))
+        # Каждый процесс получает свою долю ядер
+        shard_options = [
+            dict(options, threads=len(cpus), cpus=cpus if pin_cpus else None)
+            for cpus in partition_cores(len(shards), threads)
+        ]
+        if len(shards) == 1:
+            records.extend(run_batch_shard(shards[0], shard_options[0]))
+        else:
+            context = multiprocessing.get_context('spawn')
+            with ProcessPoolExecutor(max_workers=len(shards), mp_context=context) as executor:
+                for shard_records in executor.map(run_batch_shard, shards, shard_options):
+                    records.extend(shard_records)
+    wall_time = time.time() - started
+    
+    done = [r for r in records if r['status'] == 'done']
+    audio_seconds = sum(r.get('duration', 0) for r in done)
+    summary = {
+        'model': options['model'],
+        'workers': workers,
+        'threads_per_worker': threads_per_worker(workers, threads),
+        'files_total': len(files),
+        'files_done': len(done),
+        'files_skipped': sum(1 for r in records if r['status'] == 'skipped'),
+        'files_failed': sum(1 for r in records if r['status'] == 'failed'),
+        'audio_seconds': round(audio_seconds, 3),
+        'wall_seconds': round(wall_time, 3),
+        'real_time_factor': round(wall_time / audio_seconds, 4) if audio_seconds else None,
+        'files': records
+    }
+    
+    print()
+    print("=== Итоги пакетной обработки ===")
+    print(f"Обработано: {summary['files_done']}, пропущено: {summary['files_skipped']}, "
+          f"ошибок: {summary['files_failed']}")
+    print(f"Аудио: {audio_seconds:.1f} с, время: {wall_time:.1f} с, "
+          f"RTF: {summary['real_time_factor']}")
+    
+    if summary_path:
+        with open(summary_path, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+        print(f"Отчет сохранен в: {summary_path}")
+    return summary
 
 def main():
     parser = argparse.ArgumentParser(description='Преобразователь аудио в текст')
-    parser.add_argument('input_file', help='Путь к аудиофайлу')
+    parser.add_argument('input_file', nargs='+',
+                       help='Аудиофайл; несколько файлов, папки, glob-шаблоны или @манифест '
+                            'включают пакетный режим')
     parser.add_argument('-m', '--model', default='base', 
                        choices=['tiny', 'base', 'small', 'medium', 'large'],
                        help='Размер модели Whisper')
+    parser.add_argument('--backend', default=backends.DEFAULT_BACKEND, choices=list(backends.BACKENDS),
+                       help='Бэкенд инференса: fp32 (обычный) или int8 (квантованный, в 2-4 раза '
+                            'быстрее на CPU, немного менее точный)')
     parser.add_argument('-l', '--language', help='Язык аудио (например: ru, en, es)')
     parser.add_argument('-o', '--output', help='Путь к выходному файлу')
     parser.add_argument('-f', '--format', default='txt', 
-                       choices=['txt', 'srt', 'vtt'],
+                       choices=list(FORMATS),
                        help='Формат выходного файла')
+    parser.add_argument('--word-timestamps', action='store_true',
+                       help='Время каждого слова (сохраняется в формате json)')
     parser.add_argument('--show-segments', action='store_true',
                        help='Показать сегменты с временными метками')
+    parser.add_argument('--no-cache', action='store_true',
+                       help='Не использовать кэш результатов')
+    parser.add_argument('--no-daemon', action='store_true',
+                       help='Не использовать запущенный демон транскрипции, загрузить модель в процессе')
+    parser.add_argument('--long-audio-workers', type=int, default=0,
+                       help='Процессов для параллельной обработки длинных записей по кускам')
+    parser.add_argument('--chunk-seconds', type=int, default=600,
+                       help='Примерная длина куска длинной записи в секундах')
+    parser.add_argument('--resume', action='store_true',
+                       help='Сохранять контрольные точки и продолжать прерванную транскрипцию '
+                            'с последней из них')
+    parser.add_argument('--detect-only', action='store_true',
+                       help='Только определить язык (по первым 30 с, модель tiny)')
+    parser.add_argument('--vad', action='store_true',
+                       help='Транскрибировать только участки речи, пропуская тишину')
+    parser.add_argument('--output-dir', help='Папка для результатов пакетного режима')
+    parser.add_argument('--workers', type=int, default=1,
+                       help='Количество процессов в пакетном режиме')
+    parser.add_argument('--threads', type=int, default=0,
+                       help='Потоков PyTorch на процесс (по умолчанию ядра делятся поровну '
+                            'между процессами --workers)')
+    parser.add_argument('--pin-cpus', action='store_true',
+                       help='Привязать каждый процесс пакетного режима к своим ядрам')
+    parser.add_argument('--overwrite', action='store_true',
+                       help='В пакетном режиме обрабатывать файлы с уже готовым результатом')
+    parser.add_argument('--summary', help='Путь к JSON-отчету пакетного режима '
+                                         '(по умолчанию batch_summary.json)')
     
     args = parser.parse_args()
+    if args.backend != backends.DEFAULT_BACKEND:
+        args.model = f'{args.model}-{args.backend}'
+    
+    inputs = args.input_file
+    if args.detect_only:
+        converter = AudioToTextConverter(result_cache=None if args.no_cache else ResultCache())
+        failed = False
+        for input_file in collect_input_files(inputs):
+            detected = converter.detect_language(input_file)
+            if detected is None:
+                failed = True
+                continue
+            probabilities = ', '.join(f"{language}: {p:.2f}" for language, p in detected['probabilities'].items())
+            print(f"{input_file}: {detected['language']} ({probabilities})")
+        sys.exit(1 if failed else 0)
+    
+    if len(inputs) > 1 or not os.path.isfile(inputs[0]):
+        print("=== Пакетный режим ===")
+        print(f"Модель: {args.model}")
+        print(f"Процессов: {args.workers}")
+        print()
+        summary_path = args.summary or os.path.join(args.output_dir or '.', 'batch_summary.json')
+        summary = run_batch(
+            inputs,
+            {
+                'model': args.model,
+                'language': args.language,
+                'format': args.format,
+                'output_dir': args.output_dir,
+                'no_cache': args.no_cache,
+                'long_audio_workers': args.long_audio_workers,
+                'chunk_seconds': args.chunk_seconds,
+                'vad': args.vad,
+                'word_timestamps': args.word_timestamps,
+                'resume': args.resume
+            },
+            workers=args.workers,
+            overwrite=args.overwrite,
+            summary_path=summary_path,
+            threads=args.threads,
+            pin_cpus=args.pin_cpus
+        )
+        sys.exit(1 if summary['files_failed'] else 0)
+    args.input_file = inputs[0]
     
     print("=== Расширенный преобразователь аудио в текст ===")
     print(f"Входной файл: {args.input_file}")
@@ -199,7 +584,17 @@ def main():
     print()
     
     # Создаем конвертер
-    converter = AudioToTextConverter(args.model)
+    converter = AudioToTextConverter(
+        args.model,
+        result_cache=None if args.no_cache else ResultCache(),
+        long_audio_workers=args.long_audio_workers,
+        chunk_seconds=args.chunk_seconds,
+        vad=args.vad,
+        word_timestamps=args.word_timestamps,
+        use_daemon=not args.no_daemon,
+        resume=args.resume,
+        threads=threads_per_worker(1, args.threads)
+    )
     
     # Выполняем транскрипцию
     result = converter.transcribe_audio(args.input_file, args.language)
@@ -217,8 +612,8 @@ def main():
         if args.show_segments:
             print("=== Сегменты с временными метками ===")
             for i, segment in enumerate(result['segments'], 1):
-                start_time = converter._format_time(segment['start'])
-                end_time = converter._format_time(segment['end'])
+                start_time = format_timestamp(segment['start'])
+                end_time = format_timestamp(segment['end'])
                 print(f"{i}. [{start_time} - {end_time}] {segment['text'].strip()}")
             print()
         
@@ -3,173 +3,1146 @@
 Веб-приложение для преобразования аудио в текст
 """
 
-from flask import Flask, request, render_template, jsonify, send_file
-import whisper
+from flask import Flask, Response, g, request, render_template, jsonify
 import os
 import tempfile
+from werkzeug.exceptions import RequestEntityTooLarge
 from werkzeug.utils import secure_filename
+from werkzeug.wsgi import get_input_stream
+import hashlib
+import json
+import shutil
+import sqlite3
+import threading
+import time
 import uuid
-from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+import numpy as np
+from job_queue import JobQueue, QueueFullError, TranscriptionJob
+from language_detect import DETECT_MODEL, DecodedAudioCache, detect_language, detection_key, first_window_mel
+import backends
+from audio_io import (SAMPLE_RATE, SEEKABLE_FORMATS, AudioDecodeError, AudioTooLongError, StreamingDecoder,
+                      decode_audio)
+from batching import BatchScheduler
+from checkpoints import DEFAULT_CHECKPOINT_DIR, JobManifests
+from cpu_threads import configure_worker, threads_per_worker
+from long_audio import transcribe_incremental, transcribe_long_audio
+from metrics import MetricsRegistry, StageTimer
+from model_cache import ModelCache
+from model_server import ModelServer, parse_replicas
+from result_cache import CHUNK_SIZE, ResultCache, make_key, save_and_hash
+from result_store import DEFAULT_DB_PATH, compact_segments, create_result_store
+from search_index import DEFAULT_INDEX_PATH, SearchIndex
+from streaming import StreamingSessions
+from transcript_formats import FORMATS, RenderedCache, render, transcript_etag
+from vad import transcribe_speech_only
 
 app = Flask(__name__)
 app.config['MAX_CONTENT_LENGTH'] = 100 * 1024 * 1024  # 100MB max file size
+# Лимит для потоковой загрузки /upload/stream: тело не буферизуется, поэтому он может быть больше
+app.config['MAX_STREAM_CONTENT_LENGTH'] = int(os.environ.get('MAX_STREAM_CONTENT_LENGTH', 2 * 1024 ** 3))
+# Наибольшая длина записи в секундах после декодирования (0 - без ограничения):
+# несколько мегабайт сжатого аудио могут развернуться в десятки гигабайт отсчетов
+app.config['MAX_DECODED_SECONDS'] = float(os.environ.get('MAX_DECODED_SECONDS', 6 * 3600))
+# Количество параллельных транскрипций и размер очереди ожидания
+app.config['TRANSCRIPTION_WORKERS'] = int(os.environ.get('TRANSCRIPTION_WORKERS', 2))
+app.config['TRANSCRIPTION_QUEUE_SIZE'] = int(os.environ.get('TRANSCRIPTION_QUEUE_SIZE', 16))
+# Процессы моделей, например "base:4,medium:1"; пусто - модели грузятся в процессе Flask
+app.config['MODEL_SERVER_REPLICAS'] = os.environ.get('MODEL_SERVER_REPLICAS', '')
+# Потоков PyTorch на одну транскрипцию (0 - ядра поровну между рабочими)
+# и привязка процессов сервера моделей к своим ядрам
+app.config['TORCH_THREADS_PER_WORKER'] = int(os.environ.get('TORCH_THREADS_PER_WORKER', 0))
+app.config['CPU_AFFINITY'] = os.environ.get('CPU_AFFINITY', '0') == '1'
+# Бюджет памяти под модели в МБ (0 - без ограничения) и выгрузка после простоя в секундах
+app.config['MODEL_CACHE_BUDGET_MB'] = int(os.environ.get('MODEL_CACHE_BUDGET_MB', 4096))
+app.config['MODEL_IDLE_TIMEOUT'] = int(os.environ.get('MODEL_IDLE_TIMEOUT', 1800))
+# Записи длиннее порога (в секундах) транскрибируются параллельно по кускам
+app.config['LONG_AUDIO_THRESHOLD'] = int(os.environ.get('LONG_AUDIO_THRESHOLD', 1800))
+app.config['LONG_AUDIO_WORKERS'] = int(os.environ.get('LONG_AUDIO_WORKERS', 2))
+app.config['LONG_AUDIO_CHUNK_SECONDS'] = int(os.environ.get('LONG_AUDIO_CHUNK_SECONDS', 600))
+# Записи длиннее этого (в секундах) декодируются по кускам, чтобы отдавать сегменты
+# через /events по мере готовности (0 - одним вызовом)
+app.config['PROGRESS_CHUNK_SECONDS'] = int(os.environ.get('PROGRESS_CHUNK_SECONDS', 120))
+# Кэш готовых результатов по хэшу аудио (общий с командной строкой)
+app.config['RESULT_CACHE_ENABLED'] = os.environ.get('RESULT_CACHE_ENABLED', '1') == '1'
+# Хранилище результатов: 'sqlite' (общее для всех процессов) или 'memory'
+app.config['RESULT_STORE'] = os.environ.get('RESULT_STORE', 'sqlite')
+app.config['RESULT_STORE_PATH'] = os.environ.get('RESULT_STORE_PATH', DEFAULT_DB_PATH)
+app.config['RESULT_TTL'] = int(os.environ.get('RESULT_TTL', 24 * 3600))
+app.config['RESULT_STORE_MAX_ENTRIES'] = int(os.environ.get('RESULT_STORE_MAX_ENTRIES', 10000))
+# Короткие записи (до 30 с) одновременных задач обрабатываются одним батчем:
+# максимальный размер пакета (1 - выключено) и ожидание его заполнения в мс
+app.config['BATCH_MAX_SIZE'] = int(os.environ.get('BATCH_MAX_SIZE', 8))
+app.config['BATCH_MAX_WAIT_MS'] = int(os.environ.get('BATCH_MAX_WAIT_MS', 20))
+# Пропускать тишину (VAD) по умолчанию; запрос может переопределить параметром vad=0/1
+app.config['VAD_ENABLED'] = os.environ.get('VAD_ENABLED', '0') == '1'
+# Декодированное аудио после /detect-language хранится в памяти для /transcribe/<audio_id>
+app.config['DECODED_AUDIO_CACHE_MB'] = int(os.environ.get('DECODED_AUDIO_CACHE_MB', 512))
+app.config['DECODED_AUDIO_TTL'] = int(os.environ.get('DECODED_AUDIO_TTL', 600))
+# Потоковая транскрипция с микрофона: число одновременных потоков и таймаут простоя
+app.config['STREAM_MAX_SESSIONS'] = int(os.environ.get('STREAM_MAX_SESSIONS', 4))
+app.config['STREAM_IDLE_TIMEOUT'] = int(os.environ.get('STREAM_IDLE_TIMEOUT', 120))
+# Прогрессивный режим (progressive=1): сначала черновик быстрой моделью, затем
+# результат выбранной модели заменяет его кусками по PROGRESSIVE_CHUNK_SECONDS секунд
+app.config['DRAFT_MODEL'] = os.environ.get('DRAFT_MODEL', 'tiny')
+app.config['PROGRESSIVE_CHUNK_SECONDS'] = int(os.environ.get('PROGRESSIVE_CHUNK_SECONDS', 30))
+# Контрольные точки длинных транскрипций: задачи, прерванные остановкой
+# сервера, при старте ставятся в очередь заново и продолжаются с последнего куска
+app.config['CHECKPOINT_ENABLED'] = os.environ.get('CHECKPOINT_ENABLED', '1') == '1'
+app.config['CHECKPOINT_DIR'] = os.environ.get('CHECKPOINT_DIR', DEFAULT_CHECKPOINT_DIR)
+# Сколько раз возобновлять задачу: задача, на которой падает процесс, не перезапускается бесконечно
+app.config['CHECKPOINT_MAX_RESUMES'] = int(os.environ.get('CHECKPOINT_MAX_RESUMES', 3))
+# Полнотекстовый поиск по транскрипциям (/search); записи живут столько же, сколько результаты
+app.config['SEARCH_INDEX_ENABLED'] = os.environ.get('SEARCH_INDEX_ENABLED', '1') == '1'
+app.config['SEARCH_INDEX_PATH'] = os.environ.get('SEARCH_INDEX_PATH', DEFAULT_INDEX_PATH)
+# Кэш готовых файлов для /download в МБ
+app.config['RENDER_CACHE_MB'] = int(os.environ.get('RENDER_CACHE_MB', 64))
+# Модели, загружаемые при старте (через запятую, например "base,small-int8"),
+# и пробный проход после загрузки; /ready отвечает 200 только после их загрузки
+app.config['PRELOAD_MODELS'] = os.environ.get('PRELOAD_MODELS', '')
+app.config['WARMUP_ENABLED'] = os.environ.get('WARMUP_ENABLED', '1') == '1'
+# Загружать веса через mmap (переменная окружения читается и процессами моделей)
+app.config['MODEL_MMAP'] = os.environ.get('MODEL_MMAP', '0') == '1'
+backends.MMAP_WEIGHTS = app.config['MODEL_MMAP']
 
-# Глобальная переменная для кэширования модели
-model_cache = {}
+# Одновременные транскрипции в процессе Flask делят ядра, а не запускают
+# каждая столько потоков, сколько ядер в системе
+configure_worker(threads_per_worker(
+    app.config['TRANSCRIPTION_WORKERS'],
+    app.config['TORCH_THREADS_PER_WORKER']
+))
 
-# Хранилище результатов транскрипции (в продакшене лучше использовать Redis или БД)
-transcription_results = {}
+# Кэш моделей с ограничением по памяти
+model_cache = ModelCache(
+    backends.load_model,
+    memory_budget_mb=app.config['MODEL_CACHE_BUDGET_MB'],
+    idle_timeout=app.config['MODEL_IDLE_TIMEOUT']
+)
+
+# Хранилище результатов и состояний задач транскрипции
+result_store = create_result_store(
+    app.config['RESULT_STORE'],
+    db_path=app.config['RESULT_STORE_PATH'],
+    ttl=app.config['RESULT_TTL'],
+    max_entries=app.config['RESULT_STORE_MAX_ENTRIES']
+)
+
+# Очередь задач транскрипции (рабочие потоки запускаются при первой задаче)
+job_queue = JobQueue(
+    num_workers=app.config['TRANSCRIPTION_WORKERS'],
+    max_queued=app.config['TRANSCRIPTION_QUEUE_SIZE'],
+    listener=lambda job: result_store.put_status(job.id, job.to_dict())
+)
+
+# Кэш результатов транскрипции на диске
+result_cache = ResultCache() if app.config['RESULT_CACHE_ENABLED'] else None
+
+# Пул процессов с моделями (процессы запускаются при первой задаче)
+model_server = None
+if app.config['MODEL_SERVER_REPLICAS']:
+    model_server = ModelServer(
+        parse_replicas(app.config['MODEL_SERVER_REPLICAS']),
+        threads_per_worker=app.config['TORCH_THREADS_PER_WORKER'] or None,
+        pin_cpus=app.config['CPU_AFFINITY']
+    )
+
+# Аудио, уже декодированное при определении языка
+decoded_audio = DecodedAudioCache(
+    max_size_mb=app.config['DECODED_AUDIO_CACHE_MB'],
+    ttl=app.config['DECODED_AUDIO_TTL']
+)
+
+# Активные сессии потоковой транскрипции
+stream_sessions = StreamingSessions(
+    max_sessions=app.config['STREAM_MAX_SESSIONS'],
+    idle_timeout=app.config['STREAM_IDLE_TIMEOUT']
+)
+
+# Готовые файлы транскрипций для /download
+rendered_files = RenderedCache(max_size_mb=app.config['RENDER_CACHE_MB'])
+
+# Поисковый индекс сегментов
+search_index = SearchIndex(app.config['SEARCH_INDEX_PATH'], ttl=app.config['RESULT_TTL']) \
+    if app.config['SEARCH_INDEX_ENABLED'] else None
+
+# Аудио и параметры задач до их завершения (для возобновления после перезапуска)
+job_manifests = JobManifests(app.config['CHECKPOINT_DIR'], max_resumes=app.config['CHECKPOINT_MAX_RESUMES']) \
+    if app.config['CHECKPOINT_ENABLED'] else None
 
 def get_model(model_size="base"):
     """Получает модель Whisper, кэширует для повторного использования"""
-    if model_size not in model_cache:
-        print(f"Загружаем модель {model_size}...")
-        model_cache[model_size] = whisper.load_model(model_size)
-    return model_cache[model_size]
-
-def format_time_srt(seconds):
-    """Форматирует время для SRT"""
-    hours = int(seconds // 3600)
-    minutes = int((seconds % 3600) // 60)
-    secs = int(seconds % 60)
-    millisecs = int((seconds % 1) * 1000)
-    return f"{hours:02d}:{minutes:02d}:{secs:02d},{millisecs:03d}"
-
-def format_time_vtt(seconds):
-    """Форматирует время для WebVTT"""
-    hours = int(seconds // 3600)
-    minutes = int((seconds % 3600) // 60)
-    secs = int(seconds % 60)
-    millisecs = int((seconds % 1) * 1000)
-    return f"{hours:02d}:{minutes:02d}:{secs:02d}.{millisecs:03d}"
-
-def generate_srt(segments):
-    """Генерирует SRT файл из сегментов"""
-    srt_content = []
-    for i, segment in enumerate(segments, 1):
-        start_time = format_time_srt(segment['start'])
-        end_time = format_time_srt(segment['end'])
-        srt_content.append(f"{i}\n")
-        srt_content.append(f"{start_time} --> {end_time}\n")
-        srt_content.append(f"{segment['text'].strip()}\n\n")
-    return ''.join(srt_content)
-
-def generate_vtt(segments):
-    """Генерирует WebVTT файл из сегментов"""
-    vtt_content = ["WEBVTT\n\n"]
-    for segment in segments:
-        start_time = format_time_vtt(segment['start'])
-        end_time = format_time_vtt(segment['end'])
-        vtt_content.append(f"{start_time} --> {end_time}\n")
-        vtt_content.append(f"{segment['text'].strip()}\n\n")
-    return ''.join(vtt_content)
+    return model_cache.get(model_size)
+
+# Пакетная обработка коротких записей моделями текущего процесса
+batch_scheduler = None
+if app.config['BATCH_MAX_SIZE'] > 1:
+    batch_scheduler = BatchScheduler(
+        get_model,
+        lock=model_cache.lock,
+        max_batch_size=app.config['BATCH_MAX_SIZE'],
+        max_wait_ms=app.config['BATCH_MAX_WAIT_MS']
+    )
+
+# Состояние предзагрузки моделей для /ready
+preload_state = {'done': False, 'models': {}}
+
+def preload_model(model_size):
+    """Загружает и прогревает одну модель из PRELOAD_MODELS"""
+    started = time.time()
+    preload_state['models'][model_size] = 'loading'
+    try:
+        if model_server is not None and model_server.has_model(model_size):
+            # Процессы сервера моделей загружают и прогревают модель сами
+            model_server.start()
+        else:
+            model = model_cache.get(model_size)
+            if app.config['WARMUP_ENABLED']:
+                backends.warm_up(model)
+        preload_state['models'][model_size] = 'ready'
+        print(f"Модель {model_size} предзагружена за {time.time() - started:.1f} с")
+    except Exception as e:
+        preload_state['models'][model_size] = f'failed: {e}'
+        print(f"Не удалось предзагрузить модель {model_size}: {e}")
+
+def preload_models(model_sizes):
+    """Параллельно загружает модели, чтобы первые запросы не ждали загрузки"""
+    try:
+        if model_sizes:
+            with ThreadPoolExecutor(max_workers=len(model_sizes)) as executor:
+                list(executor.map(preload_model, model_sizes))
+    finally:
+        preload_state['done'] = True
+
+# Предзагрузка идет в фоне: приложение сразу принимает запросы, а
+# балансировщик ждет готовности по /ready
+threading.Thread(
+    target=preload_models,
+    args=([size.strip() for size in app.config['PRELOAD_MODELS'].split(',') if size.strip()],),
+    name='model-preload',
+    daemon=True
+).start()
+
+# Метрики для /metrics
+metrics = MetricsRegistry()
+stage_seconds = metrics.histogram(
+    'aruunote_stage_seconds', 'Время этапов транскрипции в секундах', labels=('stage',)
+)
+transcriptions_total = metrics.counter(
+    'aruunote_transcriptions_total', 'Транскрипции по итогу: done, failed, cached', labels=('status',)
+)
+audio_seconds_total = metrics.counter(
+    'aruunote_audio_seconds_total', 'Секунд аудио, переданных на транскрипцию'
+)
+http_requests_total = metrics.counter(
+    'aruunote_http_requests_total', 'HTTP-запросы', labels=('endpoint', 'method', 'status')
+)
+http_request_seconds = metrics.histogram(
+    'aruunote_http_request_duration_seconds', 'Время обработки HTTP-запросов', labels=('endpoint',)
+)
+metrics.gauge('aruunote_queue_depth', 'Задачи, ожидающие в очереди', lambda: job_queue.queue_depth)
+metrics.gauge('aruunote_jobs_in_flight', 'Выполняющиеся задачи транскрипции', lambda: job_queue.in_flight)
+metrics.gauge(
+    'aruunote_model_cache_models', 'Моделей в кэше процесса',
+    lambda: len(model_cache.stats()['resident_models'])
+)
+metrics.gauge(
+    'aruunote_model_cache_used_mb', 'Оценка памяти моделей в кэше, МБ',
+    lambda: model_cache.stats()['used_mb']
+)
+metrics.gauge('aruunote_stream_sessions', 'Активные сессии потоковой транскрипции', lambda: len(stream_sessions))
+if model_server is not None:
+    metrics.gauge(
+        'aruunote_model_server_pending', 'Задачи в работе у процессов сервера моделей',
+        lambda: {(size,): count for size, count in model_server.load().items()}, labels=('model',)
+    )
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    # Шаблон маршрута, а не путь: ID задач не раздувают число меток
+    endpoint = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    http_requests_total.inc(endpoint=endpoint, method=request.method, status=response.status_code)
+    if 'request_started' in g:
+        http_request_seconds.observe(time.perf_counter() - g.request_started, endpoint=endpoint)
+    return response
+
+def transcribe_with_model(model_size, audio, on_progress=None, vad=False, timer=None,
+                          chunk_seconds=None, checkpoint=None, mel=None, **options):
+    """
+    Транскрибирует через пул процессов, если он обслуживает модель, иначе в текущем процессе
+    
+    on_progress(сегменты, обработано секунд, всего секунд) вызывается по мере
+    готовности сегментов, если запись декодируется по кускам.
+    vad - транскрибировать только участки речи (время результата - по исходной записи).
+    timer - StageTimer задачи для замера получения модели.
+    chunk_seconds - длина кусков для on_progress (по умолчанию PROGRESS_CHUNK_SECONDS).
+    checkpoint - контрольная точка: запись обрабатывается по кускам с сохранением
+    после каждого.
+    mel - спектрограмма первых 30 секунд из /detect-language: её использует пакетная
+    обработка коротких записей (whisper.transcribe считает спектрограмму сам).
+    """
+    if vad:
+        return transcribe_speech_only(
+            lambda speech, **speech_options: transcribe_with_model(
+                model_size, speech, timer=timer, chunk_seconds=chunk_seconds, checkpoint=checkpoint,
+                **speech_options
+            ),
+            audio,
+            on_progress=on_progress,
+            **options
+        )
+    
+    server = model_server if model_server is not None and model_server.has_model(model_size) else None
+    
+    # Длинные записи режем на куски и обрабатываем параллельно
+    duration = len(audio) / SAMPLE_RATE
+    if duration >= app.config['LONG_AUDIO_THRESHOLD'] and \
+            (server is not None or app.config['LONG_AUDIO_WORKERS'] > 1):
+        return transcribe_long_audio(
+            audio,
+            model_size,
+            workers=app.config['LONG_AUDIO_WORKERS'],
+            chunk_seconds=app.config['LONG_AUDIO_CHUNK_SECONDS'],
+            model_server=server,
+            on_progress=on_progress,
+            checkpoint=checkpoint,
+            **options
+        )
+    
+    if server is not None:
+        transcribe = lambda chunk, **chunk_options: server.transcribe(model_size, chunk, **chunk_options)
+    elif batch_scheduler is not None and BatchScheduler.supports(audio, **options):
+        return batch_scheduler.transcribe(model_size, audio, mel=mel, **options)
+    else:
+        with timer.stage('model_acquire') if timer is not None else nullcontext():
+            get_model(model_size)
+        transcribe = model_cache.transcriber(model_size)
+    
+    chunk_seconds = chunk_seconds or app.config['PROGRESS_CHUNK_SECONDS']
+    if (on_progress is not None or checkpoint is not None) and chunk_seconds and duration > chunk_seconds:
+        return transcribe_incremental(transcribe, audio, chunk_seconds, on_progress,
+                                      checkpoint=checkpoint, **options)
+    return transcribe(audio, **options)
 
 @app.route('/')
 def index():
     """Главная страница"""
     return render_template('index.html')
 
+def index_segments(transcription_id, segments, replace=False):
+    """Добавляет сегменты в поисковый индекс (replace - заменяет все сегменты транскрипции)"""
+    if search_index is None:
+        return
+    try:
+        if replace:
+            search_index.replace(transcription_id, segments)
+        else:
+            search_index.add(transcription_id, segments)
+    except sqlite3.Error as e:
+        # Сбой индекса не должен ломать транскрипцию
+        print(f"Ошибка поискового индекса для {transcription_id}: {e}")
+
+def unindex_segments(transcription_id):
+    """Удаляет транскрипцию из поискового индекса (например, после ошибки задачи)"""
+    if search_index is None:
+        return
+    try:
+        search_index.delete(transcription_id)
+    except sqlite3.Error as e:
+        print(f"Ошибка поискового индекса для {transcription_id}: {e}")
+
+def publish_result(job, transcription, draft=False):
+    """Сохраняет очередную версию результата задачи (черновик или итоговую)"""
+    job.result_version += 1
+    job.draft = draft
+    result_store.put(job.id, dict(transcription, version=job.result_version, draft=draft))
+    job.notify()
+
+def draft_pass(job, audio, model_size, options, timer, mel=None):
+    """
+    Черновик быстрой моделью для прогрессивного режима
+    
+    Returns:
+        tuple: (сегменты черновика, параметры для основного прохода) или
+            (None, options), если выбранная модель не медленнее черновой
+    """
+    draft_model = app.config['DRAFT_MODEL']
+    if backends.parse_model_spec(model_size)[0] == backends.parse_model_spec(draft_model)[0]:
+        return None, options
+    with timer.stage('draft'):
+        draft = transcribe_with_model(draft_model, audio, timer=timer, mel=mel, **options)
+    segments = compact_segments(draft.get('segments', []))
+    publish_result(job, {
+        'text': draft['text'],
+        'segments': segments,
+        'language': draft.get('language', 'unknown')
+    }, draft=True)
+    # Язык уже определен черновиком - основной проход его не определяет
+    if 'language' not in options and draft.get('language'):
+        options = dict(options, language=draft['language'])
+    return segments, options
+
+def run_transcription(job, audio, model_size, cache_key=None, temp_dir=None, options=None, timer=None,
+                      mel=None):
+    """
+    Выполняет транскрипцию в рабочем потоке очереди
+    
+    audio - путь к файлу или уже декодированный массив 16 кГц,
+    options - параметры transcribe_with_model (см. transcription_options)
+    и progressive - сначала сохранить черновик, затем заменять его по мере готовности,
+    timer - StageTimer с уже замеренным приемом файла,
+    mel - спектрограмма первого окна, посчитанная при определении языка
+    """
+    timer = timer or StageTimer(stage_seconds)
+    job.timings = timer.timings
+    options = dict(options or {})
+    progressive = options.pop('progressive', False)
+    try:
+        # Декодируем аудио и транскрибируем
+        if isinstance(audio, str):
+            with timer.stage('decode'):
+                audio = decode_audio(audio, max_seconds=max_decoded_seconds())
+        total_seconds = len(audio) / SAMPLE_RATE
+        audio_seconds_total.inc(total_seconds)
+        job.add_segments([], 0.0, total_seconds)
+        # Задача могла начаться до перезапуска: её сегменты добавятся заново
+        index_segments(job.id, [], replace=True)
+        
+        draft_segments = None
+        if progressive:
+            draft_segments, options = draft_pass(job, audio, model_size, options, timer, mel)
+        final_segments = []
+        
+        def on_progress(segments, decoded_seconds, total_seconds):
+            segments = compact_segments(segments)
+            index_segments(job.id, segments)
+            if draft_segments is not None:
+                # Готовая часть - от выбранной модели, остаток пока из черновика.
+                # Сегмент черновика, начинающийся до конца готовой части, её повторял бы
+                final_segments.extend(segments)
+                ready_until = max([decoded_seconds] + [s['end'] for s in final_segments[-1:]])
+                merged = final_segments + [s for s in draft_segments if s['start'] >= ready_until]
+                # Номера идут подряд, как в окончательном результате
+                merged = [dict(segment, id=i) for i, segment in enumerate(merged)]
+                publish_result(job, {
+                    'text': ''.join(segment['text'] for segment in merged),
+                    'segments': merged,
+                    'language': options.get('language', 'unknown')
+                }, draft=True)
+            job.add_segments(segments, decoded_seconds, total_seconds)
+        
+        checkpoint = None
+        if job_manifests is not None and cache_key is not None:
+            checkpoint = job_manifests.checkpoint(job.id, cache_key)
+        with timer.stage('inference'):
+            result = transcribe_with_model(
+                model_size, audio, on_progress=on_progress, timer=timer,
+                chunk_seconds=app.config['PROGRESSIVE_CHUNK_SECONDS'] if draft_segments is not None else None,
+                checkpoint=checkpoint,
+                mel=mel,
+                **options
+            )
+        
+        with timer.stage('postprocess'):
+            text = result["text"]
+            segments = result.get('segments', [])
+            if not job.segments:
+                # Запись обработана одним вызовом - отдаем все сегменты сразу
+                job.add_segments(compact_segments(segments), total_seconds, total_seconds)
+            
+            # Сохраняем результат транскрипции под ID задачи
+            transcription = {
+                'text': text,
+                'segments': segments,
+                'language': result.get('language', 'unknown')
+            }
+            publish_result(job, transcription)
+            index_segments(job.id, segments, replace=True)
+            if result_cache is not None and cache_key is not None:
+                # Длительность нужна командной строке, которая читает тот же кэш
+                result_cache.put(cache_key, dict(transcription, duration=total_seconds))
+        transcriptions_total.inc(status=TranscriptionJob.DONE)
+        return {'language': transcription['language'], 'segments': len(segments)}
+    
+    except Exception:
+        transcriptions_total.inc(status=TranscriptionJob.FAILED)
+        # Сегменты, проиндексированные по мере готовности, не должны находиться поиском
+        unindex_segments(job.id)
+        raise
+    
+    finally:
+        # Очищаем временный файл
+        if temp_dir is not None:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+        if job_manifests is not None:
+            job_manifests.finish(job.id)
+
+def cached_response(cache_key):
+    """Ответ с готовым результатом, если он есть в кэше, иначе None"""
+    cached = result_cache.get(cache_key) if result_cache is not None else None
+    if cached is None:
+        return None
+    transcription_id = str(uuid.uuid4())
+    result_store.put(transcription_id, cached)
+    index_segments(transcription_id, cached['segments'], replace=True)
+    transcriptions_total.inc(status='cached')
+    return jsonify({
+        'success': True,
+        'transcription_id': transcription_id,
+        'status': TranscriptionJob.DONE,
+        'cached': True,
+        'text': cached['text'],
+        'language': cached.get('language', 'unknown'),
+        'segments': cached['segments']
+    })
+
+def progressive_requested(params):
+    """Прогрессивный режим: не влияет на итоговый результат, поэтому не входит в ключ кэша"""
+    return params.get('progressive') in ('1', 'true', 'on')
+
+def transcription_options(params):
+    """Параметры транскрипции из запроса; они же входят в ключ кэша результатов"""
+    options = {}
+    # Пустой словарь без языка и VAD сохраняет прежние ключи кэша
+    if params.get('language'):
+        options['language'] = params['language']
+    vad = params.get('vad')
+    vad = app.config['VAD_ENABLED'] if vad is None else vad in ('1', 'true', 'on')
+    if vad:
+        options['vad'] = True
+    # Время каждого слова (попадает в JSON-файл /download/<id>/json)
+    if params.get('word_timestamps') in ('1', 'true', 'on'):
+        options['word_timestamps'] = True
+    return options
+
+def with_detected_language(audio_hash, options):
+    """Добавляет язык, уже определенный через /detect-language, чтобы не определять его снова"""
+    if 'language' in options or result_cache is None:
+        return options
+    detected = result_cache.get(detection_key(audio_hash))
+    return dict(options, language=detected['language']) if detected else options
+
+def enqueue_transcription(audio, model_size, cache_key, temp_dir=None, options=None, timer=None,
+                          progressive=False, source=None, mel=None):
+    """
+    Ставит транскрипцию в очередь и возвращает ответ 202 (или 503 при переполнении)
+    
+    source - исходный файл декодированного массива audio (в temp_dir): хранится
+    вместо массива, чтобы задачу можно было возобновить после перезапуска.
+    mel - спектрограмма первого окна из /detect-language (см. run_transcription).
+    """
+    job_id = str(uuid.uuid4())
+    if progressive:
+        options = dict(options or {}, progressive=True)
+    try:
+        if job_manifests is not None:
+            # Файл переносится в папку задачи и хранится до её завершения
+            audio = job_manifests.create(job_id, audio, source=source, model_size=model_size,
+                                         cache_key=cache_key, options=options or {})
+            if temp_dir is not None:
+                shutil.rmtree(temp_dir, ignore_errors=True)
+                temp_dir = None
+        job = job_queue.submit(run_transcription, audio, model_size, cache_key, temp_dir, options, timer,
+                               mel=mel, job_id=job_id)
+    except QueueFullError as e:
+        if temp_dir is not None:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+        if job_manifests is not None:
+            job_manifests.finish(job_id)
+        response = jsonify({'error': f'Сервер перегружен, попробуйте позже: {str(e)}'})
+        response.headers['Retry-After'] = '30'
+        return response, 503
+    
+    return jsonify({
+        'success': True,
+        'transcription_id': job.id,
+        'status': job.status,
+        'status_url': f'/status/{job.id}',
+        # Пока замерен только прием файла; полная разбивка - в /status
+        'timings': dict(timer.timings) if timer is not None else {}
+    }), 202
+
+def abandon_job(job_id):
+    """Отмечает ошибкой задачу, которую больше не возобновляем, чтобы /status не отвечал 404"""
+    result_store.put_status(job_id, {
+        'transcription_id': job_id,
+        'status': TranscriptionJob.FAILED,
+        'progress': 0.0,
+        'error': 'Задача несколько раз прерывалась остановкой сервера'
+    })
+
+def resume_jobs():
+    """Ставит в очередь задачи, прерванные остановкой сервера (под прежними ID)"""
+    for manifest in job_manifests.pending(on_abandoned=abandon_job):
+        try:
+            job_queue.submit(run_transcription, manifest['audio'], manifest['model_size'],
+                             manifest['cache_key'], None, manifest['options'], job_id=manifest['job_id'])
+        except QueueFullError:
+            # Задача останется на диске и будет взята при следующем запуске
+            job_manifests.release(manifest['job_id'])
+            continue
+        print(f"Задача {manifest['job_id']} возобновлена после перезапуска ({manifest['resumes']})")
+
+if job_manifests is not None:
+    resume_jobs()
+
 @app.route('/upload', methods=['POST'])
 def upload_file():
-    """Обрабатывает загруженный аудиофайл"""
+    """Принимает аудиофайл и ставит его транскрипцию в очередь"""
     try:
         if 'audio' not in request.files:
             return jsonify({'error': 'Файл не выбран'}), 400
         
         file = request.files['audio']
         model_size = request.form.get('model_size', 'base')
+        options = transcription_options(request.form)
         
         if file.filename == '':
             return jsonify({'error': 'Файл не выбран'}), 400
         
         if file:
             # Создаем временный файл
-            filename = secure_filename(file.filename)
+            filename = secure_filename(file.filename) or 'audio'
             temp_dir = tempfile.mkdtemp()
             temp_path = os.path.join(temp_dir, filename)
-            file.save(temp_path)
+            timer = StageTimer(stage_seconds)
+            # Сохраняем файл, одновременно вычисляя хэш содержимого
+            with timer.stage('receive'):
+                audio_hash = save_and_hash(file.stream, temp_path)
+            # Ключ - по окончательным параметрам, как в /transcribe/<audio_id>
+            options = with_detected_language(audio_hash, options)
+            cache_key = make_key(audio_hash, model_size, **options)
             
-            try:
-                # Получаем модель
-                model = get_model(model_size)
-                
-                # Транскрибируем
-                result = model.transcribe(temp_path)
-                text = result["text"]
-                segments = result.get('segments', [])
-                
-                # Сохраняем результат транскрипции с уникальным ID
-                transcription_id = str(uuid.uuid4())
-                transcription_results[transcription_id] = {
-                    'text': text,
-                    'segments': segments,
-                    'language': result.get('language', 'unknown')
-                }
-                
-                # Очищаем временный файл
-                os.remove(temp_path)
-                os.rmdir(temp_dir)
-                
-                return jsonify({
-                    'success': True,
-                    'text': text,
-                    'language': result.get('language', 'unknown'),
-                    'segments': segments,
-                    'transcription_id': transcription_id
-                })
-                
-            except Exception as e:
-                # Очищаем в случае ошибки
-                if os.path.exists(temp_path):
-                    os.remove(temp_path)
-                if os.path.exists(temp_dir):
-                    os.rmdir(temp_dir)
-                return jsonify({'error': f'Ошибка обработки: {str(e)}'}), 500
+            # Тот же файл с той же моделью уже обрабатывался - отдаем готовый результат
+            response = cached_response(cache_key)
+            if response is not None:
+                shutil.rmtree(temp_dir, ignore_errors=True)
+                return response
+            
+            return enqueue_transcription(temp_path, model_size, cache_key, temp_dir, options, timer,
+                                         progressive_requested(request.form))
     
     except Exception as e:
         return jsonify({'error': f'Ошибка сервера: {str(e)}'}), 500
 
-@app.route('/download/<transcription_id>/<format>')
-def download_file(transcription_id, format):
-    """Генерирует и скачивает файл транскрипции в указанном формате"""
+def max_decoded_seconds():
+    """Ограничение длины декодированной записи (None - без ограничения)"""
+    return app.config['MAX_DECODED_SECONDS'] or None
+
+def read_request_body(limit):
+    """Читает тело запроса порциями, не превышая limit байт"""
+    stream = get_input_stream(request.environ, max_content_length=limit)
+    received = 0
+    for chunk in iter(lambda: stream.read(CHUNK_SIZE), b''):
+        received += len(chunk)
+        if received > limit:
+            raise RequestEntityTooLarge()
+        yield chunk
+
+@app.route('/upload/stream', methods=['POST'])
+def upload_stream():
+    """
+    Потоковая загрузка: тело запроса - сам аудиофайл
+    
+    Данные сразу передаются в ffmpeg и хэшируются, поэтому декодирование
+    идет параллельно с загрузкой. На диск файл пишется только для
+    возобновления задачи после перезапуска (CHECKPOINT_ENABLED).
+    Параметры: ?model_size=base&filename=audio.mp3&language=ru&vad=1&progressive=1
+    """
+    model_size = request.args.get('model_size', 'base')
+    options = transcription_options(request.args)
+    filename = secure_filename(request.args.get('filename', '')) or 'audio'
+    limit = app.config['MAX_STREAM_CONTENT_LENGTH']
+    timer = StageTimer(stage_seconds)
+    
     try:
-        if transcription_id not in transcription_results:
-            return jsonify({'error': 'Транскрипция не найдена'}), 404
-        
-        result = transcription_results[transcription_id]
-        filename_base = 'transcription'
+        # Контейнеры с индексом в конце файла нельзя декодировать из потока
+        if os.path.splitext(filename)[1].lower() in SEEKABLE_FORMATS:
+            temp_dir = tempfile.mkdtemp()
+            temp_path = os.path.join(temp_dir, filename)
+            digest = hashlib.sha256()
+            try:
+                with timer.stage('receive'), open(temp_path, 'wb') as f:
+                    for chunk in read_request_body(limit):
+                        digest.update(chunk)
+                        f.write(chunk)
+            except Exception:
+                shutil.rmtree(temp_dir, ignore_errors=True)
+                raise
+            options = with_detected_language(digest.hexdigest(), options)
+            cache_key = make_key(digest.hexdigest(), model_size, **options)
+            response = cached_response(cache_key)
+            if response is not None:
+                shutil.rmtree(temp_dir, ignore_errors=True)
+                return response
+            return enqueue_transcription(temp_path, model_size, cache_key, temp_dir, options, timer,
+                                         progressive_requested(request.args))
         
-        if format == 'txt':
-            file_content = result['text']
-            mimetype = 'text/plain'
-            filename = f'{filename_base}.txt'
+        decoder = StreamingDecoder(max_seconds=max_decoded_seconds())
+        digest = hashlib.sha256()
+        # Для возобновления после перезапуска хранится сжатый исходный файл, а не массив
+        temp_dir = tempfile.mkdtemp() if job_manifests is not None else None
+        source = os.path.join(temp_dir, filename) if temp_dir is not None else None
+        try:
+            # Декодирование идет параллельно с приемом и входит в этот этап
+            with timer.stage('receive'), open(source, 'wb') if source else nullcontext() as f:
+                for chunk in read_request_body(limit):
+                    digest.update(chunk)
+                    decoder.write(chunk)
+                    if f is not None:
+                        f.write(chunk)
+        except Exception:
+            decoder.abort()
+            if temp_dir is not None:
+                shutil.rmtree(temp_dir, ignore_errors=True)
+            raise
         
-        elif format == 'srt':
-            if not result['segments']:
-                return jsonify({'error': 'Нет данных о сегментах для генерации SRT'}), 400
-            file_content = generate_srt(result['segments'])
-            mimetype = 'text/plain'
-            filename = f'{filename_base}.srt'
+        try:
+            options = with_detected_language(digest.hexdigest(), options)
+            cache_key = make_key(digest.hexdigest(), model_size, **options)
+            response = cached_response(cache_key)
+            if response is not None:
+                decoder.abort()
+                return response
+            
+            with timer.stage('decode'):
+                audio = decoder.finish()
+            if len(audio) == 0:
+                return jsonify({'error': 'Файл не выбран'}), 400
+            response = enqueue_transcription(audio, model_size, cache_key, temp_dir,
+                                             options=options, timer=timer, progressive=progressive_requested(request.args),
+                                             source=source)
+            # Папку удалит задача (или она уже удалена после переноса файла в манифест)
+            temp_dir = None
+            return response
+        finally:
+            if temp_dir is not None:
+                shutil.rmtree(temp_dir, ignore_errors=True)
+    
+    except RequestEntityTooLarge:
+        return jsonify({'error': f'Файл больше {limit // (1024 * 1024)} МБ'}), 413
+    except AudioTooLongError as e:
+        return jsonify({'error': str(e)}), 413
+    except AudioDecodeError as e:
+        return jsonify({'error': f'Ошибка обработки: {str(e)}'}), 400
+    except Exception as e:
+        return jsonify({'error': f'Ошибка сервера: {str(e)}'}), 500
+
+def receive_audio(filename, limit):
+    """
+    Читает аудиофайл из тела запроса и декодирует его
+    
+    Returns:
+        tuple: (SHA-256 содержимого, аудио 16 кГц float32)
+    """
+    digest = hashlib.sha256()
+    if os.path.splitext(filename)[1].lower() in SEEKABLE_FORMATS:
+        temp_dir = tempfile.mkdtemp()
+        try:
+            temp_path = os.path.join(temp_dir, filename)
+            with open(temp_path, 'wb') as f:
+                for chunk in read_request_body(limit):
+                    digest.update(chunk)
+                    f.write(chunk)
+            return digest.hexdigest(), decode_audio(temp_path, max_seconds=max_decoded_seconds())
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+    
+    decoder = StreamingDecoder(max_seconds=max_decoded_seconds())
+    try:
+        for chunk in read_request_body(limit):
+            digest.update(chunk)
+            decoder.write(chunk)
+    except Exception:
+        decoder.abort()
+        raise
+    return digest.hexdigest(), decoder.finish()
+
+@app.route('/detect-language', methods=['POST'])
+def detect_language_route():
+    """
+    Определяет язык записи по первым 30 секундам самой маленькой модели
+    
+    Тело запроса - аудиофайл (как в /upload/stream), параметр ?filename=.
+    Декодированное аудио сохраняется в памяти: транскрипцию можно запустить
+    через /transcribe/<audio_id> без повторной загрузки файла.
+    """
+    filename = secure_filename(request.args.get('filename', '')) or 'audio'
+    limit = app.config['MAX_STREAM_CONTENT_LENGTH']
+    
+    try:
+        audio_hash, audio = receive_audio(filename, limit)
+        if len(audio) == 0:
+            return jsonify({'error': 'Файл не выбран'}), 400
         
-        elif format == 'vtt':
-            if not result['segments']:
-                return jsonify({'error': 'Нет данных о сегментах для генерации WebVTT'}), 400
-            file_content = generate_vtt(result['segments'])
-            mimetype = 'text/vtt'
-            filename = f'{filename_base}.vtt'
+        key = detection_key(audio_hash)
+        detected = result_cache.get(key) if result_cache is not None else None
+        cached = detected is not None
+        mel = None
+        if detected is None:
+            model = get_model(DETECT_MODEL)
+            # Спектрограмма сохраняется вместе с аудио: короткая запись транскрибируется
+            # по ней же, если у выбранной модели то же число мел-полос
+            mel = first_window_mel(audio, model.dims.n_mels)
+            with model_cache.lock(DETECT_MODEL):
+                detected = detect_language(model, audio, mel=mel)
+            if result_cache is not None:
+                result_cache.put(key, detected)
+        decoded_audio.put(audio_hash, audio, mel)
         
-        else:
+        return jsonify({
+            'success': True,
+            'audio_id': audio_hash,
+            'language': detected['language'],
+            'probabilities': detected['probabilities'],
+            'duration': len(audio) / SAMPLE_RATE,
+            'cached': cached,
+            'transcribe_url': f'/transcribe/{audio_hash}'
+        })
+    
+    except RequestEntityTooLarge:
+        return jsonify({'error': f'Файл больше {limit // (1024 * 1024)} МБ'}), 413
+    except AudioTooLongError as e:
+        return jsonify({'error': str(e)}), 413
+    except AudioDecodeError as e:
+        return jsonify({'error': f'Ошибка обработки: {str(e)}'}), 400
+    except Exception as e:
+        return jsonify({'error': f'Ошибка сервера: {str(e)}'}), 500
+
+@app.route('/transcribe/<audio_id>', methods=['POST'])
+def transcribe_detected(audio_id):
+    """
+    Ставит в очередь транскрипцию аудио, загруженного через /detect-language
+    
+    Параметры (JSON или форма): model_size, language (по умолчанию - определенный), vad, progressive
+    """
+    params = request.get_json(silent=True) or request.form
+    model_size = params.get('model_size', 'base')
+    options = with_detected_language(audio_id, transcription_options(params))
+    cache_key = make_key(audio_id, model_size, **options)
+    
+    response = cached_response(cache_key)
+    if response is not None:
+        return response
+    
+    audio = decoded_audio.get(audio_id)
+    if audio is None:
+        return jsonify({'error': 'Аудио не найдено или устарело, загрузите файл заново'}), 404
+    return enqueue_transcription(audio, model_size, cache_key, options=options,
+                                 progressive=progressive_requested(params), mel=decoded_audio.get_mel(audio_id))
+
+@app.route('/stream/start', methods=['POST'])
+def stream_start():
+    """
+    Начинает потоковую транскрипцию (например, с микрофона)
+    
+    Параметры (JSON): model_size, language. Затем аудио отправляется
+    порциями в /stream/<id>/audio, завершение - /stream/<id>/stop.
+    """
+    params = request.get_json(silent=True) or {}
+    model_size = params.get('model_size', 'base')
+    
+    try:
+        get_model(model_size)
+        session = stream_sessions.create(model_cache.transcriber(model_size),
+                                         language=params.get('language') or None)
+    except ValueError as e:
+        response = jsonify({'error': str(e)})
+        response.headers['Retry-After'] = '30'
+        return response, 503
+    except Exception as e:
+        return jsonify({'error': f'Ошибка сервера: {str(e)}'}), 500
+    
+    return jsonify({
+        'success': True,
+        'stream_id': session.id,
+        'sample_rate': SAMPLE_RATE,
+        'format': 'f32le'
+    })
+
+@app.route('/stream/<stream_id>/audio', methods=['POST'])
+def stream_audio(stream_id):
+    """
+    Принимает очередную порцию аудио: сырые отсчеты float32 little-endian, 16 кГц, моно
+    
+    Возвращает сегменты, ставшие окончательными, и предварительный текст окна.
+    """
+    session = stream_sessions.get(stream_id)
+    if session is None:
+        return jsonify({'error': 'Поток не найден'}), 404
+    
+    data = request.get_data()
+    if len(data) % 4:
+        return jsonify({'error': 'Ожидаются отсчеты float32'}), 400
+    
+    try:
+        session.feed(np.frombuffer(data, dtype='<f4').astype(np.float32))
+        committed = session.process()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 409
+    except Exception as e:
+        return jsonify({'error': f'Ошибка обработки: {str(e)}'}), 500
+    return jsonify(session.state(committed))
+
+@app.route('/stream/<stream_id>/stop', methods=['POST'])
+def stream_stop(stream_id):
+    """Завершает поток и сохраняет результат (его можно скачать через /download)"""
+    session = stream_sessions.remove(stream_id)
+    if session is None:
+        return jsonify({'error': 'Поток не найден'}), 404
+    
+    try:
+        result = session.finish()
+    except Exception as e:
+        return jsonify({'error': f'Ошибка обработки: {str(e)}'}), 500
+    
+    result_store.put(stream_id, result)
+    index_segments(stream_id, result['segments'], replace=True)
+    return jsonify({
+        'success': True,
+        'transcription_id': stream_id,
+        'status': TranscriptionJob.DONE,
+        'text': result['text'],
+        'language': result['language'],
+        'segments': result['segments']
+    })
+
+def get_job_status(transcription_id):
+    """Состояние задачи: из очереди этого процесса или из общего хранилища"""
+    job = job_queue.get(transcription_id)
+    if job is not None:
+        return job.to_dict()
+    
+    status = result_store.get_status(transcription_id)
+    if status is not None:
+        return status
+    
+    # Результат без задачи - например, взятый из кэша
+    if transcription_id in result_store:
+        return {
+            'transcription_id': transcription_id,
+            'status': TranscriptionJob.DONE,
+            'progress': 1.0,
+            'error': None
+        }
+    return None
+
+@app.route('/status/<transcription_id>')
+def transcription_status(transcription_id):
+    """Возвращает состояние задачи транскрипции"""
+    status = get_job_status(transcription_id)
+    if status is None:
+        return jsonify({'error': 'Транскрипция не найдена'}), 404
+    
+    # Результат есть у завершенной задачи, а в прогрессивном режиме - и черновик до завершения
+    result = result_store.get(transcription_id) \
+        if status['status'] == TranscriptionJob.DONE or status.get('result_version') else None
+    if result is not None:
+        status.update({
+            'text': result['text'],
+            'language': result.get('language', 'unknown'),
+            'segments': result['segments'],
+            'version': result.get('version', 1),
+            'draft': result.get('draft', False)
+        })
+    return jsonify(status)
+
+def sse_event(event, data):
+    """Форматирует событие Server-Sent Events"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.route('/events/<transcription_id>')
+def transcription_events(transcription_id):
+    """
+    Поток Server-Sent Events с прогрессом и готовыми сегментами задачи
+    
+    События: segments (новые сегменты), progress (состояние задачи),
+    revision (новая версия результата в прогрессивном режиме),
+    done (итоговый текст и язык) или failed.
+    """
+    status = get_job_status(transcription_id)
+    if status is None:
+        return jsonify({'error': 'Транскрипция не найдена'}), 404
+    
+    def finished_event(status):
+        if status['status'] == TranscriptionJob.FAILED:
+            return sse_event('failed', status)
+        result = result_store.get(transcription_id) or {}
+        return sse_event('done', dict(status, text=result.get('text', ''),
+                                      language=result.get('language', 'unknown')))
+    
+    def local_job_events(job):
+        sent = 0
+        version = -1
+        result_version = 0
+        while True:
+            new_version = job.wait_for_update(version, timeout=15)
+            if new_version == version:
+                # Комментарий не дает прокси закрыть неактивное соединение
+                yield ': keepalive\n\n'
+                continue
+            version = new_version
+            segments = job.segments[sent:]
+            if segments:
+                sent += len(segments)
+                yield sse_event('segments', {'segments': segments})
+            if job.result_version != result_version:
+                result_version = job.result_version
+                result = result_store.get(transcription_id) or {}
+                yield sse_event('revision', {
+                    'version': result.get('version', result_version),
+                    'draft': result.get('draft', False),
+                    'text': result.get('text', '')
+                })
+            status = job.to_dict()
+            yield sse_event('progress', status)
+            if job.finished:
+                yield finished_event(status)
+                return
+    
+    def stored_job_events():
+        # Задача выполняется в другом процессе: сегменты недоступны, только состояние
+        while True:
+            status = get_job_status(transcription_id)
+            if status is None:
+                yield sse_event('failed', {'error': 'Транскрипция не найдена'})
+                return
+            yield sse_event('progress', status)
+            if status['status'] in (TranscriptionJob.DONE, TranscriptionJob.FAILED):
+                if status['status'] == TranscriptionJob.DONE:
+                    result = result_store.get(transcription_id) or {}
+                    yield sse_event('segments', {'segments': result.get('segments', [])})
+                yield finished_event(status)
+                return
+            time.sleep(1)
+    
+    job = job_queue.get(transcription_id)
+    events = local_job_events(job) if job is not None else stored_job_events()
+    return Response(events, mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+@app.route('/search')
+def search():
+    """
+    Полнотекстовый поиск по сохраненным транскрипциям
+    
+    Параметры: ?q=слова&limit=20&offset=0. "Фраза в кавычках" ищется целиком,
+    слово* - по префиксу. Возвращает сегменты с ID транскрипции, временем и фрагментом текста.
+    """
+    if search_index is None:
+        return jsonify({'error': 'Поиск отключен'}), 404
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'error': 'Пустой запрос'}), 400
+    try:
+        limit = max(1, min(int(request.args.get('limit', 20)), 100))
+        offset = max(0, int(request.args.get('offset', 0)))
+    except ValueError:
+        return jsonify({'error': 'limit и offset должны быть числами'}), 400
+    
+    started = time.perf_counter()
+    results = search_index.search(query, limit, offset)
+    return jsonify({
+        'query': query,
+        'results': results,
+        'took_ms': round((time.perf_counter() - started) * 1000, 2)
+    })
+
+@app.route('/ready')
+def readiness():
+    """Готовность к приему запросов: все модели из PRELOAD_MODELS загружены"""
+    models = dict(preload_state['models'])
+    ready = preload_state['done'] and all(state == 'ready' for state in models.values())
+    response = {'ready': ready, 'models': models}
+    if model_server is not None and any(model_server.has_model(size) for size in models):
+        response['model_server_ready'] = model_server.ready()
+        ready = ready and response['model_server_ready']
+        response['ready'] = ready
+    return jsonify(response), 200 if ready else 503
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Метрики в текстовом формате Prometheus"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/stats/models')
+def model_stats():
+    """Возвращает метрики кэша моделей"""
+    stats = model_cache.stats()
+    if batch_scheduler is not None:
+        stats['batching'] = batch_scheduler.stats()
+    if model_server is not None:
+        stats['model_server_load'] = model_server.load()
+    return jsonify(stats)
+
+def timed_render(chunks):
+    """Передает блоки файла дальше, замеряя только время их генерации"""
+    elapsed = 0.0
+    chunks = iter(chunks)
+    while True:
+        started = time.perf_counter()
+        chunk = next(chunks, None)
+        elapsed += time.perf_counter() - started
+        if chunk is None:
+            break
+        yield chunk
+    stage_seconds.observe(elapsed, stage='render')
+
+@app.route('/download/<transcription_id>/<format>')
+def download_file(transcription_id, format):
+    """
+    Отдает файл транскрипции в указанном формате (txt, srt, vtt, tsv, json)
+    
+    Файл генерируется и отправляется по частям; готовые файлы кэшируются,
+    а по If-None-Match с тем же ETag возвращается 304 без тела. В прогрессивном
+    режиме до завершения отдается текущий черновик (заголовок X-Transcript-Draft).
+    """
+    try:
+        if format not in FORMATS:
             return jsonify({'error': 'Неподдерживаемый формат'}), 400
+        status = get_job_status(transcription_id)
+        if status is None:
+            return jsonify({'error': 'Транскрипция не найдена'}), 404
+        if status['status'] == TranscriptionJob.FAILED:
+            return jsonify({'error': f"Ошибка обработки: {status['error']}"}), 500
+        if status['status'] != TranscriptionJob.DONE and not status.get('result_version'):
+            return jsonify({'error': 'Транскрипция еще не завершена', 'status': status['status']}), 409
         
-        # Создаем файл в памяти
-        file_obj = BytesIO(file_content.encode('utf-8'))
-        
-        return send_file(
-            file_obj,
-            mimetype=mimetype,
-            as_attachment=True,
-            download_name=filename
-        )
+        # ETag строится по метаданным, поэтому на повторный запрос с тем же ETag
+        # отвечаем 304, не загружая и не распаковывая сам результат
+        meta = result_store.get_meta(transcription_id)
+        if meta is None:
+            return jsonify({'error': 'Транскрипция не найдена'}), 404
+        etag = transcript_etag(transcription_id, format, meta['version'], meta['digest'])
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+        else:
+            result, meta = result_store.get_with_meta(transcription_id)
+            if result is None:
+                return jsonify({'error': 'Транскрипция не найдена'}), 404
+            _, mimetype, needs_segments = FORMATS[format]
+            if needs_segments and not result['segments']:
+                return jsonify({'error': f'Нет данных о сегментах для генерации {format.upper()}'}), 400
+            # Результат мог обновиться после чтения метаданных
+            etag = transcript_etag(transcription_id, format, meta['version'], meta['digest'])
+            key = (transcription_id, format)
+            content = rendered_files.get(key, etag)
+            if content is None:
+                content = rendered_files.stream(key, etag, timed_render(render(result, format)))
+            response = Response(content, mimetype=mimetype)
+            response.headers['Content-Disposition'] = f'attachment; filename=transcription.{format}'
+        response.set_etag(etag)
+        response.headers['X-Transcript-Version'] = str(meta['version'])
+        response.headers['X-Transcript-Draft'] = '1' if meta['draft'] else '0'
+        # Браузер хранит файл, но перепроверяет его: результат может обновиться
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
     
     except Exception as e:
         return jsonify({'error': f'Ошибка при генерации файла: {str(e)}'}), 500
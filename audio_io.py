@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+Декодирование аудио напрямую в массив NumPy
+
+ffmpeg декодирует файл сразу в 16 кГц моно float32 и отдает данные через
+pipe, поэтому не нужны ни промежуточный WAV на диске, ни полная копия
+аудио в исходном качестве в памяти.
+"""
+
+import subprocess
+import threading
+
+import numpy as np
+
+
+SAMPLE_RATE = 16000
+READ_CHUNK_SIZE = 1024 * 1024
+
+
+class AudioDecodeError(RuntimeError):
+    """Файл не удалось декодировать: ошибка в данных, а не на сервере"""
+
+
+class AudioTooLongError(AudioDecodeError):
+    """Декодированная запись длиннее допустимой"""
+
+    def __init__(self, max_seconds):
+        super().__init__(f"Запись длиннее {max_seconds:.0f} с")
+        self.max_seconds = max_seconds
+
+
+def max_decoded_bytes(max_seconds, sr=SAMPLE_RATE):
+    """Размер декодированного float32 моно для max_seconds (None - без ограничения)"""
+    return None if max_seconds is None else int(max_seconds * sr) * 4
+
+
+def ffmpeg_decode_command(source='pipe:0', sr=SAMPLE_RATE):
+    """Команда ffmpeg, декодирующая source в сырой f32le моно на stdout"""
+    return [
+        'ffmpeg',
+        '-nostdin',
+        '-threads', '0',
+        '-i', source,
+        '-f', 'f32le',
+        '-ac', '1',
+        '-acodec', 'pcm_f32le',
+        '-ar', str(sr),
+        '-loglevel', 'error',
+        '-'
+    ]
+
+
+def decode_audio(path, sr=SAMPLE_RATE, max_seconds=None):
+    """
+    Декодирует аудиофайл любого формата, поддерживаемого ffmpeg
+
+    Args:
+        path (str): Путь к аудиофайлу
+        sr (int): Частота дискретизации результата
+        max_seconds (float): Наибольшая длина записи (None - без ограничения)
+
+    Returns:
+        np.ndarray: Моно аудио float32 в диапазоне [-1, 1]
+
+    Raises:
+        AudioDecodeError: Файл не декодируется или длиннее max_seconds
+        RuntimeError: ffmpeg не установлен
+    """
+    try:
+        process = subprocess.Popen(
+            ffmpeg_decode_command(path, sr),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE
+        )
+    except FileNotFoundError:
+        raise RuntimeError("ffmpeg не найден, установите его (см. README)") from None
+
+    # stderr читается параллельно: иначе ffmpeg, заполнив его канал сообщениями,
+    # остановится, не закрыв stdout, и чтение ниже никогда не закончится
+    stderr = []
+    error_reader = threading.Thread(target=lambda: stderr.append(process.stderr.read()), daemon=True)
+    error_reader.start()
+
+    # Читаем в изменяемый буфер: массив получается записываемым без лишней копии
+    buffer = bytearray()
+    limit = max_decoded_bytes(max_seconds, sr)
+    for chunk in iter(lambda: process.stdout.read(READ_CHUNK_SIZE), b''):
+        buffer += chunk
+        if limit is not None and len(buffer) > limit:
+            # Небольшой файл может развернуться в десятки гигабайт отсчетов
+            process.kill()
+            process.stdout.close()
+            process.wait()
+            error_reader.join()
+            raise AudioTooLongError(max_seconds)
+    returncode = process.wait()
+    error_reader.join()
+    if returncode != 0:
+        raise AudioDecodeError(f"Не удалось декодировать аудио: {b''.join(stderr).decode(errors='replace')}")
+
+    return np.frombuffer(buffer, np.float32)
+
+
+# Контейнеры, которые ffmpeg не может декодировать из неперематываемого потока
+# (индекс moov часто находится в конце файла)
+SEEKABLE_FORMATS = {'.m4a', '.mp4', '.mov', '.3gp'}
+
+
+class StreamingDecoder:
+    """
+    Декодирует аудио, поступающее порциями, через stdin ffmpeg
+
+    Декодирование идет параллельно с приемом данных: пока клиент передает
+    файл, ffmpeg уже выдает готовые отсчеты. С max_seconds декодирование
+    прерывается, как только запись превысит эту длину, поэтому маленький
+    файл с очень длинной записью не займет всю память.
+    """
+
+    def __init__(self, sr=SAMPLE_RATE, max_seconds=None):
+        try:
+            self.process = subprocess.Popen(
+                ffmpeg_decode_command('pipe:0', sr),
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE
+            )
+        except FileNotFoundError:
+            raise RuntimeError("ffmpeg не найден, установите его (см. README)") from None
+        self.max_seconds = max_seconds
+        self.too_long = False
+        self._limit = max_decoded_bytes(max_seconds, sr)
+        self._buffer = bytearray()
+        self._stderr = b''
+        self._reader = threading.Thread(target=self._read_stdout, daemon=True)
+        self._error_reader = threading.Thread(target=self._read_stderr, daemon=True)
+        self._reader.start()
+        self._error_reader.start()
+
+    def _read_stdout(self):
+        for chunk in iter(lambda: self.process.stdout.read(READ_CHUNK_SIZE), b''):
+            self._buffer += chunk
+            if self._limit is not None and len(self._buffer) > self._limit:
+                self.too_long = True
+                self.process.kill()
+                return
+
+    def _read_stderr(self):
+        self._stderr = self.process.stderr.read()
+
+    @property
+    def decoded_seconds(self):
+        """Сколько секунд аудио уже декодировано"""
+        return len(self._buffer) / 4 / SAMPLE_RATE
+
+    def write(self, data):
+        """
+        Передает очередную порцию закодированных данных в ffmpeg
+
+        Raises:
+            AudioTooLongError: Запись уже длиннее max_seconds, прием можно прекратить
+        """
+        if self.too_long:
+            raise AudioTooLongError(self.max_seconds)
+        try:
+            self.process.stdin.write(data)
+        except BrokenPipeError:
+            # ffmpeg завершился с ошибкой, подробности вернет finish()
+            pass
+
+    def finish(self):
+        """
+        Завершает ввод и дожидается окончания декодирования
+
+        Returns:
+            np.ndarray: Моно аудио float32
+
+        Raises:
+            AudioDecodeError: Данные не декодируются или запись длиннее max_seconds
+        """
+        try:
+            self.process.stdin.close()
+        except BrokenPipeError:
+            pass
+        self._reader.join()
+        self._error_reader.join()
+        if self.too_long:
+            self.process.wait()
+            raise AudioTooLongError(self.max_seconds)
+        if self.process.wait() != 0:
+            raise AudioDecodeError(f"Не удалось декодировать аудио: {self._stderr.decode(errors='replace')}")
+        return np.frombuffer(self._buffer, np.float32)
+
+    def abort(self):
+        """Прерывает декодирование (например, если результат найден в кэше)"""
+        self.process.kill()
+        for pipe in (self.process.stdin, self.process.stdout, self.process.stderr):
+            try:
+                pipe.close()
+            except (OSError, ValueError):
+                pass
+        self.process.wait()
@@ -3,35 +3,51 @@
 Простой скрипт для преобразования аудио в текст с использованием OpenAI Whisper
 """
 
-import whisper
 import os
 import sys
 from pathlib import Path
+from transcription_daemon import transcribe_via_daemon
 
-def transcribe_audio(audio_file_path, model_size="base"):
+def transcribe_audio(audio_file_path, model_size="base", vad=False):
     """
     Преобразует аудиофайл в текст
     
     Args:
         audio_file_path (str): Путь к аудиофайлу
-        model_size (str): Размер модели Whisper ("tiny", "base", "small", "medium", "large")
+        model_size (str): Размер модели Whisper ("tiny", "base", "small", "medium", "large"),
+            с суффиксом "-int8" - квантованная модель для CPU
+        vad (bool): Транскрибировать только участки речи, пропуская тишину
     
     Returns:
         str: Транскрибированный текст
     """
     try:
-        # Загружаем модель
-        print(f"Загружаем модель Whisper {model_size}...")
-        model = whisper.load_model(model_size)
-        
         # Проверяем существование файла
         if not os.path.exists(audio_file_path):
             raise FileNotFoundError(f"Файл {audio_file_path} не найден")
         
+        # Запущенный демон уже держит модель в памяти
+        result = transcribe_via_daemon(audio_file_path, model_size, vad=vad)
+        if result is not None:
+            print("Транскрипция выполнена демоном")
+            return result["text"]
+        
+        # Тяжелые модули импортируем, только если демона нет
+        import whisper
+        from backends import load_model
+        from vad import transcribe_speech_only
+        
+        # Загружаем модель
+        print(f"Загружаем модель Whisper {model_size}...")
+        model = load_model(model_size)
+        
         print(f"Обрабатываем файл: {audio_file_path}")
         
         # Транскрибируем аудио
-        result = model.transcribe(audio_file_path)
+        if vad:
+            result = transcribe_speech_only(model.transcribe, whisper.load_audio(audio_file_path))
+        else:
+            result = model.transcribe(audio_file_path)
         
         return result["text"]
     
@@ -49,14 +65,19 @@ def save_transcription(text, output_file):
         print(f"Ошибка при сохранении файла: {e}")
 
 def main():
-    if len(sys.argv) < 2:
-        print("Использование: python audio_to_text.py <путь_к_аудиофайлу> [размер_модели]")
-        print("Размеры модели: tiny, base, small, medium, large")
+    # --vad можно указать в любом месте командной строки
+    vad = '--vad' in sys.argv
+    argv = [arg for arg in sys.argv if arg != '--vad']
+    
+    if len(argv) < 2:
+        print("Использование: python audio_to_text.py <путь_к_аудиофайлу> [размер_модели] [--vad]")
+        print("Размеры модели: tiny, base, small, medium, large (суффикс -int8 - быстрее на CPU)")
+        print("--vad: пропускать тишину (транскрибировать только участки речи)")
         print("Пример: python audio_to_text.py audio.mp3 base")
         sys.exit(1)
     
-    audio_file = sys.argv[1]
-    model_size = sys.argv[2] if len(sys.argv) > 2 else "base"
+    audio_file = argv[1]
+    model_size = argv[2] if len(argv) > 2 else "base"
     
     print("=== Преобразователь аудио в текст ===")
     print(f"Входной файл: {audio_file}")
@@ -64,7 +85,7 @@ def main():
     print()
     
     # Транскрибируем аудио
-    text = transcribe_audio(audio_file, model_size)
+    text = transcribe_audio(audio_file, model_size, vad)
     
     if text:
         print("=== Результат транскрипции ===")
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Бэкенды инференса моделей Whisper
+
+Бэкенд выбирается суффиксом имени модели: "base" - обычная модель
+openai-whisper (fp32), "base-int8" - та же модель с динамическим
+квантованием линейных слоев в int8 для CPU. Квантованная модель
+работает в 2-4 раза быстрее на процессоре ценой небольшой потери точности
+и поддерживает тот же интерфейс (transcribe, detect_language, decode).
+"""
+
+import os
+
+
+DEFAULT_BACKEND = 'fp32'
+
+# Читать файл весов через mmap: файл не копируется целиком во временный буфер,
+# а страницы из кэша ОС переиспользуются следующими процессами
+MMAP_WEIGHTS = os.environ.get('MODEL_MMAP', '0') == '1'
+
+
+def _load_whisper_mmap(name, device=None):
+    """Как whisper.load_model, но контрольная точка открывается через mmap"""
+    import torch
+    import whisper
+    from whisper.model import ModelDimensions, Whisper
+
+    if name in whisper._MODELS:
+        download_root = os.path.join(
+            os.getenv('XDG_CACHE_HOME', os.path.join(os.path.expanduser('~'), '.cache')), 'whisper'
+        )
+        checkpoint_file = whisper._download(whisper._MODELS[name], download_root, False)
+        alignment_heads = whisper._ALIGNMENT_HEADS[name]
+    elif os.path.isfile(name):
+        checkpoint_file = name
+        alignment_heads = None
+    else:
+        raise RuntimeError(f"Модель {name} не найдена; доступные модели: {whisper.available_models()}")
+
+    checkpoint = torch.load(checkpoint_file, map_location='cpu', mmap=True, weights_only=True)
+    model = Whisper(ModelDimensions(**checkpoint['dims']))
+    # assign=True делает отображенные тензоры параметрами модели вместо копирования в них;
+    # веса в fp16 (официальные контрольные точки) приводятся к fp32, как в whisper.load_model
+    model.load_state_dict(checkpoint['model_state_dict'], assign=True)
+    model.float()
+    if alignment_heads is not None:
+        model.set_alignment_heads(alignment_heads)
+    if device is None:
+        device = 'cuda' if torch.cuda.is_available() else 'cpu'
+    return model.to(device)
+
+
+def load_whisper(name, device=None):
+    """Обычная модель openai-whisper"""
+    if MMAP_WEIGHTS:
+        return _load_whisper_mmap(name, device)
+    import whisper
+    return whisper.load_model(name, device=device)
+
+
+def load_int8(name, device=None):
+    """Модель с линейными слоями, динамически квантованными в int8 (только CPU)"""
+    import torch
+    from torch import nn
+
+    if device not in (None, 'cpu'):
+        raise ValueError("Квантованный бэкенд int8 работает только на CPU")
+    model = load_whisper(name, device='cpu')
+    # quantize_dynamic заменяет только модули точного типа nn.Linear, а в Whisper
+    # используется его подкласс с приведением типов; для fp32 на CPU они эквивалентны
+    for module in model.modules():
+        if isinstance(module, nn.Linear) and type(module) is not nn.Linear:
+            module.__class__ = nn.Linear
+    return torch.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
+
+
+# Бэкенды по суффиксу имени модели
+BACKENDS = {
+    'fp32': load_whisper,
+    'int8': load_int8,
+}
+
+
+def parse_model_spec(spec):
+    """
+    Делит имя модели на модель Whisper и бэкенд
+
+    "base-int8" -> ("base", "int8"), "large-v3" -> ("large-v3", "fp32")
+    """
+    name, _, suffix = spec.rpartition('-')
+    if name and suffix in BACKENDS:
+        return name, suffix
+    return spec, DEFAULT_BACKEND
+
+
+def load_model(spec, device=None):
+    """
+    Загружает модель с бэкендом, указанным в имени
+
+    Args:
+        spec (str): Имя модели, например "base" или "small-int8"
+        device (str): Устройство (None - по умолчанию Whisper)
+    """
+    name, backend = parse_model_spec(spec)
+    return BACKENDS[backend](name, device)
+
+
+def warm_up(model):
+    """
+    Пробный короткий проход кодировщика и декодера
+
+    Выделяет рабочие буферы и прогревает ядра вычислений, чтобы первый
+    настоящий запрос не платил за это задержкой.
+    """
+    import numpy as np
+    import whisper
+
+    mel = whisper.log_mel_spectrogram(
+        whisper.pad_or_trim(np.zeros(16000, dtype=np.float32)), model.dims.n_mels
+    ).to(model.device)
+    options = whisper.DecodingOptions(
+        language='en' if model.is_multilingual else None,
+        without_timestamps=True,
+        sample_len=8,
+        fp16=model.device.type == 'cuda'
+    )
+    whisper.decode(model, mel, options)
+
@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+Пакетная обработка коротких записей
+
+Одновременные запросы к одной модели собираются в пакет (не больше
+max_batch_size, ожидание не дольше max_wait_ms) и проходят через
+кодировщик и декодер Whisper одним батчем. Это лучше загружает ядра
+процессора, чем отдельный проход с размером батча 1 на каждый запрос.
+Пакетно обрабатываются записи не длиннее одного окна Whisper (30 с);
+остальные, а также неудачные результаты, транскрибируются обычным путем.
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import nullcontext
+
+from audio_io import SAMPLE_RATE
+
+
+WINDOW_SECONDS = 30
+# Шаг временных меток Whisper в секундах
+TIMESTAMP_STEP = 0.02
+# Пороги те же, что в whisper.transcribe
+COMPRESSION_RATIO_THRESHOLD = 2.4
+LOGPROB_THRESHOLD = -1.0
+NO_SPEECH_THRESHOLD = 0.6
+
+
+def parse_segments(tokens, tokenizer, duration):
+    """
+    Делит токены результата декодирования на сегменты по временным меткам
+
+    Args:
+        tokens (list): Токены без служебного префикса
+        tokenizer: Токенизатор Whisper
+        duration (float): Длина записи в секундах
+
+    Returns:
+        list: Сегменты в формате model.transcribe (id, start, end, text, tokens)
+    """
+    timestamp_begin = tokenizer.timestamp_begin
+    segments = []
+    start = None
+    text_tokens = []
+
+    def add_segment(end):
+        text = tokenizer.decode(text_tokens)
+        if text.strip():
+            segments.append({
+                'id': len(segments),
+                'start': round(start or 0.0, 2),
+                'end': round(min(end, duration), 2),
+                'text': text,
+                'tokens': list(text_tokens)
+            })
+
+    for token in tokens:
+        if token >= timestamp_begin:
+            t = (token - timestamp_begin) * TIMESTAMP_STEP
+            if text_tokens:
+                add_segment(t)
+                text_tokens = []
+                start = None
+            else:
+                start = t
+        elif token < tokenizer.eot:
+            text_tokens.append(token)
+    if text_tokens:
+        add_segment(duration)
+    return segments
+
+
+class _Request:
+    def __init__(self, audio, language, mel=None):
+        self.audio = audio
+        self.language = language
+        self.mel = mel
+        self.future = Future()
+
+    def window_mel(self, n_mels):
+        """Спектрограмма окна: готовая, если она посчитана с тем же числом мел-полос"""
+        if self.mel is not None and self.mel.shape[0] == n_mels:
+            return self.mel
+        import whisper
+
+        return whisper.log_mel_spectrogram(whisper.pad_or_trim(self.audio), n_mels)
+
+
+class BatchScheduler:
+    def __init__(self, get_model, max_batch_size=8, max_wait_ms=20, lock=None):
+        """
+        Планировщик пакетной транскрипции
+
+        Args:
+            get_model: Функция get_model(model_size), возвращающая модель Whisper
+            max_batch_size (int): Максимальный размер пакета
+            max_wait_ms (float): Сколько ждать новых запросов после первого в пакете
+            lock: Функция lock(model_size), возвращающая блокировку инференса модели
+                (та же модель используется и вне планировщика, см. ModelCache.lock)
+        """
+        self.get_model = get_model
+        self.lock = lock or (lambda model_size: nullcontext())
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max_wait_ms / 1000
+        self._queues = {}
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.batched_requests = 0
+        self.fallbacks = 0
+
+    @staticmethod
+    def supports(audio, **options):
+        """Можно ли обработать запрос пакетно (короткая запись, только параметр language)"""
+        return len(audio) <= WINDOW_SECONDS * SAMPLE_RATE and set(options) <= {'language'}
+
+    def transcribe(self, model_size, audio, language=None, mel=None):
+        """
+        Транскрибирует короткую запись в составе пакета
+
+        Args:
+            mel: Спектрограмма записи, уже посчитанная при определении языка
+                (language_detect.first_window_mel); используется, если у модели
+                то же число мел-полос
+
+        Returns:
+            dict: Результат в формате model.transcribe ('text', 'segments', 'language')
+        """
+        request = _Request(audio, language, mel)
+        self._queue_for(model_size).put(request)
+        return request.future.result()
+
+    def stats(self):
+        return {
+            'batches': self.batches,
+            'batched_requests': self.batched_requests,
+            'average_batch_size': round(self.batched_requests / self.batches, 2) if self.batches else 0.0,
+            'fallbacks': self.fallbacks
+        }
+
+    def _queue_for(self, model_size):
+        with self._lock:
+            requests = self._queues.get(model_size)
+            if requests is None:
+                requests = queue.Queue()
+                self._queues[model_size] = requests
+                threading.Thread(
+                    target=self._worker_loop,
+                    args=(model_size, requests),
+                    name=f'batch-{model_size}',
+                    daemon=True
+                ).start()
+            return requests
+
+    def _collect(self, requests):
+        """Ждет первый запрос, затем добирает пакет в пределах max_wait"""
+        batch = [requests.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(requests.get(timeout=timeout))
+            except queue.Empty:
+                break
+        return batch
+
+    def _worker_loop(self, model_size, requests):
+        # Один поток на модель: модель Whisper не рассчитана на параллельные вызовы,
+        # а с другими потоками, использующими ту же модель, делим её блокировку
+        while True:
+            batch = self._collect(requests)
+            try:
+                model = self.get_model(model_size)
+                # Язык задается для всего пакета, поэтому группируем по нему
+                groups = {}
+                for request in batch:
+                    groups.setdefault(request.language, []).append(request)
+                with self.lock(model_size):
+                    for language, group in groups.items():
+                        self._run_group(model, language, group)
+            except Exception as e:
+                for request in batch:
+                    if not request.future.done():
+                        request.future.set_exception(e)
+
+    def _run_group(self, model, language, group):
+        import torch
+        import whisper
+
+        mel = torch.stack([request.window_mel(model.dims.n_mels) for request in group]).to(model.device)
+        options = whisper.DecodingOptions(
+            language=language,
+            fp16=model.device.type == 'cuda'
+        )
+        results = whisper.decode(model, mel, options)
+        self.batches += 1
+        self.batched_requests += len(group)
+
+        tokenizer = whisper.tokenizer.get_tokenizer(
+            model.is_multilingual, num_languages=model.num_languages
+        )
+        for request, result in zip(group, results):
+            try:
+                request.future.set_result(self._to_transcription(model, request, result, tokenizer))
+            except Exception as e:
+                request.future.set_exception(e)
+
+    def _to_transcription(self, model, request, result, tokenizer):
+        # Тишина: как в whisper.transcribe, пропускаем окно без речи
+        if result.no_speech_prob > NO_SPEECH_THRESHOLD and result.avg_logprob < LOGPROB_THRESHOLD:
+            return {'text': '', 'segments': [], 'language': result.language}
+
+        # Без перебора температур пакетный результат может зациклиться -
+        # такие записи транскрибируем обычным путем
+        if result.compression_ratio > COMPRESSION_RATIO_THRESHOLD or \
+                result.avg_logprob < LOGPROB_THRESHOLD:
+            self.fallbacks += 1
+            return model.transcribe(request.audio, language=request.language)
+
+        duration = len(request.audio) / SAMPLE_RATE
+        segments = parse_segments(result.tokens, tokenizer, duration)
+        for segment in segments:
+            segment.update({
+                'temperature': result.temperature,
+                'avg_logprob': result.avg_logprob,
+                'compression_ratio': result.compression_ratio,
+                'no_speech_prob': result.no_speech_prob
+            })
+        return {
+            'text': ''.join(segment['text'] for segment in segments),
+            'segments': segments,
+            'language': result.language
+        }
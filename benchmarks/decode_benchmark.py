@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк декодирования аудио перед транскрипцией
+
+Сравнивает старый путь (pydub -> временный WAV -> повторное декодирование
+ffmpeg внутри Whisper) с прямым декодированием ffmpeg в массив NumPy.
+Каждый замер выполняется в отдельном процессе, чтобы пиковая память
+(ru_maxrss) относилась только к нему.
+
+Пример:
+    python benchmarks/decode_benchmark.py --duration 600 --repeat 3
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def generate_audio(path, duration):
+    """Создает тестовую запись: тон с шумом и паузами"""
+    subprocess.run([
+        'ffmpeg', '-y', '-loglevel', 'error',
+        '-f', 'lavfi', '-i', f'sine=frequency=440:duration={duration}',
+        '-f', 'lavfi', '-i', f'anoisesrc=color=pink:amplitude=0.05:duration={duration}',
+        '-filter_complex', 'amix=inputs=2,volume=2',
+        '-ac', '2', '-ar', '44100',
+        path
+    ], check=True)
+
+
+def decode_pydub_wav(path):
+    """Старый путь: pydub -> временный WAV -> whisper.load_audio"""
+    import whisper
+    from pydub import AudioSegment
+
+    audio = AudioSegment.from_file(path)
+    temp_file = tempfile.NamedTemporaryFile(suffix='.wav', delete=False)
+    temp_file.close()
+    try:
+        audio.export(temp_file.name, format='wav')
+        del audio
+        return whisper.load_audio(temp_file.name)
+    finally:
+        os.unlink(temp_file.name)
+
+
+def decode_direct(path):
+    """Новый путь: ffmpeg -> float32 массив в памяти"""
+    from audio_io import decode_audio
+    return decode_audio(path)
+
+
+METHODS = {
+    'pydub_wav': decode_pydub_wav,
+    'direct': decode_direct,
+}
+
+
+def measure(method, path):
+    """Выполняется в дочернем процессе: печатает время и пиковую память в JSON"""
+    # Whisper (и torch) загружены в процессе транскрипции в любом случае,
+    # поэтому импортируем их до замера и считаем прирост памяти от этой базы
+    import whisper  # noqa: F401
+    import pydub  # noqa: F401
+    import audio_io  # noqa: F401
+    baseline_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    started = time.perf_counter()
+    audio = METHODS[method](path)
+    elapsed = time.perf_counter() - started
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({
+        'seconds': elapsed,
+        'peak_rss_mb': peak_kb / 1024,
+        'rss_growth_mb': (peak_kb - baseline_kb) / 1024,
+        'samples': len(audio)
+    }))
+
+
+def run_measurement(method, path):
+    out = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--measure', method, path],
+        capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарк декодирования аудио')
+    parser.add_argument('--duration', type=int, default=300,
+                       help='Длительность тестовой записи в секундах')
+    parser.add_argument('--repeat', type=int, default=3,
+                       help='Количество повторов каждого замера')
+    parser.add_argument('--formats', nargs='+',
+                       help='Форматы для проверки (по умолчанию все поддерживаемые)')
+    parser.add_argument('--json', help='Сохранить результаты в JSON-файл')
+    parser.add_argument('--measure', nargs=2, metavar=('METHOD', 'PATH'),
+                       help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        measure(*args.measure)
+        return
+
+    if args.formats:
+        formats = args.formats
+    else:
+        from advanced_audio_to_text import AudioToTextConverter
+        formats = AudioToTextConverter().supported_formats
+    work_dir = tempfile.mkdtemp(prefix='decode_bench_')
+    results = []
+
+    print(f"=== Бенчмарк декодирования ({args.duration} с аудио, {args.repeat} повтора) ===")
+    print(f"{'формат':<8}{'метод':<12}{'время, с':>10}{'пик RSS, МБ':>14}{'прирост, МБ':>14}")
+    for fmt in formats:
+        path = os.path.join(work_dir, f'sample{fmt}')
+        try:
+            generate_audio(path, args.duration)
+        except subprocess.CalledProcessError:
+            print(f"{fmt:<8}пропущен: ffmpeg не умеет кодировать этот формат")
+            continue
+
+        for method in METHODS:
+            runs = [run_measurement(method, path) for _ in range(args.repeat)]
+            seconds = min(r['seconds'] for r in runs)
+            peak = max(r['peak_rss_mb'] for r in runs)
+            growth = max(r['rss_growth_mb'] for r in runs)
+            results.append({
+                'format': fmt,
+                'method': method,
+                'duration': args.duration,
+                'seconds': seconds,
+                'peak_rss_mb': peak,
+                'rss_growth_mb': growth
+            })
+            print(f"{fmt:<8}{method:<12}{seconds:>10.2f}{peak:>14.1f}{growth:>14.1f}")
+        os.remove(path)
+
+    os.rmdir(work_dir)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"Результаты сохранены в: {args.json}")
+
+
+if __name__ == '__main__':
+    main()
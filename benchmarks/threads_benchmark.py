@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк распределения ядер между параллельными транскрипциями
+
+Для каждой конфигурации "процессы x потоки" запускает процессы с моделью,
+каждый со своим числом потоков PyTorch (и, при желании, привязкой к ядрам),
+транскрибирует одну и ту же запись заданное число раз и сравнивает
+суммарную пропускную способность (секунд аудио в секунду) и задержку.
+
+Пример:
+    python benchmarks/threads_benchmark.py --model base --configs 1x8 2x4 4x2 8x1
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from decode_benchmark import generate_audio  # noqa: E402
+
+
+def parse_config(spec):
+    """"2x4" -> (2 процесса, 4 потока)"""
+    workers, _, threads = spec.lower().partition('x')
+    return int(workers), int(threads)
+
+
+def _run_worker(model_size, audio_path, clips, threads, cpus, ready, start_event, results):
+    from audio_io import decode_audio
+    from backends import load_model
+    from cpu_threads import configure_worker
+
+    configure_worker(threads, cpus)
+    model = load_model(model_size)
+    audio = decode_audio(audio_path)
+    # Прогрев, чтобы в замер не попали выделение буферов и первая загрузка ядер
+    model.transcribe(audio[:16000], language='en', temperature=0.0)
+
+    ready.put(True)
+    start_event.wait()
+    latencies = []
+    for _ in range(clips):
+        started = time.perf_counter()
+        model.transcribe(audio, language='en', temperature=0.0, condition_on_previous_text=False)
+        latencies.append(time.perf_counter() - started)
+    results.put(latencies)
+
+
+def run_config(model_size, audio_path, duration, workers, threads, clips, pin_cpus):
+    """Запускает одну конфигурацию и возвращает ее метрики"""
+    from cpu_threads import available_cores
+
+    context = multiprocessing.get_context('spawn')
+    ready = context.Queue()
+    start_event = context.Event()
+    results = context.Queue()
+    cores = available_cores()
+    per_worker = [clips // workers + (1 if i < clips % workers else 0) for i in range(workers)]
+    processes = []
+    for i in range(workers):
+        cpus = [cores[(i * threads + j) % len(cores)] for j in range(threads)] if pin_cpus else None
+        process = context.Process(
+            target=_run_worker,
+            args=(model_size, audio_path, per_worker[i], threads, cpus, ready, start_event, results)
+        )
+        process.start()
+        processes.append(process)
+
+    # Замер начинается, когда все процессы загрузили модели и прогрелись
+    for _ in processes:
+        ready.get()
+    started = time.perf_counter()
+    start_event.set()
+    latencies = []
+    for _ in processes:
+        latencies.extend(results.get())
+    wall = time.perf_counter() - started
+    for process in processes:
+        process.join()
+
+    latencies.sort()
+    return {
+        'workers': workers,
+        'threads': threads,
+        'pinned': pin_cpus,
+        'clips': len(latencies),
+        'wall_seconds': wall,
+        'throughput': len(latencies) * duration / wall,
+        'latency_mean': sum(latencies) / len(latencies),
+        'latency_max': latencies[-1]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарк распределения ядер между транскрипциями')
+    parser.add_argument('--model', default='base', help='Модель (можно с суффиксом бэкенда, base-int8)')
+    parser.add_argument('--duration', type=int, default=30, help='Длительность тестовой записи в секундах')
+    parser.add_argument('--clips', type=int, default=8, help='Сколько транскрипций в каждой конфигурации')
+    parser.add_argument('--configs', nargs='+', default=None,
+                       help='Конфигурации "процессыxпотоки" (по умолчанию по числу ядер)')
+    parser.add_argument('--pin-cpus', action='store_true', help='Привязать процессы к своим ядрам')
+    parser.add_argument('--json', help='Сохранить результаты в JSON-файл')
+    args = parser.parse_args()
+
+    from cpu_threads import available_cores
+    cores = len(available_cores())
+    if args.configs:
+        configs = [parse_config(spec) for spec in args.configs]
+    else:
+        configs = []
+        workers = 1
+        while workers <= cores:
+            configs.append((workers, cores // workers))
+            workers *= 2
+
+    work_dir = tempfile.mkdtemp(prefix='threads_bench_')
+    audio_path = os.path.join(work_dir, 'sample.wav')
+    generate_audio(audio_path, args.duration)
+
+    print(f"=== Распределение ядер: {cores} ядер, модель {args.model}, "
+          f"{args.clips} x {args.duration} с ===")
+    print(f"{'процессы':>9}{'потоки':>8}{'аудио с/с':>11}{'задержка, с':>13}{'макс, с':>9}")
+    results = []
+    for workers, threads in configs:
+        result = run_config(args.model, audio_path, args.duration, workers, threads,
+                            args.clips, args.pin_cpus)
+        results.append(result)
+        print(f"{workers:>9}{threads:>8}{result['throughput']:>11.2f}"
+              f"{result['latency_mean']:>13.2f}{result['latency_max']:>9.2f}")
+
+    os.remove(audio_path)
+    os.rmdir(work_dir)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'cores': cores, 'model': args.model, 'results': results}, f, indent=2)
+        print(f"Результаты сохранены в: {args.json}")
+
+
+if __name__ == '__main__':
+    main()
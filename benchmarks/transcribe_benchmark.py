@@ -0,0 +1,367 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк скорости транскрипции
+
+Генерирует тестовые записи (длительность, формат, доля тишины) и
+прогоняет их через три пути: audio_to_text.transcribe_audio,
+AudioToTextConverter.transcribe_audio и /upload в app.py с N
+одновременными клиентами. Для каждой комбинации выводит коэффициент
+реального времени (RTF = время обработки / длительность записи),
+задержку p50/p95, пиковую память и пропускную способность.
+
+Локальные пути замеряются в отдельных процессах, чтобы пиковая память
+относилась только к замеру. Для /upload запускается сервер с
+предзагрузкой моделей, замер начинается после ответа /ready.
+
+Пример:
+    python benchmarks/transcribe_benchmark.py --models tiny base --durations 10 60 \\
+        --formats .wav .mp3 --silence 0 0.5 --clients 1 4 --json results.json
+"""
+
+import argparse
+import json
+import math
+import os
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+PATHS = ('simple', 'converter', 'upload')
+# Период чередования звука и тишины в тестовой записи, секунды
+SILENCE_PERIOD = 10
+
+
+def generate_audio(path, duration, silence_ratio=0.0):
+    """
+    Создает тестовую запись: тон с шумом, в каждом периоде SILENCE_PERIOD
+    последняя доля silence_ratio заглушена
+    """
+    sound = SILENCE_PERIOD * (1 - silence_ratio)
+    subprocess.run([
+        'ffmpeg', '-y', '-loglevel', 'error',
+        '-f', 'lavfi', '-i', f'sine=frequency=440:duration={duration}',
+        '-f', 'lavfi', '-i', f'anoisesrc=color=pink:amplitude=0.05:duration={duration}',
+        '-filter_complex',
+        f"amix=inputs=2,volume=2,volume=enable='gte(mod(t,{SILENCE_PERIOD}),{sound})':volume=0",
+        '-ac', '2', '-ar', '44100',
+        path
+    ], check=True)
+
+
+def percentile(values, p):
+    """Перцентиль методом ближайшего ранга"""
+    values = sorted(values)
+    if not values:
+        return None
+    # Ранг - наименьшее k, при котором не меньше p% значений <= values[k - 1]
+    return values[max(0, math.ceil(p / 100 * len(values)) - 1)]
+
+
+def summarize(latencies, duration, wall=None):
+    """Сводные метрики по списку задержек (wall=None - запуски шли последовательно)"""
+    wall = wall if wall is not None else sum(latencies)
+    p50 = percentile(latencies, 50)
+    return {
+        'runs': len(latencies),
+        'latency_p50': p50,
+        'latency_p95': percentile(latencies, 95),
+        'rtf': p50 / duration,
+        'throughput': len(latencies) * duration / wall if wall else None
+    }
+
+
+def measure(path_name, model_size, audio_path, repeat):
+    """Выполняется в дочернем процессе: печатает задержки и пиковую память в JSON"""
+    latencies = []
+    if path_name == 'simple':
+        from audio_to_text import transcribe_audio
+        # Функция загружает модель при каждом вызове - это входит в замер
+        run = lambda: transcribe_audio(audio_path, model_size)
+    else:
+        from advanced_audio_to_text import AudioToTextConverter
+        converter = AudioToTextConverter(model_size, verbose=False)
+        run = lambda: converter.transcribe_audio(audio_path)
+
+    for _ in range(repeat):
+        started = time.perf_counter()
+        run()
+        latencies.append(time.perf_counter() - started)
+    print(json.dumps({
+        'latencies': latencies,
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    }))
+
+
+def run_local(path_name, model_size, audio_path, duration, repeat):
+    out = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--measure',
+         path_name, model_size, audio_path, str(repeat)],
+        capture_output=True, text=True, check=True
+    ).stdout
+    measured = json.loads(out.strip().splitlines()[-1])
+    latencies = measured['latencies']
+    # У конвертера первый вызов загружает модель: считаем его отдельно
+    if path_name == 'converter' and len(latencies) > 1:
+        result = summarize(latencies[1:], duration)
+        result['cold_seconds'] = latencies[0]
+    else:
+        result = summarize(latencies, duration)
+    result['peak_rss_mb'] = measured['peak_rss_mb']
+    return result
+
+
+def serve(port):
+    """Выполняется в дочернем процессе: сервер app.py без перезагрузчика"""
+    import app
+    app.app.run(host='127.0.0.1', port=port, threaded=True, debug=False)
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _request_json(url, data=None, headers=None, timeout=600):
+    request = urllib.request.Request(url, data=data, headers=headers or {})
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read() or b'{}')
+
+
+class UploadServer:
+    def __init__(self, models, workers):
+        """Сервер app.py в дочернем процессе с предзагрузкой моделей"""
+        self.port = _free_port()
+        self.base_url = f'http://127.0.0.1:{self.port}'
+        env = dict(os.environ)
+        env.update({
+            'PRELOAD_MODELS': ','.join(models),
+            'RESULT_CACHE_ENABLED': '0',
+            'RESULT_STORE': 'memory',
+            'TRANSCRIPTION_WORKERS': str(workers),
+            'TRANSCRIPTION_QUEUE_SIZE': '1000'
+        })
+        self.process = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), '--serve', str(self.port)],
+            cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+
+    def wait_ready(self, timeout=1800):
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError("Сервер app.py завершился при запуске")
+            try:
+                status, _ = _request_json(f'{self.base_url}/ready', timeout=5)
+                if status == 200:
+                    return
+            except (urllib.error.URLError, ConnectionError):
+                pass
+            time.sleep(0.5)
+        raise RuntimeError("Сервер app.py не стал готов вовремя")
+
+    def peak_rss_mb(self):
+        """Пиковая память процесса сервера (только Linux)"""
+        try:
+            with open(f'/proc/{self.process.pid}/status') as f:
+                for line in f:
+                    if line.startswith('VmHWM:'):
+                        return int(line.split()[1]) / 1024
+        except OSError:
+            pass
+        return None
+
+    def transcribe(self, audio_path, model_size):
+        """Загрузка через /upload и ожидание результата; возвращает задержку"""
+        boundary = uuid.uuid4().hex
+        with open(audio_path, 'rb') as f:
+            content = f.read()
+        body = b''.join([
+            f'--{boundary}\r\nContent-Disposition: form-data; name="model_size"\r\n\r\n'
+            f'{model_size}\r\n'.encode(),
+            f'--{boundary}\r\nContent-Disposition: form-data; name="audio"; '
+            f'filename="{os.path.basename(audio_path)}"\r\n'
+            'Content-Type: application/octet-stream\r\n\r\n'.encode(),
+            content,
+            f'\r\n--{boundary}--\r\n'.encode()
+        ])
+        started = time.perf_counter()
+        status, response = _request_json(
+            f'{self.base_url}/upload', body,
+            {'Content-Type': f'multipart/form-data; boundary={boundary}'}
+        )
+        if status not in (200, 202):
+            raise RuntimeError(f"/upload ответил {status}: {response.get('error')}")
+        while response.get('status') not in ('done', 'failed'):
+            time.sleep(0.05)
+            _, response = _request_json(f"{self.base_url}/status/{response['transcription_id']}")
+        if response['status'] == 'failed':
+            raise RuntimeError(f"Транскрипция не удалась: {response.get('error')}")
+        return time.perf_counter() - started
+
+    def stop(self):
+        self.process.terminate()
+        self.process.wait(timeout=30)
+
+
+def run_upload(server, model_size, audio_path, duration, clients, requests_per_client):
+    """N клиентов одновременно отправляют по requests_per_client записей"""
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+
+    def client():
+        for _ in range(requests_per_client):
+            try:
+                latency = server.transcribe(audio_path, model_size)
+                with lock:
+                    latencies.append(latency)
+            except Exception as e:
+                with lock:
+                    errors.append(str(e))
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+
+    result = summarize(latencies, duration, wall) if latencies else {'runs': 0}
+    result['errors'] = len(errors)
+    result['peak_rss_mb'] = server.peak_rss_mb()
+    return result
+
+
+def print_row(result):
+    def fmt(value, spec):
+        return format(value, spec) if value is not None else '-'
+    silence = f"{result['silence']:.0%}" if result['silence'] is not None else '-'
+    print(f"{result['path']:<10}{result['model']:<14}{result['format']:<7}"
+          f"{result['duration']:>6.0f}{silence:>7}{result['clients']:>8}"
+          f"{fmt(result.get('rtf'), '.3f'):>7}{fmt(result.get('latency_p50'), '.2f'):>8}"
+          f"{fmt(result.get('latency_p95'), '.2f'):>8}{fmt(result.get('throughput'), '.2f'):>10}"
+          f"{fmt(result.get('peak_rss_mb'), '.0f'):>9}")
+
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарк скорости транскрипции')
+    parser.add_argument('--models', nargs='+', default=['tiny', 'base'],
+                       help='Модели (можно с суффиксом бэкенда, base-int8)')
+    parser.add_argument('--paths', nargs='+', choices=PATHS, default=list(PATHS),
+                       help='Пути транскрипции для замера')
+    parser.add_argument('--durations', nargs='+', type=int, default=[10, 60],
+                       help='Длительности тестовых записей в секундах')
+    parser.add_argument('--formats', nargs='+',
+                       help='Форматы тестовых записей (по умолчанию все поддерживаемые)')
+    parser.add_argument('--silence', nargs='+', type=float, default=[0.0, 0.5],
+                       help='Доли тишины в тестовых записях')
+    parser.add_argument('--audio', nargs='+',
+                       help='Готовые записи вместо сгенерированных')
+    parser.add_argument('--repeat', type=int, default=3,
+                       help='Повторов для локальных путей')
+    parser.add_argument('--clients', nargs='+', type=int, default=[1, 4],
+                       help='Числа одновременных клиентов для /upload')
+    parser.add_argument('--requests', type=int, default=2,
+                       help='Запросов на одного клиента /upload')
+    parser.add_argument('--json', help='Сохранить результаты в JSON-файл')
+    parser.add_argument('--measure', nargs=4, metavar=('PATH', 'MODEL', 'AUDIO', 'REPEAT'),
+                       help=argparse.SUPPRESS)
+    parser.add_argument('--serve', type=int, metavar='PORT', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        path_name, model_size, audio_path, repeat = args.measure
+        measure(path_name, model_size, audio_path, int(repeat))
+        return
+    if args.serve:
+        serve(args.serve)
+        return
+
+    from audio_io import SAMPLE_RATE, decode_audio
+    from advanced_audio_to_text import SUPPORTED_FORMATS
+
+    work_dir = tempfile.mkdtemp(prefix='transcribe_bench_')
+    samples = []
+    if args.audio:
+        for path in args.audio:
+            samples.append({'path': path, 'format': os.path.splitext(path)[1].lower(),
+                            'duration': len(decode_audio(path)) / SAMPLE_RATE, 'silence': None})
+    else:
+        for fmt in args.formats or SUPPORTED_FORMATS:
+            for duration in args.durations:
+                for silence in args.silence:
+                    path = os.path.join(work_dir, f'sample_{duration}s_{int(silence * 100)}{fmt}')
+                    try:
+                        generate_audio(path, duration, silence)
+                    except subprocess.CalledProcessError:
+                        print(f"{fmt}: пропущен, ffmpeg не умеет кодировать этот формат")
+                        break
+                    samples.append({'path': path, 'format': fmt,
+                                    'duration': duration, 'silence': silence})
+
+    server = None
+    if 'upload' in args.paths:
+        server = UploadServer(args.models, max(args.clients))
+        server.wait_ready()
+
+    results = []
+    print(f"{'путь':<10}{'модель':<14}{'формат':<7}{'длит.':>6}{'тишина':>7}{'клиенты':>8}"
+          f"{'RTF':>7}{'p50, с':>8}{'p95, с':>8}{'аудио с/с':>10}{'RSS, МБ':>9}")
+    try:
+        for sample in samples:
+            for model_size in args.models:
+                for path_name in args.paths:
+                    if path_name == 'upload':
+                        runs = [(clients, run_upload(server, model_size, sample['path'],
+                                                     sample['duration'], clients, args.requests))
+                                for clients in args.clients]
+                    else:
+                        runs = [(1, run_local(path_name, model_size, sample['path'],
+                                              sample['duration'], args.repeat))]
+                    for clients, result in runs:
+                        result.update({
+                            'path': path_name,
+                            'model': model_size,
+                            'format': sample['format'],
+                            'duration': sample['duration'],
+                            'silence': sample['silence'],
+                            'clients': clients
+                        })
+                        results.append(result)
+                        print_row(result)
+    finally:
+        if server is not None:
+            server.stop()
+        if not args.audio:
+            for sample in samples:
+                os.remove(sample['path'])
+            os.rmdir(work_dir)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({
+                'cpu_count': os.cpu_count(),
+                'python': sys.version.split()[0],
+                'results': results
+            }, f, indent=2)
+        print(f"Результаты сохранены в: {args.json}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+"""
+Контрольные точки длинных транскрипций
+
+Длинная запись транскрибируется по кускам (long_audio.transcribe_incremental),
+и после каждого куска на диск сохраняются готовые сегменты, смещение в записи
+и контекст для следующего куска (initial_prompt). Если процесс завершится,
+следующий запуск с тем же ключом продолжит работу с последней точки, а не с
+нулевой секунды.
+
+Веб-приложение дополнительно хранит манифесты задач (JobManifests): аудио и
+параметры задачи лежат на диске до её завершения, поэтому задачи, которые
+стояли в очереди или выполнялись при остановке сервера, при старте ставятся
+в очередь заново под тем же ID. Число таких возобновлений ограничено, чтобы
+задача, из-за которой падает процесс, не перезапускалась бесконечно.
+"""
+
+import json
+import os
+import shutil
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: без блокировок, манифест захватывает любой процесс
+    fcntl = None
+
+from result_store import compact_segments
+
+
+DEFAULT_CHECKPOINT_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'aruunote', 'checkpoints')
+
+MANIFEST_FILE = 'manifest.json'
+CHECKPOINT_FILE = 'checkpoint.json'
+AUDIO_FILE = 'audio.npy'
+# Число возобновлений задачи: манифест заблокирован и не перезаписывается
+RESUMES_FILE = 'resumes.json'
+
+
+def _write_json(path, data):
+    """Записывает JSON атомарно: прерванная запись не портит прежний файл"""
+    temp_path = f'{path}.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(temp_path, path)
+
+
+class Checkpoint:
+    def __init__(self, path, key):
+        """
+        Контрольная точка одной транскрипции
+
+        Args:
+            path (str): Файл контрольной точки
+            key (str): Ключ задачи (хэш аудио, модель и параметры, см. result_cache.make_key);
+                точка с другим ключом не используется
+        """
+        self.path = path
+        self.key = key
+
+    def load(self):
+        """
+        Возвращает сохраненное состояние или None
+
+        Returns:
+            dict: 'offset' (обработано отсчетов 16 кГц), 'segments', 'language', 'prompt'
+        """
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            print(f"Не удалось прочитать контрольную точку {self.path}: {e}")
+            return None
+        if state.get('key') != self.key:
+            return None
+        return state
+
+    def save(self, offset, segments, language, prompt):
+        """Сохраняет обработанную часть записи"""
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        _write_json(self.path, {
+            'key': self.key,
+            'offset': int(offset),
+            'segments': compact_segments(segments),
+            'language': language,
+            'prompt': prompt,
+            'saved_at': time.time()
+        })
+
+    def remove(self):
+        """Удаляет контрольную точку после успешного завершения"""
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+
+def checkpoint_for(key, checkpoint_dir=DEFAULT_CHECKPOINT_DIR):
+    """Контрольная точка транскрипции из командной строки (по ключу файла, модели и параметров)"""
+    return Checkpoint(os.path.join(checkpoint_dir, f'{key}.json'), key)
+
+
+class JobManifests:
+    def __init__(self, checkpoint_dir=DEFAULT_CHECKPOINT_DIR, max_resumes=3):
+        """
+        Манифесты задач веб-приложения
+
+        Каждая задача - папка jobs/<ID> с аудио, manifest.json и контрольной
+        точкой. Процесс, выполняющий задачу, держит блокировку манифеста, поэтому
+        другие процессы (рабочие gunicorn) не возьмут её повторно, а после
+        аварийного завершения процесса блокировка снимается сама.
+
+        Args:
+            checkpoint_dir (str): Папка контрольных точек
+            max_resumes (int): Сколько раз задачу можно возобновить после перезапуска
+        """
+        self.jobs_dir = os.path.join(checkpoint_dir, 'jobs')
+        self.max_resumes = max_resumes
+        self._locks = {}
+        self._writers = {}
+        self._lock = threading.Lock()
+
+    def job_dir(self, job_id):
+        return os.path.join(self.jobs_dir, job_id)
+
+    def create(self, job_id, audio, source=None, **fields):
+        """
+        Сохраняет аудио и параметры новой задачи
+
+        Если есть исходный файл (source), для возобновления хранится он. Иначе
+        массив сохраняется в фоновом потоке: запись сотен мегабайт задержала бы
+        ответ на запрос, а задача, стоящая в очереди, уже переживет перезапуск.
+
+        Args:
+            job_id (str): ID задачи
+            audio: Путь к файлу (переносится в папку задачи) или массив 16 кГц
+            source (str): Исходный файл массива (переносится в папку задачи)
+            **fields: Параметры задачи (model_size, cache_key, options и т.п.)
+
+        Returns:
+            Путь к перенесенному файлу или тот же массив
+        """
+        job_dir = self.job_dir(job_id)
+        os.makedirs(job_dir, exist_ok=True)
+        decoded = not isinstance(audio, str) and source is None
+        if isinstance(audio, str):
+            audio_path = os.path.join(job_dir, os.path.basename(audio))
+            shutil.move(audio, audio_path)
+            audio = audio_path
+        elif source is not None:
+            audio_path = os.path.join(job_dir, os.path.basename(source))
+            shutil.move(source, audio_path)
+        else:
+            audio_path = os.path.join(job_dir, AUDIO_FILE)
+        _write_json(os.path.join(job_dir, MANIFEST_FILE), dict(
+            fields, job_id=job_id, audio=os.path.basename(audio_path), decoded=decoded,
+            created_at=time.time()
+        ))
+        self._acquire(job_id)
+        if decoded:
+            writer = threading.Thread(target=self._save_audio, args=(job_id, audio_path, audio), daemon=True)
+            with self._lock:
+                self._writers[job_id] = writer
+            writer.start()
+        return audio
+
+    def _save_audio(self, job_id, audio_path, audio):
+        """Сохраняет массив задачи, у которой нет исходного файла (в фоновом потоке)"""
+        try:
+            import numpy as np
+            # Прерванная запись не оставляет неполный файл
+            with open(f'{audio_path}.tmp', 'wb') as f:
+                np.save(f, audio)
+            os.replace(f'{audio_path}.tmp', audio_path)
+        except (OSError, ValueError) as e:
+            # Задача выполняется и без сохраненного аудио, но не возобновится после перезапуска
+            print(f"Не удалось сохранить аудио задачи {job_id}: {e}")
+
+    def _wait_saved(self, job_id):
+        """Дожидается записи массива задачи, если она еще идет"""
+        with self._lock:
+            writer = self._writers.pop(job_id, None)
+        if writer is not None:
+            writer.join()
+
+    def pending(self, on_abandoned=None):
+        """
+        Захватывает задачи, оставшиеся от остановленных процессов
+
+        Задачи, уже возобновленные max_resumes раз, удаляются.
+
+        Args:
+            on_abandoned (callable): Вызывается с ID каждой удаленной таким образом задачи
+
+        Returns:
+            list: Манифесты (dict); 'audio' - путь к файлу или загруженный массив,
+                'resumes' - номер этого возобновления
+        """
+        if not os.path.isdir(self.jobs_dir):
+            return []
+        manifests = []
+        for job_id in sorted(os.listdir(self.jobs_dir)):
+            if job_id in self._locks or not self._acquire(job_id):
+                continue
+            try:
+                with open(os.path.join(self.job_dir(job_id), MANIFEST_FILE), encoding='utf-8') as f:
+                    manifest = json.load(f)
+                audio_path = os.path.join(self.job_dir(job_id), manifest['audio'])
+                if not os.path.exists(audio_path):
+                    # Процесс остановился раньше, чем фоновый поток сохранил аудио
+                    raise FileNotFoundError(f"нет аудио {manifest['audio']}")
+                resumes_path = os.path.join(self.job_dir(job_id), RESUMES_FILE)
+                try:
+                    with open(resumes_path, encoding='utf-8') as f:
+                        resumes = json.load(f)['resumes']
+                except FileNotFoundError:
+                    resumes = 0
+                if resumes >= self.max_resumes:
+                    print(f"Задача {job_id} прерывалась {resumes} раз, больше не возобновляется")
+                    self.finish(job_id)
+                    if on_abandoned is not None:
+                        on_abandoned(job_id)
+                    continue
+                manifest['resumes'] = resumes + 1
+                _write_json(resumes_path, {'resumes': manifest['resumes']})
+                if manifest.get('decoded'):
+                    import numpy as np
+                    manifest['audio'] = np.load(audio_path)
+                else:
+                    manifest['audio'] = audio_path
+            except (OSError, ValueError, KeyError) as e:
+                print(f"Манифест задачи {job_id} поврежден, задача удалена: {e}")
+                self.finish(job_id)
+                continue
+            manifests.append(manifest)
+        manifests.sort(key=lambda manifest: manifest.get('created_at', 0))
+        return manifests
+
+    def checkpoint(self, job_id, key):
+        """Контрольная точка задачи, если у неё есть манифест, иначе None"""
+        if job_id not in self._locks:
+            return None
+        return Checkpoint(os.path.join(self.job_dir(job_id), CHECKPOINT_FILE), key)
+
+    def finish(self, job_id):
+        """Удаляет папку завершенной задачи и снимает блокировку"""
+        self._wait_saved(job_id)
+        with self._lock:
+            lock_file = self._locks.pop(job_id, None)
+        shutil.rmtree(self.job_dir(job_id), ignore_errors=True)
+        if lock_file is not None:
+            lock_file.close()
+
+    def release(self, job_id):
+        """Снимает блокировку, оставляя задачу на диске для другого процесса или запуска"""
+        self._wait_saved(job_id)
+        with self._lock:
+            lock_file = self._locks.pop(job_id, None)
+        if lock_file is not None:
+            lock_file.close()
+
+    def _acquire(self, job_id):
+        """Берет блокировку манифеста; False - задачу уже выполняет другой процесс"""
+        try:
+            lock_file = open(os.path.join(self.job_dir(job_id), MANIFEST_FILE), 'rb')
+        except OSError:
+            return False
+        if fcntl is not None:
+            try:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                lock_file.close()
+                return False
+        with self._lock:
+            self._locks[job_id] = lock_file
+        return True
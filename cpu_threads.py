@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Распределение ядер процессора между параллельными транскрипциями
+
+По умолчанию каждый вызов PyTorch использует столько потоков, сколько
+ядер в системе, поэтому несколько одновременных транскрипций перегружают
+процессор. Здесь ядра делятся между рабочими процессами: каждому задается
+свое число потоков PyTorch и, при желании, привязка к своим ядрам.
+
+Число потоков PyTorch задается на весь процесс, поэтому рабочие потоки
+одного процесса (очередь задач Flask) делят общий пул, а строгое
+разделение ядер возможно только между процессами.
+"""
+
+import os
+
+
+def available_cores():
+    """Ядра, доступные текущему процессу (с учетом уже заданной привязки)"""
+    if hasattr(os, 'sched_getaffinity'):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def threads_per_worker(workers, threads=None, cores=None):
+    """
+    Число потоков PyTorch на одного рабочего
+
+    Args:
+        workers (int): Количество параллельных рабочих
+        threads (int): Явно заданное число (0 или None - поровну делить ядра)
+        cores (int): Количество ядер (None - доступные процессу)
+    """
+    if threads:
+        return max(1, int(threads))
+    cores = cores or len(available_cores())
+    return max(1, cores // max(1, workers))
+
+
+def partition_cores(workers, threads=None):
+    """
+    Делит доступные ядра на непересекающиеся группы для рабочих
+
+    Если рабочих больше, чем ядер, группы повторяются по кругу.
+
+    Returns:
+        list: Списки номеров ядер для каждого рабочего
+    """
+    cores = available_cores()
+    per_worker = min(threads_per_worker(workers, threads, len(cores)), len(cores))
+    return [
+        [cores[(i * per_worker + j) % len(cores)] for j in range(per_worker)]
+        for i in range(workers)
+    ]
+
+
+def configure_worker(threads, cpus=None):
+    """
+    Настраивает текущий процесс: число потоков PyTorch и привязку к ядрам
+
+    Вызывается в начале рабочего процесса до первого инференса.
+
+    Args:
+        threads (int): Число потоков PyTorch для операций внутри слоя
+        cpus (list): Ядра для привязки процесса (None - без привязки)
+    """
+    import torch
+
+    if cpus and hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, cpus)
+    torch.set_num_threads(max(1, int(threads)))
+    try:
+        # Параллелизм между операциями не нужен: он лишь добавляет потоки
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        # Можно задать только до первой параллельной операции
+        pass
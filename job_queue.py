@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+Очередь задач транскрипции с ограниченным пулом рабочих потоков
+"""
+
+import queue
+import threading
+import time
+import uuid
+
+
+class QueueFullError(Exception):
+    """Очередь задач переполнена, новая задача не принята"""
+
+
+class TranscriptionJob:
+    """Задача транскрипции и её текущее состояние"""
+
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+
+    def __init__(self, func, args=(), kwargs=None, job_id=None, listener=None):
+        self.id = job_id or str(uuid.uuid4())
+        self.listener = listener
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs or {}
+        self.status = self.QUEUED
+        self.progress = 0.0
+        # Уже готовые сегменты и сколько секунд аудио из скольких обработано
+        self.segments = []
+        self.decoded_seconds = 0.0
+        self.total_seconds = None
+        self.version = 0
+        # Время этапов транскрипции в секундах (см. metrics.StageTimer)
+        self.timings = {}
+        # Версия сохраненного результата (0 - еще нет) и является ли он черновиком
+        self.result_version = 0
+        self.draft = False
+        self._updated = threading.Condition()
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    @property
+    def finished(self):
+        return self.status in (self.DONE, self.FAILED)
+
+    def set_progress(self, value):
+        """Обновляет прогресс задачи (от 0.0 до 1.0)"""
+        self.progress = max(0.0, min(1.0, float(value)))
+        self.notify()
+
+    def add_segments(self, segments, decoded_seconds, total_seconds):
+        """Добавляет готовые сегменты и обновляет прогресс по обработанным секундам"""
+        self.segments.extend(segments)
+        self.decoded_seconds = decoded_seconds
+        self.total_seconds = total_seconds
+        self.set_progress(decoded_seconds / total_seconds if total_seconds else 1.0)
+
+    def wait_for_update(self, version, timeout=None):
+        """
+        Ждет изменения состояния задачи после версии version
+
+        Returns:
+            int: Текущая версия (равна version, если истек таймаут)
+        """
+        with self._updated:
+            self._updated.wait_for(lambda: self.version != version, timeout)
+            return self.version
+
+    def notify(self):
+        """Сообщает слушателю и ожидающим потокам об изменении состояния задачи"""
+        with self._updated:
+            self.version += 1
+            self._updated.notify_all()
+        if self.listener is None:
+            return
+        try:
+            self.listener(self)
+        except Exception as e:
+            print(f"Ошибка при обновлении состояния задачи {self.id}: {e}")
+
+    def to_dict(self):
+        """Возвращает состояние задачи для JSON-ответа"""
+        return {
+            'transcription_id': self.id,
+            'status': self.status,
+            'progress': round(self.progress, 3),
+            'decoded_seconds': round(self.decoded_seconds, 2),
+            'total_seconds': round(self.total_seconds, 2) if self.total_seconds is not None else None,
+            'error': self.error,
+            'timings': dict(self.timings),
+            'result_version': self.result_version,
+            'draft': self.draft,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at
+        }
+
+
+class JobQueue:
+    def __init__(self, num_workers=2, max_queued=16, job_retention=3600, listener=None):
+        """
+        Инициализация очереди
+
+        Args:
+            num_workers (int): Количество рабочих потоков транскрипции
+            max_queued (int): Максимальное число задач, ожидающих обработки
+            job_retention (int): Сколько секунд хранить завершенные задачи
+            listener (callable): Вызывается с задачей при каждом изменении её состояния
+        """
+        self.num_workers = max(1, int(num_workers))
+        self.max_queued = max(1, int(max_queued))
+        self.job_retention = job_retention
+        self.listener = listener
+        self._queue = queue.Queue(maxsize=self.max_queued)
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._workers = []
+
+    def start(self):
+        """Запускает рабочие потоки (повторный вызов ничего не делает)"""
+        with self._lock:
+            if self._workers:
+                return
+            for i in range(self.num_workers):
+                worker = threading.Thread(
+                    target=self._worker_loop,
+                    name=f'transcription-worker-{i}',
+                    daemon=True
+                )
+                worker.start()
+                self._workers.append(worker)
+
+    def submit(self, func, *args, job_id=None, **kwargs):
+        """
+        Ставит задачу в очередь
+
+        Функция вызывается как func(job, *args, **kwargs) в рабочем потоке,
+        её возвращаемое значение сохраняется в job.result.
+
+        Returns:
+            TranscriptionJob: Созданная задача
+
+        Raises:
+            QueueFullError: Если очередь заполнена
+        """
+        self.start()
+        self._prune_finished()
+
+        job = TranscriptionJob(func, args, kwargs, job_id=job_id, listener=self.listener)
+        with self._lock:
+            self._jobs[job.id] = job
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            with self._lock:
+                self._jobs.pop(job.id, None)
+            raise QueueFullError(f'Очередь заполнена ({self.max_queued} задач)') from None
+        job.notify()
+        return job
+
+    def get(self, job_id):
+        """Возвращает задачу по ID или None"""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    @property
+    def queue_depth(self):
+        """Количество задач, ожидающих обработки"""
+        return self._queue.qsize()
+
+    @property
+    def in_flight(self):
+        """Количество задач, выполняющихся прямо сейчас"""
+        with self._lock:
+            return sum(1 for job in self._jobs.values() if job.status == TranscriptionJob.RUNNING)
+
+    def _worker_loop(self):
+        while True:
+            job = self._queue.get()
+            job.status = TranscriptionJob.RUNNING
+            job.started_at = time.time()
+            job.notify()
+            try:
+                job.result = job.func(job, *job.args, **job.kwargs)
+                job.progress = 1.0
+                job.status = TranscriptionJob.DONE
+            except Exception as e:
+                job.error = str(e)
+                job.status = TranscriptionJob.FAILED
+                print(f"Ошибка в задаче {job.id}: {e}")
+            finally:
+                job.finished_at = time.time()
+                job.notify()
+                # Освобождаем ссылки на аргументы (пути, массивы аудио)
+                job.args = ()
+                job.kwargs = {}
+                self._queue.task_done()
+
+    def _prune_finished(self):
+        """Удаляет давно завершенные задачи из реестра"""
+        deadline = time.time() - self.job_retention
+        with self._lock:
+            expired = [
+                job_id for job_id, job in self._jobs.items()
+                if job.finished and job.finished_at < deadline
+            ]
+            for job_id in expired:
+                del self._jobs[job_id]
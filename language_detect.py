@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Быстрое определение языка записи
+
+Язык определяется по первым 30 секундам самой маленькой модели, результат
+кэшируется по хэшу аудио. Найденный язык затем передается в полную
+транскрипцию, чтобы она не определяла его повторно, а декодированное
+аудио и спектрограмму первого окна можно сохранить в памяти и не считать
+их второй раз.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from result_cache import make_key
+
+
+DETECT_MODEL = os.environ.get('LANGUAGE_DETECT_MODEL', 'tiny')
+
+
+def first_window_mel(audio, n_mels):
+    """Лог-мел спектрограмма первых 30 секунд аудио (на CPU), как ее считает Whisper"""
+    import whisper
+
+    return whisper.log_mel_spectrogram(whisper.pad_or_trim(audio), n_mels)
+
+
+def detect_language(model, audio, top=5, mel=None):
+    """
+    Определяет язык по первым 30 секундам аудио
+
+    Args:
+        model: Загруженная модель Whisper
+        audio (np.ndarray): Аудио 16 кГц моно float32
+        top (int): Сколько наиболее вероятных языков вернуть
+        mel: Уже посчитанная спектрограмма first_window_mel (по умолчанию считается здесь)
+
+    Returns:
+        dict: {'language': код языка, 'probabilities': {код: вероятность}}
+    """
+    if not model.is_multilingual:
+        return {'language': 'en', 'probabilities': {'en': 1.0}}
+
+    if mel is None:
+        mel = first_window_mel(audio, model.dims.n_mels)
+    _, probs = model.detect_language(mel.to(model.device))
+    best = sorted(probs.items(), key=lambda item: item[1], reverse=True)[:top]
+    return {
+        'language': best[0][0],
+        'probabilities': {language: round(float(p), 4) for language, p in best}
+    }
+
+
+def detection_key(audio_hash, model_size=DETECT_MODEL):
+    """Ключ кэша результатов для определения языка"""
+    return make_key(audio_hash, model_size, task='detect-language')
+
+
+class DecodedAudioCache:
+    def __init__(self, max_size_mb=512, ttl=600):
+        """
+        Декодированное аудио в памяти по хэшу содержимого
+
+        Позволяет запустить транскрипцию после определения языка без
+        повторной загрузки и декодирования файла. Вместе с аудио хранится
+        спектрограмма первого окна, если она считалась при определении языка
+        (около 1 МБ, в объеме не учитывается).
+
+        Args:
+            max_size_mb (int): Максимальный объем хранимого аудио в МБ
+            ttl (float): Сколько секунд хранить запись
+        """
+        self.max_size = max_size_mb * 1024 * 1024
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def put(self, audio_hash, audio, mel=None):
+        if audio.nbytes > self.max_size:
+            return
+        with self._lock:
+            self._pop(audio_hash)
+            self._entries[audio_hash] = (time.time() + self.ttl, audio, mel)
+            self._size += audio.nbytes
+            while self._size > self.max_size:
+                self._pop(next(iter(self._entries)))
+
+    def get(self, audio_hash):
+        entry = self._entry(audio_hash)
+        return entry[1] if entry is not None else None
+
+    def get_mel(self, audio_hash):
+        """Спектрограмма первого окна (first_window_mel) или None"""
+        entry = self._entry(audio_hash)
+        return entry[2] if entry is not None else None
+
+    def _entry(self, audio_hash):
+        with self._lock:
+            entry = self._entries.get(audio_hash)
+            if entry is None:
+                return None
+            if entry[0] < time.time():
+                self._pop(audio_hash)
+                return None
+            self._entries.move_to_end(audio_hash)
+            return entry
+
+    def _pop(self, audio_hash):
+        entry = self._entries.pop(audio_hash, None)
+        if entry is not None:
+            self._size -= entry[1].nbytes
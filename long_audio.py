@@ -0,0 +1,338 @@
+#!/usr/bin/env python3
+"""
+Транскрипция длинных записей по частям
+
+Аудио разрезается на куски по паузам (минимумам энергии сигнала), куски
+транскрибируются параллельно в отдельных процессах, после чего сегменты
+склеиваются с глобальными временными метками и без дублей на стыках.
+Для показа прогресса запись можно также обрабатывать по кускам
+последовательно, получая готовые сегменты по мере декодирования.
+"""
+
+import multiprocessing
+import threading
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from audio_io import SAMPLE_RATE
+from cpu_threads import configure_worker, threads_per_worker
+
+
+FRAME_SECONDS = 0.03
+PROBE_SECONDS = 30
+
+
+def frame_energy(audio, frame_seconds=FRAME_SECONDS):
+    """Среднеквадратичная энергия сигнала по кадрам фиксированной длины"""
+    frame = int(frame_seconds * SAMPLE_RATE)
+    n_frames = len(audio) // frame
+    if n_frames == 0:
+        return np.zeros(0, dtype=np.float32)
+    frames = audio[:n_frames * frame].reshape(n_frames, frame)
+    return np.sqrt(np.mean(frames * frames, axis=1))
+
+
+def find_split_points(audio, chunk_seconds=600, search_seconds=30):
+    """
+    Находит точки разреза возле каждой границы chunk_seconds по самой тихой паузе
+
+    Returns:
+        list: Индексы отсчетов, по которым режется аудио
+    """
+    energy = frame_energy(audio)
+    frame = int(FRAME_SECONDS * SAMPLE_RATE)
+    # Сглаживаем, чтобы выбирать паузы, а не отдельные тихие кадры
+    window = max(1, int(0.5 / FRAME_SECONDS))
+    if len(energy) < window:
+        # Запись короче окна сглаживания: резать нечего (и convolve вернул бы лишние кадры)
+        return []
+    smoothed = np.convolve(energy, np.ones(window) / window, mode='same')
+
+    points = []
+    total_frames = len(smoothed)
+    chunk_frames = int(chunk_seconds / FRAME_SECONDS)
+    # Окно поиска меньше куска, чтобы каждая следующая точка была дальше предыдущей
+    search_frames = int(min(search_seconds, chunk_seconds / 4) / FRAME_SECONDS)
+    target = chunk_frames
+    while target < total_frames - search_frames:
+        lo = max(0, target - search_frames)
+        hi = min(total_frames, target + search_frames)
+        best = lo + int(np.argmin(smoothed[lo:hi]))
+        points.append(best * frame)
+        target = best + chunk_frames
+    return points
+
+
+def split_audio(audio, chunk_seconds=600, overlap_seconds=1.0):
+    """
+    Делит аудио на куски по паузам с небольшим перекрытием
+
+    Returns:
+        list: Пары (начало, конец) в отсчетах
+    """
+    overlap = int(overlap_seconds * SAMPLE_RATE)
+    bounds = [0] + find_split_points(audio, chunk_seconds) + [len(audio)]
+    return [
+        (max(0, start - overlap), min(len(audio), end + overlap))
+        for start, end in zip(bounds[:-1], bounds[1:])
+    ]
+
+
+def stitch_segments(chunks):
+    """
+    Склеивает сегменты кусков в общую последовательность
+
+    Args:
+        chunks (list): Тройки (начало куска, конец куска, сегменты куска),
+            время в секундах; соседние куски могут перекрываться
+
+    Returns:
+        list: Сегменты с глобальными временными метками
+    """
+    stitched = []
+    prev_end = None
+    for offset, chunk_end, segments in chunks:
+        shifted = []
+        for segment in segments:
+            segment = dict(segment)
+            segment['start'] += offset
+            segment['end'] += offset
+            if 'words' in segment:
+                segment['words'] = [
+                    dict(word, start=word['start'] + offset, end=word['end'] + offset)
+                    for word in segment['words']
+                ]
+            shifted.append(segment)
+
+        if prev_end is not None and prev_end > offset:
+            # Граница - середина зоны перекрытия, то есть исходная точка разреза
+            boundary = (offset + prev_end) / 2
+            stitched = [s for s in stitched if s['start'] < boundary]
+            shifted = [s for s in shifted if s['start'] >= boundary]
+            # Отбрасываем сегмент, повторяющий текст на стыке
+            if shifted and stitched and \
+                    shifted[0]['text'].strip().lower() == stitched[-1]['text'].strip().lower():
+                shifted = shifted[1:]
+        stitched.extend(shifted)
+        prev_end = chunk_end
+
+    for i, segment in enumerate(stitched):
+        segment['id'] = i
+    return stitched
+
+
+def transcribe_incremental(transcribe, audio, chunk_seconds=120, on_progress=None, checkpoint=None,
+                           **options):
+    """
+    Транскрибирует аудио последовательно по кускам, разрезанным по паузам
+
+    После каждого куска вызывает on_progress(сегменты куска, обработано секунд,
+    всего секунд), поэтому текст можно показывать до окончания всей записи.
+    Контекст между кусками передается через initial_prompt. С контрольной
+    точкой (checkpoints.Checkpoint) готовые сегменты, смещение и контекст
+    сохраняются после каждого куска, а сохраненная часть не транскрибируется заново.
+
+    Args:
+        transcribe: Функция transcribe(audio, **options) в формате model.transcribe
+        audio (np.ndarray): Аудио 16 кГц моно float32
+        chunk_seconds (float): Примерная длина куска в секундах
+        on_progress (callable): Обработчик готовых сегментов
+        checkpoint (Checkpoint): Контрольная точка для продолжения после сбоя
+        **options: Дополнительные параметры model.transcribe
+
+    Returns:
+        dict: Результат в формате model.transcribe ('text', 'segments', 'language')
+    """
+    total = len(audio) / SAMPLE_RATE
+    language = options.pop('language', None)
+    segments = []
+    prompt = ''
+    offset = 0
+    state = checkpoint.load() if checkpoint is not None else None
+    if state is not None:
+        offset = min(state['offset'], len(audio))
+        segments = state['segments']
+        prompt = state['prompt']
+        language = language or state['language']
+        print(f"Продолжаем транскрипцию с {offset / SAMPLE_RATE:.1f} с из {total:.1f} с")
+        if on_progress is not None:
+            on_progress(segments, offset / SAMPLE_RATE, total)
+
+    bounds = [offset] + [point for point in find_split_points(audio, chunk_seconds) if point > offset]
+    if offset < len(audio):
+        bounds.append(len(audio))
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        chunk_options = dict(options)
+        if language is not None:
+            chunk_options['language'] = language
+        if prompt and options.get('condition_on_previous_text', True):
+            chunk_options['initial_prompt'] = prompt
+        result = transcribe(audio[start:end], **chunk_options)
+        # Язык определяется по первому куску и дальше не меняется
+        language = language or result.get('language')
+
+        offset = start / SAMPLE_RATE
+        chunk_segments = stitch_segments([(offset, end / SAMPLE_RATE, result.get('segments', []))])
+        for i, segment in enumerate(chunk_segments, len(segments)):
+            segment['id'] = i
+        segments.extend(chunk_segments)
+        prompt = ''.join(s['text'] for s in segments[-5:])
+        if checkpoint is not None:
+            checkpoint.save(end, segments, language, prompt)
+        if on_progress is not None:
+            on_progress(chunk_segments, end / SAMPLE_RATE, total)
+
+    return {
+        'text': ''.join(segment['text'] for segment in segments),
+        'segments': segments,
+        'language': language or 'unknown'
+    }
+
+
+# Модель рабочего процесса (загружается один раз в initializer)
+_worker_model = None
+
+
+def _init_worker(model_size, threads):
+    global _worker_model
+    from backends import load_model
+    configure_worker(threads)
+    _worker_model = load_model(model_size)
+
+
+def _transcribe_chunk(audio, options):
+    return _worker_model.transcribe(audio, **options)
+
+
+def _detect_language_chunk(audio):
+    from language_detect import detect_language
+    return detect_language(_worker_model, audio)
+
+
+class _LocalPool:
+    """Пул процессов с моделью в каждом процессе, интерфейс как у ModelServer"""
+
+    def __init__(self, model_size, workers):
+        # Ядра делятся между процессами поровну, чтобы они не перегружали процессор
+        self.executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker,
+            initargs=(model_size, threads_per_worker(workers))
+        )
+
+    def submit(self, model_size, audio, **options):
+        return self.executor.submit(_transcribe_chunk, audio, options)
+
+    def submit_detect_language(self, model_size, audio):
+        return self.executor.submit(_detect_language_chunk, audio)
+
+    def shutdown(self):
+        self.executor.shutdown()
+
+
+# Пулы процессов по (модель, число процессов): процессы и их модели живут до
+# конца программы и переиспользуются, а не загружаются заново для каждой записи
+_local_pools = {}
+_local_pools_lock = threading.Lock()
+
+
+def local_pool(model_size, workers):
+    """Общий пул процессов для модели (создается при первом обращении)"""
+    with _local_pools_lock:
+        pool = _local_pools.get((model_size, workers))
+        if pool is None:
+            pool = _local_pools[(model_size, workers)] = _LocalPool(model_size, workers)
+        return pool
+
+
+def transcribe_long_audio(audio, model_size="base", workers=2, chunk_seconds=600,
+                          overlap_seconds=1.0, language=None, model_server=None, on_progress=None,
+                          checkpoint=None, **options):
+    """
+    Транскрибирует длинное аудио параллельно по кускам
+
+    С контрольной точкой (checkpoints.Checkpoint) после каждого куска, готового
+    по порядку записи, сохраняются окончательные сегменты и точка разреза, а при
+    повторном запуске транскрибируется только оставшаяся часть записи.
+
+    Args:
+        audio (np.ndarray): Аудио 16 кГц моно float32
+        model_size (str): Размер модели Whisper
+        workers (int): Количество процессов (если model_server не указан)
+        chunk_seconds (float): Примерная длина куска в секундах
+        overlap_seconds (float): Перекрытие соседних кусков
+        language (str): Язык аудио (None - определить по началу записи)
+        model_server: Пул с методами submit(model_size, audio, **options) и
+            submit_detect_language(model_size, audio), например ModelServer;
+            иначе используется общий пул процессов local_pool
+        on_progress (callable): Вызывается как в transcribe_incremental с окончательными
+            сегментами по мере готовности кусков, по порядку записи
+        checkpoint (Checkpoint): Контрольная точка для продолжения после сбоя
+        **options: Дополнительные параметры model.transcribe
+
+    Returns:
+        dict: Результат в формате model.transcribe ('text', 'segments', 'language')
+    """
+    total = len(audio) / SAMPLE_RATE
+    offset = 0
+    restored = []
+    state = checkpoint.load() if checkpoint is not None else None
+    if state is not None:
+        offset = min(state['offset'], len(audio))
+        restored = state['segments']
+        language = language or state['language']
+        print(f"Продолжаем транскрипцию с {offset / SAMPLE_RATE:.1f} с из {total:.1f} с")
+        if on_progress is not None:
+            on_progress(restored, offset / SAMPLE_RATE, total)
+
+    pool = model_server or local_pool(model_size, workers)
+    if language is None:
+        # Определяем язык один раз (одним проходом detect_language по началу записи),
+        # чтобы все куски декодировались одинаково
+        probe = audio[:PROBE_SECONDS * SAMPLE_RATE]
+        language = pool.submit_detect_language(model_size, probe).result()['language']
+
+    bounds = [offset] + [point for point in find_split_points(audio, chunk_seconds) if point > offset]
+    if offset < len(audio):
+        bounds.append(len(audio))
+    overlap = int(overlap_seconds * SAMPLE_RATE)
+    # Сохраненная часть уже окончательна, поэтому первый кусок начинается ровно с неё
+    spans = [
+        (start if start == offset else max(0, start - overlap), min(len(audio), end + overlap))
+        for start, end in zip(bounds[:-1], bounds[1:])
+    ]
+    print(f"Длинное аудио: {len(spans)} кусков по ~{chunk_seconds} с")
+    futures = [
+        pool.submit(model_size, audio[start:end], language=language, **options)
+        for start, end in spans
+    ]
+
+    results = []
+    chunks = [(0.0, offset / SAMPLE_RATE, restored)] if restored else []
+    reported = len(restored)
+    for (start, end), cut, future in zip(spans, bounds[1:], futures):
+        result = future.result()
+        results.append(result)
+        chunks.append((start / SAMPLE_RATE, end / SAMPLE_RATE, result.get('segments', [])))
+        if on_progress is None and checkpoint is None:
+            continue
+        # Сегменты до точки разреза уже не изменятся при склейке со следующим куском
+        stitched = stitch_segments(chunks)
+        if cut < len(audio):
+            stitched = [segment for segment in stitched if segment['start'] < cut / SAMPLE_RATE]
+        if checkpoint is not None:
+            checkpoint.save(cut, stitched, language, ''.join(s['text'] for s in stitched[-5:]))
+        if on_progress is not None:
+            on_progress(stitched[reported:], cut / SAMPLE_RATE, total)
+        reported = len(stitched)
+
+    segments = stitch_segments(chunks)
+    detected = Counter(r.get('language') for r in results if r.get('language'))
+    return {
+        'text': ''.join(segment['text'] for segment in segments),
+        'segments': segments,
+        'language': language or (detected.most_common(1)[0][0] if detected else 'unknown')
+    }
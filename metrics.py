@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+Метрики сервиса в текстовом формате Prometheus
+
+Счетчики, гистограммы и измеряемые по запросу значения (глубина очереди,
+занятость кэша моделей) собираются в реестре и отдаются на /metrics.
+StageTimer замеряет этапы одной транскрипции (прием файла, декодирование,
+получение модели, инференс, постобработка): время пишется в гистограмму
+и сохраняется в задаче, чтобы вернуть разбивку в ответе о её состоянии.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+
+
+# Границы гистограмм длительности по умолчанию, секунды
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values)) + (extra or [])
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.label_names):
+            raise ValueError(f"Метрика {self.name} ожидает метки {self.label_names}, получено {sorted(labels)}")
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def _header(self, kind):
+        return [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {kind}']
+
+
+class Counter(_Metric):
+    """Монотонно растущий счетчик"""
+
+    def __init__(self, name, documentation, labels=()):
+        super().__init__(name, documentation, labels)
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = self._header('counter')
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f'{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}')
+        return lines
+
+
+class Histogram(_Metric):
+    """Распределение значений по корзинам с суммой и количеством"""
+
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        self._values = {}
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * len(self.buckets), 0.0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            self._values[key] = (counts, total + value)
+
+    @contextmanager
+    def time(self, **labels):
+        """Замеряет длительность блока with"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self):
+        lines = self._header('histogram')
+        with self._lock:
+            for key, (counts, total) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, counts):
+                    cumulative += count
+                    labels = _format_labels(self.label_names, key, [('le', _format_value(bound))])
+                    lines.append(f'{self.name}_bucket{labels} {cumulative}')
+                labels = _format_labels(self.label_names, key)
+                lines.append(f'{self.name}_sum{labels} {_format_value(total)}')
+                lines.append(f'{self.name}_count{labels} {cumulative}')
+        return lines
+
+
+class Gauge(_Metric):
+    """Значение, которое вычисляется функцией в момент запроса метрик"""
+
+    def __init__(self, name, documentation, func, labels=()):
+        super().__init__(name, documentation, labels)
+        # func() возвращает число, а для метрики с метками - {кортеж значений меток: число}
+        self.func = func
+
+    def render(self):
+        lines = self._header('gauge')
+        try:
+            value = self.func()
+        except Exception as e:
+            print(f"Ошибка при вычислении метрики {self.name}: {e}")
+            return lines
+        items = value.items() if self.label_names else [((), value)]
+        for key, item in sorted(items):
+            key = key if isinstance(key, tuple) else (key,)
+            lines.append(f'{self.name}{_format_labels(self.label_names, key)} {_format_value(item)}')
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        """Реестр метрик приложения"""
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            if any(m.name == metric.name for m in self._metrics):
+                raise ValueError(f"Метрика {metric.name} уже зарегистрирована")
+            self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labels=()):
+        return self._register(Counter(name, documentation, labels))
+
+    def histogram(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, documentation, labels, buckets))
+
+    def gauge(self, name, documentation, func, labels=()):
+        return self._register(Gauge(name, documentation, func, labels))
+
+    def render(self):
+        """Все метрики в текстовом формате Prometheus"""
+        with self._lock:
+            metrics = list(self._metrics)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+class StageTimer:
+    def __init__(self, histogram=None):
+        """
+        Замер этапов одной транскрипции
+
+        Вложенный этап не учитывается во времени внешнего, поэтому сумма
+        этапов равна общему времени без двойного счета.
+
+        Args:
+            histogram (Histogram): Гистограмма с меткой stage для общей статистики
+        """
+        self.histogram = histogram
+        self.timings = {}
+        self._stack = threading.local()
+
+    @contextmanager
+    def stage(self, name):
+        stack = self._stack.__dict__.setdefault('frames', [])
+        frame = {'nested': 0.0}
+        stack.append(frame)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            stack.pop()
+            if stack:
+                stack[-1]['nested'] += elapsed
+            self.record(name, elapsed - frame['nested'])
+
+    def record(self, name, seconds):
+        """Добавляет время этапа, замеренное вне stage()"""
+        self.timings[name] = round(self.timings.get(name, 0.0) + seconds, 4)
+        if self.histogram is not None:
+            self.histogram.observe(seconds, stage=name)
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+Кэш моделей Whisper с ограничением по памяти
+
+Модели вытесняются по принципу LRU, когда их суммарный оценочный размер
+превышает бюджет, и выгружаются после заданного времени простоя.
+Одновременные запросы одной модели ждут единственную загрузку.
+
+Экземпляр Whisper нельзя вызывать из нескольких потоков сразу: декодер
+подключает хуки кэша ключей/значений к общим модулям, и параллельные
+проходы портят друг друга. Поэтому весь инференс модели в процессе идет
+под её блокировкой (lock, transcriber).
+"""
+
+import gc
+import threading
+import time
+from collections import OrderedDict
+
+
+# Оценка занимаемой памяти (МБ): веса fp32 плюс рабочие буферы инференса
+MODEL_FOOTPRINTS_MB = {
+    'tiny': 200,
+    'base': 400,
+    'small': 1200,
+    'medium': 3700,
+    'large': 7400,
+}
+
+
+def estimate_footprint_mb(model_size):
+    """Оценивает объем памяти модели по её имени (tiny.en, large-v3, base-int8 и т.п.)"""
+    base_name = model_size.split('.')[0].split('-')[0]
+    footprint = MODEL_FOOTPRINTS_MB.get(base_name, MODEL_FOOTPRINTS_MB['large'])
+    # Веса линейных слоев int8 занимают вчетверо меньше, но буферы остаются fp32
+    if model_size.endswith('-int8'):
+        footprint //= 2
+    return footprint
+
+
+class _Loading:
+    """Загрузка модели, которую ожидают параллельные запросы"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.model = None
+        self.error = None
+
+
+class ModelCache:
+    def __init__(self, loader, memory_budget_mb=None, idle_timeout=None,
+                 footprint=estimate_footprint_mb):
+        """
+        Инициализация кэша
+
+        Args:
+            loader (callable): Функция загрузки модели по имени (например whisper.load_model)
+            memory_budget_mb (int): Бюджет памяти в МБ (None - без ограничения)
+            idle_timeout (float): Через сколько секунд простоя выгружать модель (None - никогда)
+            footprint (callable): Оценка памяти модели в МБ по её имени
+        """
+        self.loader = loader
+        self.memory_budget_mb = memory_budget_mb or None
+        self.idle_timeout = idle_timeout or None
+        self.footprint = footprint
+        self._models = OrderedDict()
+        self._last_used = {}
+        self._loading = {}
+        self._inference_locks = {}
+        self._lock = threading.Lock()
+        self._reaper = None
+        self._metrics = {
+            'hits': 0,
+            'misses': 0,
+            'evictions': 0,
+            'idle_evictions': 0,
+            'loads': 0,
+            'load_failures': 0,
+            'load_time_seconds': 0.0,
+        }
+
+    def get(self, model_size):
+        """Возвращает модель, загружая её при необходимости"""
+        with self._lock:
+            model = self._models.get(model_size)
+            if model is not None:
+                self._models.move_to_end(model_size)
+                self._last_used[model_size] = time.time()
+                self._metrics['hits'] += 1
+                return model
+
+            self._metrics['misses'] += 1
+            loading = self._loading.get(model_size)
+            owner = loading is None
+            if owner:
+                loading = self._loading[model_size] = _Loading()
+                # Освобождаем место до загрузки, чтобы не превышать бюджет на пике
+                self._evict_for(self.footprint(model_size))
+
+        if not owner:
+            loading.done.wait()
+            if loading.error is not None:
+                raise loading.error
+            return loading.model
+
+        self._start_reaper()
+        try:
+            print(f"Загружаем модель {model_size}...")
+            started = time.time()
+            model = self.loader(model_size)
+            elapsed = time.time() - started
+        except Exception as e:
+            with self._lock:
+                self._metrics['load_failures'] += 1
+                del self._loading[model_size]
+            loading.error = e
+            loading.done.set()
+            raise
+
+        with self._lock:
+            self._metrics['loads'] += 1
+            self._metrics['load_time_seconds'] += elapsed
+            self._models[model_size] = model
+            self._last_used[model_size] = time.time()
+            del self._loading[model_size]
+        print(f"Модель {model_size} загружена за {elapsed:.1f} с")
+        loading.model = model
+        loading.done.set()
+        return model
+
+    def lock(self, model_size):
+        """Блокировка инференса модели (повторно входимая: её можно взять и внутри себя)"""
+        with self._lock:
+            return self._inference_locks.setdefault(model_size, threading.RLock())
+
+    def transcriber(self, model_size):
+        """Функция transcribe(audio, **options), выполняющая каждый вызов под блокировкой модели"""
+        def transcribe(audio, **options):
+            with self.lock(model_size):
+                return self.get(model_size).transcribe(audio, **options)
+        return transcribe
+
+    def evict(self, model_size):
+        """Выгружает модель из кэша"""
+        with self._lock:
+            removed = self._remove(model_size)
+        if removed:
+            gc.collect()
+        return removed
+
+    def resident_models(self):
+        """Список загруженных моделей от давно использованной к недавней"""
+        with self._lock:
+            return list(self._models)
+
+    def stats(self):
+        """Метрики кэша и текущая занятость памяти"""
+        with self._lock:
+            stats = dict(self._metrics)
+            stats.update({
+                'resident_models': list(self._models),
+                'used_mb': self._used_mb(),
+                'memory_budget_mb': self.memory_budget_mb,
+                'idle_timeout': self.idle_timeout,
+            })
+            return stats
+
+    def _used_mb(self):
+        return sum(self.footprint(name) for name in self._models)
+
+    def _remove(self, model_size):
+        if self._models.pop(model_size, None) is None:
+            return False
+        self._last_used.pop(model_size, None)
+        print(f"Модель {model_size} выгружена из памяти")
+        return True
+
+    def _evict_for(self, needed_mb):
+        """Вытесняет давно не использованные модели, пока новая не поместится в бюджет"""
+        if self.memory_budget_mb is None:
+            return
+        evicted = False
+        while self._models and self._used_mb() + needed_mb > self.memory_budget_mb:
+            oldest = next(iter(self._models))
+            self._remove(oldest)
+            self._metrics['evictions'] += 1
+            evicted = True
+        if needed_mb > self.memory_budget_mb:
+            print(f"Предупреждение: модель ({needed_mb} МБ) больше бюджета памяти "
+                  f"({self.memory_budget_mb} МБ)")
+        if evicted:
+            gc.collect()
+
+    def _start_reaper(self):
+        """Запускает фоновую выгрузку простаивающих моделей"""
+        if self.idle_timeout is None:
+            return
+        with self._lock:
+            if self._reaper is not None:
+                return
+            self._reaper = threading.Thread(
+                target=self._reap_idle, name='model-cache-reaper', daemon=True
+            )
+            self._reaper.start()
+
+    def _reap_idle(self):
+        interval = max(1.0, min(self.idle_timeout / 2, 30.0))
+        while True:
+            time.sleep(interval)
+            deadline = time.time() - self.idle_timeout
+            evicted = False
+            with self._lock:
+                for name in list(self._models):
+                    if self._last_used.get(name, 0) < deadline:
+                        self._remove(name)
+                        self._metrics['idle_evictions'] += 1
+                        evicted = True
+            if evicted:
+                gc.collect()
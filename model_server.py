@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+Пул процессов для обслуживания моделей Whisper
+
+Каждый рабочий процесс закреплен за одним размером модели и загружает её
+ровно один раз. Задачи направляются наименее загруженному процессу,
+который держит нужную модель, поэтому инференс на CPU масштабируется по
+ядрам, а не упирается в GIL одного процесса Flask.
+"""
+
+import itertools
+import multiprocessing
+import queue
+import threading
+from concurrent.futures import Future
+
+from cpu_threads import configure_worker, partition_cores
+
+
+def parse_replicas(spec):
+    """
+    Разбирает строку вида "base:4,medium:1" в словарь {размер: количество}
+
+    Размер без количества ("tiny") означает одну реплику.
+    """
+    replicas = {}
+    for item in (spec or '').split(','):
+        item = item.strip()
+        if not item:
+            continue
+        model_size, _, count = item.partition(':')
+        count = int(count) if count else 1
+        if count < 1:
+            raise ValueError(f"Некорректное количество реплик для {model_size}: {count}")
+        replicas[model_size.strip()] = count
+    return replicas
+
+
+def _worker_main(model_size, task_queue, result_queue, worker_id, threads, cpus, warmup):
+    """Точка входа рабочего процесса: загружает модель и обрабатывает задачи"""
+    from backends import load_model, warm_up
+    from language_detect import detect_language
+
+    try:
+        configure_worker(threads, cpus)
+        model = load_model(model_size)
+        if warmup:
+            warm_up(model)
+    except Exception as e:
+        result_queue.put(('failed', worker_id, str(e)))
+        return
+    result_queue.put(('ready', worker_id, None))
+
+    while True:
+        task = task_queue.get()
+        if task is None:
+            break
+        task_id, method, audio, options = task
+        try:
+            if method == 'detect_language':
+                result = detect_language(model, audio)
+            else:
+                result = model.transcribe(audio, **options)
+            result_queue.put((task_id, worker_id, (True, result)))
+        except Exception as e:
+            result_queue.put((task_id, worker_id, (False, str(e))))
+
+
+class _Worker:
+    """Состояние рабочего процесса на стороне родителя"""
+
+    def __init__(self, worker_id, model_size, context, result_queue, cpus, pin_cpus, warmup):
+        self.worker_id = worker_id
+        self.model_size = model_size
+        self.cpus = cpus
+        self.task_queue = context.Queue()
+        self.pending = {}
+        self.ready = False
+        self.process = context.Process(
+            target=_worker_main,
+            args=(model_size, self.task_queue, result_queue, worker_id,
+                  len(cpus), cpus if pin_cpus else None, warmup),
+            name=f'whisper-{model_size}-{worker_id}',
+            daemon=True
+        )
+
+
+class ModelServer:
+    def __init__(self, replicas, threads_per_worker=None, pin_cpus=False, warmup=True):
+        """
+        Инициализация сервера моделей
+
+        Args:
+            replicas (dict): Количество процессов для каждого размера модели,
+                например {'base': 4, 'medium': 1}
+            threads_per_worker (int): Потоков PyTorch на процесс (None - ядра поровну)
+            pin_cpus (bool): Привязать каждый процесс к своим ядрам
+            warmup (bool): Прогревать модель пробным проходом перед приемом задач
+        """
+        self.replicas = dict(replicas)
+        self.threads_per_worker = threads_per_worker
+        self.pin_cpus = pin_cpus
+        self.warmup = warmup
+        self._context = multiprocessing.get_context('spawn')
+        self._result_queue = None
+        self._workers = {}
+        self._task_ids = itertools.count()
+        self._lock = threading.Lock()
+        self._collector = None
+        self._running = False
+
+    def has_model(self, model_size):
+        """Обслуживается ли данный размер модели пулом процессов"""
+        return self.replicas.get(model_size, 0) > 0
+
+    def start(self):
+        """Запускает рабочие процессы (повторный вызов ничего не делает)"""
+        with self._lock:
+            if self._running:
+                return
+            self._result_queue = self._context.Queue()
+            # Делим ядра между всеми процессами, чтобы они не мешали друг другу
+            partitions = iter(partition_cores(sum(self.replicas.values()), self.threads_per_worker))
+            worker_ids = itertools.count()
+            for model_size, count in self.replicas.items():
+                for _ in range(count):
+                    self._spawn_worker(next(worker_ids), model_size, next(partitions))
+            self._running = True
+            self._collector = threading.Thread(
+                target=self._collect_results, name='model-server-collector', daemon=True
+            )
+            self._collector.start()
+            print(f"Сервер моделей запущен: {self.replicas}")
+
+    def submit(self, model_size, audio, **options):
+        """
+        Отправляет задачу транскрипции наименее загруженному процессу
+
+        Args:
+            model_size (str): Размер модели
+            audio: Путь к файлу или массив аудио 16 кГц
+            **options: Параметры model.transcribe
+
+        Returns:
+            Future: Результат model.transcribe
+        """
+        return self._submit(model_size, 'transcribe', audio, options)
+
+    def submit_detect_language(self, model_size, audio):
+        """Определяет язык по первым 30 секундам (language_detect.detect_language) в процессе модели"""
+        return self._submit(model_size, 'detect_language', audio, {})
+
+    def _submit(self, model_size, method, audio, options):
+        if not self.has_model(model_size):
+            raise ValueError(f"Модель {model_size} не обслуживается сервером моделей")
+        self.start()
+
+        future = Future()
+        with self._lock:
+            candidates = [w for w in self._workers.values() if w.model_size == model_size]
+            if not candidates:
+                raise RuntimeError(f"Нет рабочих процессов для модели {model_size}")
+            worker = min(candidates, key=lambda w: len(w.pending))
+            task_id = next(self._task_ids)
+            worker.pending[task_id] = future
+        worker.task_queue.put((task_id, method, audio, options))
+        return future
+
+    def transcribe(self, model_size, audio, **options):
+        """Синхронная обертка над submit"""
+        return self.submit(model_size, audio, **options).result()
+
+    def ready(self):
+        """Запущены ли все рабочие процессы и загрузили ли они свои модели"""
+        with self._lock:
+            if not self._running:
+                return False
+            loaded = {}
+            for worker in self._workers.values():
+                if worker.ready:
+                    loaded[worker.model_size] = loaded.get(worker.model_size, 0) + 1
+            return all(loaded.get(size, 0) == count for size, count in self.replicas.items())
+
+    def load(self):
+        """Суммарное число задач в работе по каждому размеру модели"""
+        with self._lock:
+            load = {}
+            for worker in self._workers.values():
+                load[worker.model_size] = load.get(worker.model_size, 0) + len(worker.pending)
+            return load
+
+    def shutdown(self):
+        """Останавливает все рабочие процессы"""
+        with self._lock:
+            if not self._running:
+                return
+            self._running = False
+            workers = list(self._workers.values())
+        for worker in workers:
+            worker.task_queue.put(None)
+        for worker in workers:
+            worker.process.join(timeout=10)
+            if worker.process.is_alive():
+                worker.process.terminate()
+
+    def _spawn_worker(self, worker_id, model_size, cpus):
+        worker = _Worker(worker_id, model_size, self._context, self._result_queue, cpus,
+                         self.pin_cpus, self.warmup)
+        worker.process.start()
+        self._workers[worker_id] = worker
+        return worker
+
+    def _collect_results(self):
+        """Разбирает ответы рабочих процессов и завершает соответствующие Future"""
+        while self._running:
+            try:
+                task_id, worker_id, payload = self._result_queue.get(timeout=1.0)
+            except queue.Empty:
+                self._check_workers()
+                continue
+
+            with self._lock:
+                worker = self._workers.get(worker_id)
+                if worker is None:
+                    continue
+                if task_id == 'ready':
+                    worker.ready = True
+                    print(f"Процесс {worker.process.name} загрузил модель")
+                    continue
+                if task_id == 'failed':
+                    # Не перезапускаем: повторная загрузка упадет так же
+                    print(f"Процесс {worker.process.name} не смог загрузить модель: {payload}")
+                    del self._workers[worker_id]
+                    for future in worker.pending.values():
+                        future.set_exception(RuntimeError(f"Не удалось загрузить модель: {payload}"))
+                    continue
+                future = worker.pending.pop(task_id, None)
+
+            if future is None:
+                continue
+            ok, value = payload
+            if ok:
+                future.set_result(value)
+            else:
+                future.set_exception(RuntimeError(value))
+
+    def _check_workers(self):
+        """Перезапускает упавшие процессы, их незавершенные задачи помечает ошибкой"""
+        with self._lock:
+            dead = [w for w in self._workers.values() if not w.process.is_alive()]
+            for worker in dead:
+                print(f"Процесс {worker.process.name} завершился, перезапускаем")
+                for future in worker.pending.values():
+                    future.set_exception(RuntimeError("Процесс модели завершился аварийно"))
+                del self._workers[worker.worker_id]
+                self._spawn_worker(worker.worker_id, worker.model_size, worker.cpus)
@@ -22,8 +22,9 @@ def main():
         print("1. Обработать файл")
         print("2. Запустить веб-интерфейс")
         print("3. Установить зависимости")
+        print("4. Запустить демон (модели остаются в памяти между запусками)")
         
-        choice = input("\nВведите номер (1-3): ").strip()
+        choice = input("\nВведите номер (1-4): ").strip()
         
         if choice == "1":
             audio_file = input("Введите путь к аудиофайлу: ").strip()
@@ -54,6 +55,12 @@ def main():
             print("✅ Зависимости установлены!")
             return
             
+        elif choice == "4":
+            print("\n🚀 Запускаем демон транскрипции...")
+            print("Пока он работает, audio_to_text.py и этот скрипт не загружают модель заново")
+            os.system("python transcription_daemon.py --preload base")
+            return
+            
         else:
             print("❌ Неверный выбор")
             return
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Кэш результатов транскрипции на диске
+
+Ключ - хэш содержимого аудио плюс модель, язык и параметры декодирования,
+поэтому повторная загрузка того же файла не запускает инференс заново.
+Используется и веб-приложением, и командной строкой.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+
+DEFAULT_CACHE_DIR = os.environ.get(
+    'RESULT_CACHE_DIR',
+    os.path.join(os.path.expanduser('~'), '.cache', 'aruunote', 'results')
+)
+DEFAULT_MAX_SIZE_MB = int(os.environ.get('RESULT_CACHE_MAX_MB', 1024))
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def hash_file(path):
+    """Потоково вычисляет SHA-256 файла"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def save_and_hash(stream, output_path):
+    """
+    Сохраняет поток в файл, одновременно вычисляя SHA-256
+
+    Args:
+        stream: Файлоподобный объект (например FileStorage.stream)
+        output_path (str): Куда сохранить данные
+
+    Returns:
+        str: Хэш содержимого
+    """
+    digest = hashlib.sha256()
+    with open(output_path, 'wb') as f:
+        for chunk in iter(lambda: stream.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+            f.write(chunk)
+    return digest.hexdigest()
+
+
+def make_key(audio_hash, model_size, language=None, **options):
+    """Строит ключ кэша из хэша аудио, модели, языка и параметров декодирования"""
+    payload = json.dumps({
+        'audio': audio_hash,
+        'model': model_size,
+        'language': language,
+        'options': options
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class ResultCache:
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_size_mb=DEFAULT_MAX_SIZE_MB):
+        """
+        Инициализация кэша
+
+        Args:
+            cache_dir (str): Папка для хранения результатов
+            max_size_mb (int): Максимальный размер кэша в МБ (0 - без ограничения)
+        """
+        self.cache_dir = cache_dir
+        self.max_size = max_size_mb * 1024 * 1024
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        # Оценка текущего размера; полный обход папки нужен только при превышении лимита
+        self._size = sum(size for _, size, _ in self._scan())
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f'{key}.json')
+
+    def get(self, key):
+        """Возвращает сохраненный результат или None"""
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                result = json.load(f)
+            # Обновляем время доступа для LRU-вытеснения
+            os.utime(path, None)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return result
+
+    def put(self, key, result):
+        """Сохраняет результат (атомарно, безопасно для нескольких процессов)"""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(result, f, ensure_ascii=False)
+            os.replace(temp_path, path)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        with self._lock:
+            self._size += os.path.getsize(path)
+        self._evict_if_needed()
+
+    def _scan(self):
+        """Возвращает записи кэша как (время доступа, размер, путь)"""
+        entries = []
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if not name.endswith('.json'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def _evict_if_needed(self):
+        """Удаляет давно не использованные записи, пока кэш больше лимита"""
+        if not self.max_size:
+            return
+        with self._lock:
+            if self._size <= self.max_size:
+                return
+            entries = self._scan()
+            total = sum(size for _, size, _ in entries)
+            if total <= self.max_size:
+                self._size = total
+                return
+            entries.sort()
+            for _, size, path in entries:
+                if total <= self.max_size:
+                    break
+                try:
+                    os.remove(path)
+                    total -= size
+                except OSError:
+                    pass
+            self._size = total
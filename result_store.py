@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+"""
+Хранилище результатов транскрипции
+
+По умолчанию результаты хранятся в SQLite, поэтому они переживают
+перезапуск и доступны всем рабочим процессам (gunicorn и т.п.).
+Сегменты сохраняются в компактном виде и сжимаются, устаревшие записи
+удаляются по TTL, общее число записей ограничено.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+
+DEFAULT_DB_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'aruunote', 'transcriptions.db')
+
+# Поля сегмента, нужные для показа текста и генерации субтитров
+SEGMENT_FIELDS = ('id', 'start', 'end', 'text', 'words')
+
+
+def compact_segments(segments):
+    """Оставляет в сегментах только нужные поля (без токенов и вероятностей)"""
+    return [
+        {field: segment[field] for field in SEGMENT_FIELDS if field in segment}
+        for segment in segments
+    ]
+
+
+def compact_result(result):
+    """Возвращает компактную копию результата для хранения"""
+    compact = dict(result)
+    compact['segments'] = compact_segments(result.get('segments', []))
+    return compact
+
+
+def _encode(value):
+    return zlib.compress(json.dumps(value, ensure_ascii=False).encode('utf-8'))
+
+
+def _decode(blob):
+    return json.loads(zlib.decompress(blob).decode('utf-8'))
+
+
+def result_meta(result, blob):
+    """
+    Метаданные результата, которые хранятся рядом с ним
+
+    Хэш считается один раз при сохранении по уже сжатым данным, поэтому
+    для ETag не нужно распаковывать и сериализовать результат заново.
+
+    Args:
+        result (dict): Сохраняемый результат
+        blob (bytes): Закодированный результат
+
+    Returns:
+        dict: Версия, признак черновика и хэш содержимого
+    """
+    return {
+        'version': result.get('version', 1),
+        'draft': bool(result.get('draft')),
+        'digest': hashlib.sha1(blob).hexdigest(),
+    }
+
+
+class ResultStore:
+    """Базовый интерфейс хранилища результатов и состояний задач"""
+
+    def put(self, transcription_id, result):
+        raise NotImplementedError
+
+    def get(self, transcription_id):
+        return self.get_with_meta(transcription_id)[0]
+
+    def get_with_meta(self, transcription_id):
+        """Возвращает (результат, метаданные) из одной записи или (None, None)"""
+        raise NotImplementedError
+
+    def get_meta(self, transcription_id):
+        """Возвращает метаданные результата (см. result_meta) без распаковки самого результата"""
+        raise NotImplementedError
+
+    def delete(self, transcription_id):
+        raise NotImplementedError
+
+    def put_status(self, transcription_id, status):
+        raise NotImplementedError
+
+    def get_status(self, transcription_id):
+        raise NotImplementedError
+
+    def purge_expired(self):
+        raise NotImplementedError
+
+    def __contains__(self, transcription_id):
+        return self.get_meta(transcription_id) is not None
+
+
+class MemoryResultStore(ResultStore):
+    def __init__(self, ttl=86400, max_entries=1000):
+        """
+        Хранилище в памяти процесса (для одного рабочего процесса и тестов)
+
+        Args:
+            ttl (float): Время жизни записи в секундах
+            max_entries (int): Максимальное число хранимых результатов
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._results = OrderedDict()
+        self._statuses = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _set(self, table, key, value):
+        with self._lock:
+            table[key] = (time.time() + self.ttl, value)
+            table.move_to_end(key)
+            while len(table) > self.max_entries:
+                table.popitem(last=False)
+
+    def _get(self, table, key):
+        with self._lock:
+            entry = table.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.time():
+                del table[key]
+                return None
+            return value
+
+    def put(self, transcription_id, result):
+        compact = compact_result(result)
+        self._set(self._results, transcription_id, (compact, result_meta(compact, _encode(compact))))
+
+    def get_with_meta(self, transcription_id):
+        return self._get(self._results, transcription_id) or (None, None)
+
+    def get_meta(self, transcription_id):
+        return self.get_with_meta(transcription_id)[1]
+
+    def delete(self, transcription_id):
+        with self._lock:
+            self._results.pop(transcription_id, None)
+            self._statuses.pop(transcription_id, None)
+
+    def put_status(self, transcription_id, status):
+        self._set(self._statuses, transcription_id, dict(status))
+
+    def get_status(self, transcription_id):
+        return self._get(self._statuses, transcription_id)
+
+    def purge_expired(self):
+        now = time.time()
+        with self._lock:
+            for table in (self._results, self._statuses):
+                for key in [k for k, (expires_at, _) in table.items() if expires_at < now]:
+                    del table[key]
+
+
+class SQLiteResultStore(ResultStore):
+    def __init__(self, db_path=DEFAULT_DB_PATH, ttl=86400, max_entries=10000,
+                 purge_interval=300):
+        """
+        Хранилище в SQLite, общее для нескольких процессов
+
+        Args:
+            db_path (str): Путь к файлу базы данных
+            ttl (float): Время жизни записи в секундах
+            max_entries (int): Максимальное число хранимых результатов (и отдельно состояний задач)
+            purge_interval (float): Как часто (в секундах) удалять устаревшие записи
+        """
+        self.db_path = db_path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.purge_interval = purge_interval
+        self._local = threading.local()
+        self._last_purge = 0.0
+
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connection() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS results (
+                    id TEXT PRIMARY KEY,
+                    created_at REAL NOT NULL,
+                    expires_at REAL NOT NULL,
+                    data BLOB NOT NULL,
+                    meta TEXT
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS statuses (
+                    id TEXT PRIMARY KEY,
+                    expires_at REAL NOT NULL,
+                    data TEXT NOT NULL
+                )
+            """)
+            # Базы, созданные до появления метаданных, дополняем столбцом
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(results)")]
+            if 'meta' not in columns:
+                conn.execute("ALTER TABLE results ADD COLUMN meta TEXT")
+            conn.execute("CREATE INDEX IF NOT EXISTS results_created ON results (created_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS statuses_expires ON statuses (expires_at)")
+
+    def _connection(self):
+        """Соединение для текущего потока (sqlite3 не разделяет их между потоками)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def put(self, transcription_id, result):
+        now = time.time()
+        compact = compact_result(result)
+        blob = _encode(compact)
+        with self._connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO results (id, created_at, expires_at, data, meta) VALUES (?, ?, ?, ?, ?)",
+                (transcription_id, now, now + self.ttl, blob, json.dumps(result_meta(compact, blob)))
+            )
+        self._maybe_purge()
+
+    def get_with_meta(self, transcription_id):
+        row = self._connection().execute(
+            "SELECT data, meta FROM results WHERE id = ? AND expires_at >= ?",
+            (transcription_id, time.time())
+        ).fetchone()
+        if row is None:
+            return None, None
+        result = _decode(row[0])
+        meta = json.loads(row[1]) if row[1] else result_meta(result, row[0])
+        return result, meta
+
+    def get_meta(self, transcription_id):
+        row = self._connection().execute(
+            "SELECT meta FROM results WHERE id = ? AND expires_at >= ?",
+            (transcription_id, time.time())
+        ).fetchone()
+        if row is None:
+            return None
+        if row[0]:
+            return json.loads(row[0])
+        # Запись без метаданных (из старой версии базы) - считаем их по данным
+        return self.get_with_meta(transcription_id)[1]
+
+    def delete(self, transcription_id):
+        with self._connection() as conn:
+            conn.execute("DELETE FROM results WHERE id = ?", (transcription_id,))
+            conn.execute("DELETE FROM statuses WHERE id = ?", (transcription_id,))
+
+    def put_status(self, transcription_id, status):
+        with self._connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO statuses (id, expires_at, data) VALUES (?, ?, ?)",
+                (transcription_id, time.time() + self.ttl, json.dumps(status))
+            )
+        # Задачи, завершившиеся ошибкой, не сохраняют результатов, но их состояния тоже удаляются
+        self._maybe_purge()
+
+    def get_status(self, transcription_id):
+        row = self._connection().execute(
+            "SELECT data FROM statuses WHERE id = ? AND expires_at >= ?",
+            (transcription_id, time.time())
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def purge_expired(self):
+        now = time.time()
+        with self._connection() as conn:
+            conn.execute("DELETE FROM results WHERE expires_at < ?", (now,))
+            conn.execute("DELETE FROM statuses WHERE expires_at < ?", (now,))
+            # Ограничиваем общее число результатов, удаляя самые старые
+            conn.execute("""
+                DELETE FROM results WHERE id IN (
+                    SELECT id FROM results ORDER BY created_at DESC LIMIT -1 OFFSET ?
+                )
+            """, (self.max_entries,))
+            # И состояний задач: срок жизни одинаковый, поэтому старые - с наименьшим expires_at
+            conn.execute("""
+                DELETE FROM statuses WHERE id IN (
+                    SELECT id FROM statuses ORDER BY expires_at DESC LIMIT -1 OFFSET ?
+                )
+            """, (self.max_entries,))
+        self._last_purge = now
+
+    def _maybe_purge(self):
+        if time.time() - self._last_purge >= self.purge_interval:
+            self.purge_expired()
+
+
+def create_result_store(backend='sqlite', **kwargs):
+    """
+    Создает хранилище результатов
+
+    Args:
+        backend (str): 'sqlite' или 'memory'
+        **kwargs: Параметры конструктора хранилища
+    """
+    if backend == 'sqlite':
+        return SQLiteResultStore(**kwargs)
+    if backend == 'memory':
+        kwargs.pop('db_path', None)
+        kwargs.pop('purge_interval', None)
+        return MemoryResultStore(**kwargs)
+    raise ValueError(f"Неизвестный тип хранилища: {backend}")
@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+"""
+Полнотекстовый поиск по транскрипциям
+
+Сегменты хранятся в SQLite с индексом FTS5, поэтому поиск фразы по
+десяткам тысяч часов записей не перебирает результаты, а возвращает
+совпадения с ID транскрипции и временем сегмента за миллисекунды.
+Веб-приложение добавляет сегменты по мере их готовности, а файлы
+результатов командной строки индексируются командой rebuild.
+
+Пример:
+    python search_index.py rebuild out/ archive/
+    python search_index.py search "квантовая механика"
+"""
+
+import argparse
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+
+DEFAULT_INDEX_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'aruunote', 'search.db')
+
+# Форматы результатов, из которых берутся сегменты (по убыванию предпочтения)
+INDEXED_FORMATS = ('.json', '.srt', '.vtt', '.tsv', '.txt')
+
+_TIMESTAMP = re.compile(r'(?:(\d+):)?(\d+):(\d+)[,.](\d+)')
+_QUERY_TERM = re.compile(r'"([^"]*)"|(\w+\*?)')
+
+
+def build_query(text):
+    """
+    Переводит строку поиска в запрос FTS5
+
+    Слова ищутся все сразу, текст в кавычках - как фраза, "слово*" - по
+    префиксу. Остальной синтаксис FTS5 не разбирается, поэтому любой ввод
+    дает корректный запрос.
+    """
+    terms = []
+    for phrase, word in _QUERY_TERM.findall(text):
+        if phrase:
+            words = re.findall(r'\w+', phrase)
+            if words:
+                terms.append('"' + ' '.join(words) + '"')
+        elif not word:
+            # Пустые кавычки
+            continue
+        elif word.endswith('*'):
+            terms.append(f'"{word[:-1]}"*')
+        else:
+            terms.append(f'"{word}"')
+    return ' '.join(terms)
+
+
+def parse_timestamp(value):
+    """ЧЧ:ММ:СС,ммм или ММ:СС.ммм (SRT, WebVTT) в секундах"""
+    match = _TIMESTAMP.search(value)
+    if match is None:
+        raise ValueError(f"Неверное время: {value}")
+    hours, minutes, seconds, fraction = match.groups()
+    return int(hours or 0) * 3600 + int(minutes) * 60 + int(seconds) + int(fraction) / 10 ** len(fraction)
+
+
+def read_transcript(path):
+    """
+    Сегменты из файла результата (json, srt, vtt, tsv или txt)
+
+    Returns:
+        list: Сегменты {'start', 'end', 'text'}; у txt один сегмент без времени
+    """
+    ext = os.path.splitext(path)[1].lower()
+    with open(path, encoding='utf-8') as f:
+        if ext == '.json':
+            result = json.load(f)
+            # Рядом с результатами лежат и другие JSON, например batch_summary.json
+            if not isinstance(result, dict) or ('text' not in result and 'segments' not in result):
+                raise ValueError("не результат транскрипции")
+            return [
+                {'start': segment['start'], 'end': segment['end'], 'text': segment['text']}
+                for segment in result.get('segments', [])
+            ] or [{'start': None, 'end': None, 'text': result.get('text', '')}]
+        if ext == '.tsv':
+            lines = f.read().splitlines()[1:]
+            segments = []
+            for line in lines:
+                start, end, text = line.split('\t', 2)
+                segments.append({'start': int(start) / 1000, 'end': int(end) / 1000, 'text': text})
+            return segments
+        if ext in ('.srt', '.vtt'):
+            segments = []
+            for block in re.split(r'\n\s*\n', f.read()):
+                lines = block.strip().splitlines()
+                for i, line in enumerate(lines):
+                    if '-->' in line:
+                        start, end = line.split('-->')
+                        segments.append({
+                            'start': parse_timestamp(start),
+                            'end': parse_timestamp(end),
+                            'text': ' '.join(lines[i + 1:])
+                        })
+                        break
+            return segments
+        return [{'start': None, 'end': None, 'text': f.read()}]
+
+
+def find_transcripts(paths):
+    """
+    Файлы результатов в папках (рекурсивно) и среди указанных путей
+
+    Из нескольких форматов одной транскрипции первым идет файл с временем
+    сегментов (json, затем srt, vtt, tsv и только потом txt); следующие
+    используются, если первый не удалось прочитать.
+
+    Returns:
+        dict: {ID транскрипции (путь без расширения): пути к файлам по убыванию предпочтения}
+    """
+    candidates = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                candidates.extend(os.path.join(root, name) for name in files)
+        else:
+            candidates.append(path)
+    found = {}
+    for path in sorted(set(candidates)):
+        stem, ext = os.path.splitext(os.path.abspath(path))
+        if ext.lower() in INDEXED_FORMATS:
+            found.setdefault(stem, []).append(path)
+    for files in found.values():
+        files.sort(key=lambda path: INDEXED_FORMATS.index(os.path.splitext(path)[1].lower()))
+    return found
+
+
+class SearchIndex:
+    def __init__(self, db_path=DEFAULT_INDEX_PATH, ttl=None, purge_interval=300):
+        """
+        Поисковый индекс сегментов
+
+        Args:
+            db_path (str): Путь к файлу базы данных
+            ttl (float): Время жизни добавленных транскрипций в секундах (None - бессрочно);
+                у веб-приложения совпадает со временем хранения результатов
+            purge_interval (float): Как часто (в секундах) удалять устаревшие транскрипции
+        """
+        self.db_path = db_path
+        self.ttl = ttl
+        self.purge_interval = purge_interval
+        self._local = threading.local()
+        self._last_purge = 0.0
+
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connection() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS transcripts (
+                    id TEXT PRIMARY KEY,
+                    source TEXT,
+                    indexed_at REAL NOT NULL,
+                    expires_at REAL
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS segments (
+                    id INTEGER PRIMARY KEY,
+                    transcription_id TEXT NOT NULL,
+                    start_time REAL,
+                    end_time REAL,
+                    text TEXT NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS segments_transcription ON segments (transcription_id)")
+            # Индекс FTS5 хранит только слова, текст берется из таблицы segments
+            conn.execute("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS segments_fts USING fts5(
+                    text, content='segments', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+                )
+            """)
+            conn.execute("""
+                CREATE TRIGGER IF NOT EXISTS segments_insert AFTER INSERT ON segments BEGIN
+                    INSERT INTO segments_fts (rowid, text) VALUES (new.id, new.text);
+                END
+            """)
+            conn.execute("""
+                CREATE TRIGGER IF NOT EXISTS segments_delete AFTER DELETE ON segments BEGIN
+                    INSERT INTO segments_fts (segments_fts, rowid, text) VALUES ('delete', old.id, old.text);
+                END
+            """)
+
+    def _connection(self):
+        """Соединение для текущего потока (sqlite3 не разделяет их между потоками)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _insert(self, conn, transcription_id, segments, source):
+        now = time.time()
+        conn.execute(
+            "INSERT OR IGNORE INTO transcripts (id, source, indexed_at, expires_at) VALUES (?, ?, ?, ?)",
+            (transcription_id, source, now, now + self.ttl if self.ttl else None)
+        )
+        conn.executemany(
+            "INSERT INTO segments (transcription_id, start_time, end_time, text) VALUES (?, ?, ?, ?)",
+            [
+                (transcription_id, segment.get('start'), segment.get('end'), segment['text'].strip())
+                for segment in segments if segment['text'].strip()
+            ]
+        )
+
+    def add(self, transcription_id, segments, source=None):
+        """Добавляет новые сегменты транскрипции (по мере их готовности)"""
+        with self._connection() as conn:
+            self._insert(conn, transcription_id, segments, source)
+        self._maybe_purge()
+
+    def replace(self, transcription_id, segments, source=None):
+        """Заменяет все сегменты транскрипции (итоговый результат или переиндексация файла)"""
+        with self._connection() as conn:
+            self._delete(conn, transcription_id)
+            self._insert(conn, transcription_id, segments, source)
+        self._maybe_purge()
+
+    def delete(self, transcription_id):
+        with self._connection() as conn:
+            self._delete(conn, transcription_id)
+
+    def _delete(self, conn, transcription_id):
+        conn.execute("DELETE FROM segments WHERE transcription_id = ?", (transcription_id,))
+        conn.execute("DELETE FROM transcripts WHERE id = ?", (transcription_id,))
+
+    def search(self, query, limit=20, offset=0):
+        """
+        Ищет сегменты по словам или фразе (см. build_query)
+
+        Returns:
+            list: Совпадения по убыванию релевантности: transcription_id, start, end,
+                text, snippet (найденные слова в [квадратных скобках]) и source
+        """
+        match = build_query(query)
+        if not match:
+            return []
+        rows = self._connection().execute("""
+            SELECT s.transcription_id, s.start_time, s.end_time, s.text,
+                   snippet(segments_fts, 0, '[', ']', '…', 16), t.source
+            FROM segments_fts
+            JOIN segments s ON s.id = segments_fts.rowid
+            JOIN transcripts t ON t.id = s.transcription_id
+            WHERE segments_fts MATCH ? AND (t.expires_at IS NULL OR t.expires_at >= ?)
+            ORDER BY segments_fts.rank
+            LIMIT ? OFFSET ?
+        """, (match, time.time(), limit, offset)).fetchall()
+        return [
+            {'transcription_id': transcription_id, 'start': start, 'end': end,
+             'text': text, 'snippet': snippet, 'source': source}
+            for transcription_id, start, end, text, snippet, source in rows
+        ]
+
+    def rebuild(self, paths):
+        """
+        Индексирует файлы результатов командной строки заново
+
+        Args:
+            paths (list): Файлы и папки с результатами (txt, srt, vtt, tsv, json)
+
+        Returns:
+            int: Число проиндексированных транскрипций
+        """
+        count = 0
+        with self._connection() as conn:
+            for transcription_id, files in find_transcripts(paths).items():
+                for path in files:
+                    try:
+                        segments = read_transcript(path)
+                    except (OSError, ValueError, KeyError, TypeError) as e:
+                        print(f"Пропущен {path}: {e}")
+                        continue
+                    self._delete(conn, transcription_id)
+                    self._insert(conn, transcription_id, segments, os.path.abspath(path))
+                    count += 1
+                    break
+        return count
+
+    def purge_expired(self):
+        now = time.time()
+        with self._connection() as conn:
+            conn.execute("""
+                DELETE FROM segments WHERE transcription_id IN (
+                    SELECT id FROM transcripts WHERE expires_at < ?
+                )
+            """, (now,))
+            conn.execute("DELETE FROM transcripts WHERE expires_at < ?", (now,))
+        self._last_purge = now
+
+    def _maybe_purge(self):
+        if time.time() - self._last_purge >= self.purge_interval:
+            self.purge_expired()
+
+
+def format_hit(hit):
+    start = '' if hit['start'] is None else f"{hit['start']:.1f}-{hit['end']:.1f} с  "
+    return f"{hit['source'] or hit['transcription_id']}\n    {start}{hit['snippet']}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Полнотекстовый поиск по транскрипциям')
+    parser.add_argument('--db', default=DEFAULT_INDEX_PATH, help='Путь к базе поискового индекса')
+    commands = parser.add_subparsers(dest='command', required=True)
+    rebuild_parser = commands.add_parser('rebuild', help='Проиндексировать файлы результатов')
+    rebuild_parser.add_argument('paths', nargs='+', help='Файлы и папки с результатами')
+    search_parser = commands.add_parser('search', help='Найти фразу')
+    search_parser.add_argument('query', help='Слова, "фраза в кавычках" или префикс*')
+    search_parser.add_argument('-n', '--limit', type=int, default=20, help='Сколько совпадений показать')
+    args = parser.parse_args()
+
+    index = SearchIndex(args.db)
+    started = time.perf_counter()
+    if args.command == 'rebuild':
+        count = index.rebuild(args.paths)
+        print(f"Проиндексировано транскрипций: {count} за {time.perf_counter() - started:.1f} с")
+        return
+    hits = index.search(args.query, args.limit)
+    for hit in hits:
+        print(format_hit(hit))
+    print(f"Найдено: {len(hits)} за {(time.perf_counter() - started) * 1000:.1f} мс")
+
+
+if __name__ == '__main__':
+    main()
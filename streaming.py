@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+Потоковая транскрипция в реальном времени
+
+Клиент присылает аудио порциями (сырые отсчеты 16 кГц моно float32),
+сервер периодически заново декодирует скользящее окно еще не
+подтвержденного аудио. Сегменты, которые закончились достаточно давно,
+считаются окончательными: они фиксируются, а окно сдвигается за них.
+Остальные сегменты возвращаются как предварительные и могут измениться.
+"""
+
+import threading
+import time
+import uuid
+
+import numpy as np
+
+from audio_io import SAMPLE_RATE
+
+
+class StreamingSession:
+    def __init__(self, transcribe, language=None, step_seconds=1.0,
+                 stable_seconds=2.0, max_window_seconds=25.0):
+        """
+        Сессия потоковой транскрипции
+
+        Args:
+            transcribe: Функция transcribe(audio, **options) в формате model.transcribe
+            language (str): Язык аудио (None - определить по первому окну)
+            step_seconds (float): Как часто (по новому аудио) перезапускать декодирование
+            stable_seconds (float): Сегмент, закончившийся раньше конца окна на столько
+                секунд, считается окончательным
+            max_window_seconds (float): Максимальная длина окна; при превышении
+                фиксируется все, кроме последнего сегмента
+        """
+        self.id = str(uuid.uuid4())
+        self.transcribe = transcribe
+        self.language = language
+        self.step = int(step_seconds * SAMPLE_RATE)
+        self.stable_seconds = stable_seconds
+        self.max_window = int(max_window_seconds * SAMPLE_RATE)
+
+        self.segments = []          # окончательные сегменты с глобальным временем
+        self.partial = []           # предварительные сегменты текущего окна
+        self.received = 0           # всего получено отсчетов
+        self.last_activity = time.time()
+        self.closed = False
+
+        self._window = np.zeros(0, dtype=np.float32)
+        self._window_start = 0      # глобальный индекс первого отсчета окна
+        self._decoded_until = 0     # сколько отсчетов окна было при последнем декодировании
+        self._lock = threading.Lock()
+        self._decode_lock = threading.Lock()
+
+    def feed(self, samples):
+        """Добавляет новые отсчеты в окно"""
+        with self._lock:
+            if self.closed:
+                raise ValueError("Сессия уже завершена")
+            self._window = np.concatenate([self._window, samples])
+            self.received += len(samples)
+            self.last_activity = time.time()
+
+    def _decode(self, window, window_start):
+        options = {'condition_on_previous_text': False}
+        if self.language is not None:
+            options['language'] = self.language
+        if self.segments:
+            # Подсказка из уже подтвержденного текста улучшает склейку окон
+            options['initial_prompt'] = ''.join(s['text'] for s in self.segments[-3:])
+        result = self.transcribe(window, **options)
+        if self.language is None:
+            self.language = result.get('language')
+
+        offset = window_start / SAMPLE_RATE
+        segments = []
+        for segment in result.get('segments', []):
+            if not segment['text'].strip():
+                continue
+            segments.append({
+                'start': offset + segment['start'],
+                'end': offset + min(segment['end'], len(window) / SAMPLE_RATE),
+                'text': segment['text']
+            })
+        return segments
+
+    def _commit(self, segments, count, window_start):
+        """Фиксирует первые count сегментов и сдвигает окно за последний из них"""
+        if count <= 0:
+            return []
+        committed = segments[:count]
+        for segment in committed:
+            segment['id'] = len(self.segments)
+            self.segments.append(segment)
+        cut = int(round(committed[-1]['end'] * SAMPLE_RATE)) - window_start
+        with self._lock:
+            cut = max(0, min(cut, len(self._window)))
+            self._window = self._window[cut:]
+            self._window_start += cut
+            self._decoded_until = max(0, self._decoded_until - cut)
+        return committed
+
+    def process(self, force=False):
+        """
+        Декодирует окно, если пришло достаточно нового аудио
+
+        Если декодирование уже идет в другом запросе, сразу возвращает
+        текущее состояние.
+
+        Args:
+            force (bool): Декодировать, даже если нового аудио меньше шага
+
+        Returns:
+            list: Сегменты, ставшие окончательными в этом вызове
+        """
+        if not self._decode_lock.acquire(blocking=False):
+            return []
+        try:
+            with self._lock:
+                window = self._window
+                window_start = self._window_start
+                if len(window) == 0 or \
+                        (not force and len(window) - self._decoded_until < self.step):
+                    return []
+                self._decoded_until = len(window)
+
+            segments = self._decode(window, window_start)
+            window_end = (window_start + len(window)) / SAMPLE_RATE
+
+            # Все сегменты, кроме последнего, которые закончились достаточно давно
+            stable = 0
+            for i, segment in enumerate(segments[:-1]):
+                if segment['end'] <= window_end - self.stable_seconds:
+                    stable = i + 1
+            if len(window) >= self.max_window:
+                if segments:
+                    stable = max(stable, len(segments) - 1, 1)
+                else:
+                    # В окне нет речи - отбрасываем его, оставив хвост на случай начала фразы
+                    with self._lock:
+                        drop = max(0, len(self._window) - self.step)
+                        self._window = self._window[drop:]
+                        self._window_start += drop
+                        self._decoded_until = max(0, self._decoded_until - drop)
+
+            committed = self._commit(segments, stable, window_start)
+            self.partial = segments[stable:]
+            return committed
+        finally:
+            self._decode_lock.release()
+
+    def finish(self):
+        """
+        Завершает сессию: фиксирует все оставшиеся сегменты
+
+        Returns:
+            dict: Результат в формате model.transcribe ('text', 'segments', 'language')
+        """
+        with self._decode_lock:
+            with self._lock:
+                self.closed = True
+                window = self._window
+                window_start = self._window_start
+            if len(window) > 0:
+                segments = self._decode(window, window_start)
+                self._commit(segments, len(segments), window_start)
+            self.partial = []
+        return {
+            'text': ''.join(s['text'] for s in self.segments),
+            'segments': list(self.segments),
+            'language': self.language or 'unknown'
+        }
+
+    def state(self, committed=()):
+        """Состояние сессии для ответа клиенту"""
+        return {
+            'stream_id': self.id,
+            'final': list(committed),
+            'partial': list(self.partial),
+            'committed_seconds': self._window_start / SAMPLE_RATE,
+            'received_seconds': self.received / SAMPLE_RATE,
+            'language': self.language
+        }
+
+
+class StreamingSessions:
+    def __init__(self, max_sessions=8, idle_timeout=120):
+        """
+        Реестр активных потоковых сессий
+
+        Args:
+            max_sessions (int): Максимум одновременных сессий
+            idle_timeout (float): Сессия без новых данных дольше этого (в секундах) удаляется
+        """
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def _prune_idle(self):
+        now = time.time()
+        for session_id in [
+            session_id for session_id, session in self._sessions.items()
+            if now - session.last_activity > self.idle_timeout
+        ]:
+            del self._sessions[session_id]
+
+    def create(self, transcribe, **kwargs):
+        """Создает сессию; ValueError, если достигнут лимит"""
+        with self._lock:
+            self._prune_idle()
+            if len(self._sessions) >= self.max_sessions:
+                raise ValueError(f"Слишком много активных потоков ({self.max_sessions})")
+            session = StreamingSession(transcribe, **kwargs)
+            self._sessions[session.id] = session
+            return session
+
+    def get(self, session_id):
+        with self._lock:
+            self._prune_idle()
+            return self._sessions.get(session_id)
+
+    def remove(self, session_id):
+        with self._lock:
+            return self._sessions.pop(session_id, None)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._sessions)
@@ -0,0 +1,7 @@
+"""Общие настройки тестов: модули проекта лежат в корне репозитория"""
+
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
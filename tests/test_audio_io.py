@@ -0,0 +1,34 @@
+"""Тесты декодирования аудио через ffmpeg"""
+
+import sys
+
+import numpy as np
+import pytest
+
+import audio_io
+from audio_io import AudioDecodeError, AudioTooLongError, decode_audio
+
+
+def fake_ffmpeg(monkeypatch, script):
+    """Подменяет ffmpeg процессом Python с заданным поведением"""
+    monkeypatch.setattr(audio_io, 'ffmpeg_decode_command', lambda path, sr: [sys.executable, '-c', script])
+
+
+def test_decode_audio_survives_large_stderr(monkeypatch):
+    # Сообщений больше, чем вмещает канал: без параллельного чтения stderr процесс зависнет
+    fake_ffmpeg(monkeypatch, "import sys; sys.stderr.write('w' * 1000000); sys.stderr.flush(); "
+                             "sys.stdout.buffer.write(b'\\0' * 400)")
+    audio = decode_audio('input.wav')
+    assert audio.dtype == np.float32 and len(audio) == 100
+
+
+def test_decode_audio_reports_stderr_on_failure(monkeypatch):
+    fake_ffmpeg(monkeypatch, "import sys; sys.stderr.write('e' * 1000000 + 'bad input'); sys.exit(1)")
+    with pytest.raises(AudioDecodeError, match='bad input$'):
+        decode_audio('input.wav')
+
+
+def test_decode_audio_stops_at_max_seconds(monkeypatch):
+    fake_ffmpeg(monkeypatch, "import sys\nwhile True: sys.stdout.buffer.write(b'\\0' * 65536)")
+    with pytest.raises(AudioTooLongError):
+        decode_audio('input.wav', sr=100, max_seconds=10)
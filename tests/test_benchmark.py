@@ -0,0 +1,32 @@
+"""Тесты сводных метрик бенчмарка"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+
+from transcribe_benchmark import percentile, summarize  # noqa: E402
+
+
+def test_percentile_nearest_rank():
+    assert percentile([1, 2], 50) == 1
+    assert percentile([1, 2, 3, 4, 5, 6], 50) == 3
+    assert percentile(list(range(1, 21)), 95) == 19
+    assert percentile(list(range(1, 101)), 95) == 95
+
+
+def test_percentile_edges_and_unsorted_input():
+    assert percentile([], 50) is None
+    assert percentile([7], 95) == 7
+    assert percentile([3, 1, 2], 0) == 1
+    assert percentile([3, 1, 2], 100) == 3
+
+
+def test_summarize_sequential_and_concurrent_runs():
+    sequential = summarize([1.0, 2.0, 3.0, 4.0], duration=10.0)
+    assert sequential['latency_p50'] == 2.0
+    assert sequential['latency_p95'] == 4.0
+    assert sequential['rtf'] == 0.2
+    assert sequential['throughput'] == 4.0
+    # Одновременные клиенты: пропускная способность по общему времени
+    assert summarize([1.0, 2.0, 3.0, 4.0], duration=10.0, wall=5.0)['throughput'] == 8.0
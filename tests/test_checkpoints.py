@@ -0,0 +1,104 @@
+"""Тесты контрольных точек и манифестов задач"""
+
+import os
+
+import numpy as np
+
+from checkpoints import Checkpoint, JobManifests, checkpoint_for
+
+
+def test_checkpoint_round_trip_and_key_check(tmp_path):
+    checkpoint = Checkpoint(str(tmp_path / 'c.json'), 'key')
+    assert checkpoint.load() is None
+    checkpoint.save(16000, [{'start': 0.0, 'end': 1.0, 'text': ' a', 'tokens': [1, 2]}], 'ru', ' a')
+    state = checkpoint.load()
+    assert (state['offset'], state['language'], state['prompt']) == (16000, 'ru', ' a')
+    assert state['segments'][0]['text'] == ' a'
+    # Точка другой задачи не применяется
+    assert Checkpoint(checkpoint.path, 'other').load() is None
+    checkpoint.remove()
+    checkpoint.remove()
+    assert not os.path.exists(checkpoint.path)
+
+
+def test_checkpoint_for_uses_key_as_file_name(tmp_path):
+    assert checkpoint_for('abc', str(tmp_path)).path == str(tmp_path / 'abc.json')
+
+
+def test_corrupt_checkpoint_is_ignored(tmp_path):
+    (tmp_path / 'c.json').write_text('{', encoding='utf-8')
+    assert Checkpoint(str(tmp_path / 'c.json'), 'key').load() is None
+
+
+def test_manifest_moves_uploaded_file(tmp_path):
+    upload = tmp_path / 'upload' / 'talk.mp3'
+    upload.parent.mkdir()
+    upload.write_bytes(b'mp3')
+    manifests = JobManifests(str(tmp_path / 'checkpoints'))
+    path = manifests.create('job', str(upload), model_size='base', cache_key='k', options={})
+    assert path == os.path.join(manifests.job_dir('job'), 'talk.mp3') and not upload.exists()
+    assert manifests.checkpoint('job', 'k') is not None
+    manifests.finish('job')
+    assert not os.path.exists(manifests.job_dir('job'))
+    assert manifests.checkpoint('job', 'k') is None
+
+
+def test_queued_decoded_job_survives_restart(tmp_path):
+    directory = str(tmp_path / 'checkpoints')
+    audio = np.arange(10, dtype=np.float32)
+    manifests = JobManifests(directory)
+    assert manifests.create('job', audio, model_size='base', cache_key='k', options={}) is audio
+    # Перезапуск до того, как рабочий поток взял задачу: массив уже записан в фоне
+    manifests.release('job')
+
+    pending = JobManifests(directory).pending()
+    assert [manifest['job_id'] for manifest in pending] == ['job']
+    assert np.array_equal(pending[0]['audio'], audio)
+    assert pending[0]['resumes'] == 1
+
+
+def test_source_file_is_kept_instead_of_array(tmp_path):
+    source = tmp_path / 'stream.ogg'
+    source.write_bytes(b'ogg')
+    manifests = JobManifests(str(tmp_path / 'checkpoints'))
+    manifests.create('job', np.zeros(4, np.float32), source=str(source), model_size='base',
+                     cache_key='k', options={})
+    assert sorted(os.listdir(manifests.job_dir('job'))) == ['manifest.json', 'stream.ogg']
+    manifests.release('job')
+    pending = JobManifests(str(tmp_path / 'checkpoints')).pending()
+    assert pending[0]['audio'] == os.path.join(manifests.job_dir('job'), 'stream.ogg')
+
+
+def test_job_without_saved_audio_is_dropped(tmp_path):
+    directory = str(tmp_path / 'checkpoints')
+    manifests = JobManifests(directory)
+    manifests.create('job', np.zeros(4, np.float32), model_size='base', cache_key='k', options={})
+    manifests.release('job')
+    # Процесс остановился, не дописав массив
+    os.unlink(os.path.join(manifests.job_dir('job'), 'audio.npy'))
+    assert JobManifests(directory).pending() == []
+    assert not os.path.exists(manifests.job_dir('job'))
+
+
+def test_locked_job_is_not_taken_by_another_process(tmp_path):
+    directory = str(tmp_path / 'checkpoints')
+    owner = JobManifests(directory)
+    owner.create('job', np.zeros(4, np.float32), model_size='base', cache_key='k', options={})
+    assert JobManifests(directory).pending() == []
+    owner.release('job')
+    assert len(JobManifests(directory).pending()) == 1
+
+
+def test_job_is_abandoned_after_max_resumes(tmp_path):
+    directory = str(tmp_path / 'checkpoints')
+    owner = JobManifests(directory)
+    owner.create('job', np.zeros(4, np.float32), model_size='base', cache_key='k', options={})
+    owner.release('job')
+    for attempt in (1, 2):
+        manifests = JobManifests(directory, max_resumes=2)
+        assert [manifest['resumes'] for manifest in manifests.pending()] == [attempt]
+        manifests.release('job')
+    abandoned = []
+    assert JobManifests(directory, max_resumes=2).pending(on_abandoned=abandoned.append) == []
+    assert abandoned == ['job']
+    assert not os.path.exists(os.path.join(directory, 'jobs', 'job'))
@@ -0,0 +1,151 @@
+"""Тесты разрезания длинных записей по паузам и склейки сегментов"""
+
+from concurrent.futures import Future
+
+import numpy as np
+
+from checkpoints import Checkpoint
+from long_audio import (SAMPLE_RATE, find_split_points, split_audio, stitch_segments,
+                        transcribe_incremental, transcribe_long_audio)
+
+
+def bursts(count, sound_seconds=3, pause_seconds=1, seed=0):
+    """Шум длиной sound_seconds, разделенный паузами тишины"""
+    rng = np.random.default_rng(seed)
+    parts = []
+    for _ in range(count):
+        parts.append(rng.normal(0, 0.3, sound_seconds * SAMPLE_RATE))
+        parts.append(np.zeros(pause_seconds * SAMPLE_RATE))
+    return np.concatenate(parts).astype(np.float32)
+
+
+def test_split_points_fall_into_pauses():
+    audio = bursts(10)
+    points = find_split_points(audio, chunk_seconds=8)
+    assert points == sorted(points) and len(points) >= 3
+    for point in points:
+        # Каждая пауза - последняя секунда четырехсекундного периода
+        assert point / SAMPLE_RATE % 4 >= 3
+
+
+def test_short_audio_is_not_split():
+    assert find_split_points(bursts(2), chunk_seconds=60) == []
+    assert find_split_points(np.zeros(0, np.float32), chunk_seconds=1) == []
+
+
+def test_split_audio_covers_recording_with_overlap():
+    audio = bursts(10)
+    spans = split_audio(audio, chunk_seconds=8, overlap_seconds=1.0)
+    assert spans[0][0] == 0 and spans[-1][1] == len(audio)
+    for (_, prev_end), (start, _) in zip(spans[:-1], spans[1:]):
+        assert prev_end - start == 2 * SAMPLE_RATE
+
+
+def segment(start, end, text, words=False):
+    result = {'start': start, 'end': end, 'text': text}
+    if words:
+        result['words'] = [{'start': start, 'end': end, 'word': text}]
+    return result
+
+
+def test_stitch_shifts_segments_and_renumbers():
+    stitched = stitch_segments([
+        (0.0, 5.0, [segment(0.0, 2.0, ' a'), segment(2.0, 5.0, ' b')]),
+        (5.0, 9.0, [segment(0.5, 3.0, ' c', words=True)]),
+    ])
+    assert [(s['start'], s['end'], s['text'], s['id']) for s in stitched] == [
+        (0.0, 2.0, ' a', 0), (2.0, 5.0, ' b', 1), (5.5, 8.0, ' c', 2)
+    ]
+    assert stitched[2]['words'][0]['start'] == 5.5
+
+
+def test_stitch_cuts_overlap_at_midpoint_and_drops_repeated_text():
+    # Куски [0, 11) и [9, 20): граница - исходная точка разреза 10 с
+    stitched = stitch_segments([
+        (0.0, 11.0, [segment(0.0, 6.0, ' один'), segment(6.0, 9.5, ' два'), segment(10.2, 11.0, ' хвост')]),
+        (9.0, 20.0, [segment(0.0, 0.8, ' лишнее'), segment(1.1, 3.0, ' Два'), segment(3.0, 8.0, ' три')]),
+    ])
+    assert [s['text'] for s in stitched] == [' один', ' два', ' три']
+    assert [s['id'] for s in stitched] == [0, 1, 2]
+
+
+def test_stitch_does_not_modify_input():
+    chunk = [segment(1.0, 2.0, ' a')]
+    stitch_segments([(0.0, 5.0, []), (5.0, 9.0, chunk)])
+    assert chunk == [segment(1.0, 2.0, ' a')]
+
+
+class FakeServer:
+    """Пул с интерфейсом ModelServer: по одному сегменту на кусок"""
+
+    def __init__(self, fail_after=None):
+        self.calls = 0
+        self.fail_after = fail_after
+
+    def submit(self, model_size, audio, **options):
+        future = Future()
+        self.calls += 1
+        if self.fail_after is not None and self.calls > self.fail_after:
+            future.set_exception(RuntimeError('процесс завершился'))
+            return future
+        duration = len(audio) / SAMPLE_RATE
+        future.set_result({
+            'segments': [segment(1.0, duration, f' кусок{self.calls}')],
+            'language': options.get('language')
+        })
+        return future
+
+    def submit_detect_language(self, model_size, audio):
+        future = Future()
+        future.set_result({'language': 'ru'})
+        return future
+
+
+def test_long_audio_progress_matches_final_segments():
+    reported = []
+    result = transcribe_long_audio(
+        bursts(10), chunk_seconds=8, model_server=FakeServer(),
+        on_progress=lambda segments, done, total: reported.append((segments, done, total))
+    )
+    assert result['language'] == 'ru'
+    assert [s['text'] for s in result['segments']] == [f' кусок{i}' for i in range(1, 6)]
+    assert [s for segments, _, _ in reported for s in segments] == result['segments']
+    assert reported[-1][1] == reported[-1][2] == 40.0
+
+
+def test_long_audio_resumes_from_checkpoint(tmp_path):
+    audio = bursts(10)
+    checkpoint = Checkpoint(str(tmp_path / 'checkpoint.json'), 'key')
+    try:
+        transcribe_long_audio(audio, chunk_seconds=8, model_server=FakeServer(fail_after=2),
+                              checkpoint=checkpoint)
+    except RuntimeError:
+        pass
+    state = checkpoint.load()
+    assert [s['text'] for s in state['segments']] == [' кусок1', ' кусок2']
+
+    server = FakeServer()
+    result = transcribe_long_audio(audio, chunk_seconds=8, model_server=server, checkpoint=checkpoint)
+    # Повторно транскрибируются только куски после сохраненной точки
+    assert server.calls == 3
+    assert result['segments'][:2] == state['segments']
+    assert [s['id'] for s in result['segments']] == list(range(5))
+
+
+def test_incremental_passes_context_and_resumes(tmp_path):
+    audio = bursts(10)
+    calls = []
+
+    def transcribe(chunk, **options):
+        calls.append(options)
+        return {'segments': [segment(0.0, 1.0, f' {len(calls)}')], 'language': 'ru'}
+
+    checkpoint = Checkpoint(str(tmp_path / 'checkpoint.json'), 'key')
+    first = transcribe_incremental(transcribe, audio, chunk_seconds=8, checkpoint=checkpoint)
+    assert 'initial_prompt' not in calls[0] and calls[1]['initial_prompt'] == ' 1'
+    assert all(options['language'] == 'ru' for options in calls[1:])
+
+    # Вся запись уже обработана: с той же контрольной точкой инференс не нужен
+    calls.clear()
+    second = transcribe_incremental(transcribe, audio, chunk_seconds=8, checkpoint=checkpoint)
+    assert calls == [] and second['segments'] == first['segments']
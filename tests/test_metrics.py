@@ -0,0 +1,79 @@
+"""Тесты метрик Prometheus и замера этапов"""
+
+import time
+
+import pytest
+
+from metrics import Histogram, MetricsRegistry, StageTimer
+
+
+def test_counter_render_with_labels():
+    registry = MetricsRegistry()
+    counter = registry.counter('jobs_total', 'Задачи', labels=('status',))
+    counter.inc(status='done')
+    counter.inc(2, status='done')
+    counter.inc(status='fail"ed')
+    assert registry.render() == (
+        '# HELP jobs_total Задачи\n'
+        '# TYPE jobs_total counter\n'
+        'jobs_total{status="done"} 3\n'
+        'jobs_total{status="fail\\"ed"} 1\n'
+    )
+
+
+def test_labels_must_match_declaration():
+    counter = MetricsRegistry().counter('jobs_total', 'Задачи', labels=('status',))
+    with pytest.raises(ValueError):
+        counter.inc(stage='x')
+
+
+def test_duplicate_metric_name_is_rejected():
+    registry = MetricsRegistry()
+    registry.counter('jobs_total', 'Задачи')
+    with pytest.raises(ValueError):
+        registry.gauge('jobs_total', 'Задачи', lambda: 0)
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram('latency_seconds', 'Задержка', buckets=(0.1, 1))
+    for value in (0.05, 0.5, 0.7, 5):
+        histogram.observe(value)
+    lines = histogram.render()[2:]
+    assert lines == [
+        'latency_seconds_bucket{le="0.1"} 1',
+        'latency_seconds_bucket{le="1"} 3',
+        'latency_seconds_bucket{le="+Inf"} 4',
+        'latency_seconds_sum 6.25',
+        'latency_seconds_count 4',
+    ]
+
+
+def test_gauge_evaluated_on_render_and_errors_skipped():
+    registry = MetricsRegistry()
+    depth = [3]
+    registry.gauge('queue_depth', 'Очередь', lambda: depth[0])
+    registry.gauge('models', 'Модели', lambda: {'base': 1, 'tiny': 0}, labels=('model',))
+    registry.gauge('broken', 'Ошибка', lambda: 1 / 0)
+    depth[0] = 5
+    output = registry.render()
+    assert 'queue_depth 5\n' in output
+    assert 'models{model="base"} 1\n' in output and 'models{model="tiny"} 0\n' in output
+    assert '# TYPE broken gauge\n' in output and '\nbroken ' not in output
+
+
+def test_stage_timer_excludes_nested_stages():
+    histogram = Histogram('stage_seconds', 'Этапы', labels=('stage',))
+    timer = StageTimer(histogram)
+    started = time.perf_counter()
+    with timer.stage('inference'):
+        time.sleep(0.02)
+        with timer.stage('model_acquire'):
+            time.sleep(0.05)
+    total = time.perf_counter() - started
+    assert timer.timings['model_acquire'] >= 0.05 and timer.timings['inference'] >= 0.02
+    # Сумма этапов равна общему времени: вложенный этап не посчитан дважды
+    assert abs(timer.timings['inference'] + timer.timings['model_acquire'] - total) < 0.005
+    timer.record('receive', 0.5)
+    timer.record('receive', 0.25)
+    assert timer.timings['receive'] == 0.75
+    assert 'stage_seconds_count{stage="receive"} 2' in histogram.render()
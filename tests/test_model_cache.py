@@ -0,0 +1,112 @@
+"""Тесты кэша моделей: LRU-вытеснение по бюджету памяти и единственная загрузка"""
+
+import threading
+import time
+
+from model_cache import ModelCache, estimate_footprint_mb
+
+
+def make_cache(budget_mb=None, sizes=None):
+    loads = []
+
+    def loader(name):
+        loads.append(name)
+        return object()
+
+    footprint = (lambda name: sizes[name]) if sizes else estimate_footprint_mb
+    return ModelCache(loader, budget_mb, footprint=footprint), loads
+
+
+def test_estimate_footprint_handles_variants():
+    assert estimate_footprint_mb('base') == 400
+    assert estimate_footprint_mb('base.en') == 400
+    assert estimate_footprint_mb('large-v3') == 7400
+    assert estimate_footprint_mb('small-int8') == 600
+    # Неизвестное имя оценивается как самая большая модель
+    assert estimate_footprint_mb('custom') == 7400
+
+
+def test_hit_returns_same_model_without_reload():
+    cache, loads = make_cache()
+    assert cache.get('tiny') is cache.get('tiny')
+    assert loads == ['tiny']
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['loads']) == (1, 1, 1)
+
+
+def test_evicts_least_recently_used_to_fit_budget():
+    cache, loads = make_cache(budget_mb=250, sizes={'a': 100, 'b': 100, 'c': 100})
+    cache.get('a')
+    cache.get('b')
+    cache.get('a')  # b теперь давно использованная
+    cache.get('c')
+    assert cache.resident_models() == ['a', 'c']
+    assert cache.stats()['evictions'] == 1
+    assert cache.stats()['used_mb'] == 200
+
+
+def test_concurrent_requests_share_one_load():
+    started = threading.Event()
+    release = threading.Event()
+    loads = []
+
+    def loader(name):
+        loads.append(name)
+        started.set()
+        release.wait(5)
+        return object()
+
+    cache = ModelCache(loader)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get('base'))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    started.wait(5)
+    time.sleep(0.05)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert loads == ['base']
+    assert len(results) == 4 and all(model is results[0] for model in results)
+
+
+def test_failed_load_is_reported_and_retried():
+    attempts = []
+
+    def loader(name):
+        attempts.append(name)
+        if len(attempts) == 1:
+            raise RuntimeError('нет файла')
+        return object()
+
+    cache = ModelCache(loader)
+    try:
+        cache.get('base')
+    except RuntimeError:
+        pass
+    else:
+        raise AssertionError('ошибка загрузки не передана')
+    assert cache.get('base') is not None
+    assert cache.stats()['load_failures'] == 1
+
+
+def test_transcriber_serializes_calls_on_one_model():
+    active = []
+    overlaps = []
+
+    class Model:
+        def transcribe(self, audio, **options):
+            active.append(1)
+            overlaps.append(len(active))
+            time.sleep(0.01)
+            active.pop()
+            return {'text': ''}
+
+    cache = ModelCache(lambda name: Model())
+    transcribe = cache.transcriber('base')
+    threads = [threading.Thread(target=transcribe, args=(None,)) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    assert overlaps == [1, 1, 1, 1]
@@ -0,0 +1,60 @@
+"""Тесты ключей и хранения кэша результатов"""
+
+import hashlib
+import io
+import os
+
+from result_cache import ResultCache, hash_file, make_key, save_and_hash
+
+
+def test_make_key_is_stable_and_ignores_option_order():
+    first = make_key('abc', 'base', 'ru', vad=True, word_timestamps=True)
+    second = make_key('abc', 'base', 'ru', word_timestamps=True, vad=True)
+    assert first == second
+    assert len(first) == 64
+
+
+def test_make_key_depends_on_every_component():
+    key = make_key('abc', 'base', 'ru', vad=True)
+    assert make_key('abd', 'base', 'ru', vad=True) != key
+    assert make_key('abc', 'small', 'ru', vad=True) != key
+    assert make_key('abc', 'base', 'en', vad=True) != key
+    assert make_key('abc', 'base', None, vad=True) != key
+    assert make_key('abc', 'base', 'ru') != key
+    assert make_key('abc', 'base', 'ru', vad=False) != key
+
+
+def test_make_key_language_positional_or_keyword():
+    # Веб-приложение передает язык среди параметров, командная строка - позиционно
+    assert make_key('abc', 'base', language='ru', vad=True) == make_key('abc', 'base', 'ru', vad=True)
+
+
+def test_save_and_hash_matches_hash_file(tmp_path):
+    data = os.urandom(3 * 1024 * 1024 + 17)
+    path = tmp_path / 'audio.bin'
+    digest = save_and_hash(io.BytesIO(data), str(path))
+    assert digest == hashlib.sha256(data).hexdigest() == hash_file(str(path))
+    assert path.read_bytes() == data
+
+
+def test_put_get_round_trip(tmp_path):
+    cache = ResultCache(str(tmp_path), max_size_mb=0)
+    key = make_key('abc', 'base')
+    assert cache.get(key) is None
+    cache.put(key, {'text': 'привет', 'segments': []})
+    assert cache.get(key) == {'text': 'привет', 'segments': []}
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_evicts_least_recently_used_over_limit(tmp_path):
+    cache = ResultCache(str(tmp_path), max_size_mb=1)
+    text = 'x' * (400 * 1024)
+    keys = [make_key(str(i), 'base') for i in range(3)]
+    for i, key in enumerate(keys):
+        cache.put(key, {'text': text})
+        # Время доступа различается, даже если файловая система округляет mtime
+        path = cache._path(key)
+        os.utime(path, (1000 + i, 1000 + i))
+    cache.put(make_key('3', 'base'), {'text': text})
+    assert cache.get(keys[0]) is None
+    assert cache.get(make_key('3', 'base')) is not None
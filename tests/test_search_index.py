@@ -0,0 +1,101 @@
+"""Тесты полнотекстового поиска по транскрипциям"""
+
+import json
+import time
+
+import pytest
+
+from search_index import SearchIndex, build_query, find_transcripts, parse_timestamp, read_transcript
+
+
+def test_build_query_words_phrases_and_prefixes():
+    assert build_query('квантовая механика') == '"квантовая" "механика"'
+    assert build_query('"квантовая механика" опыт') == '"квантовая механика" "опыт"'
+    assert build_query('квант*') == '"квант"*'
+
+
+def test_build_query_neutralizes_fts_syntax():
+    assert build_query('a OR b NOT c') == '"a" "OR" "b" "NOT" "c"'
+    assert build_query('(a) AND -b: "c') == '"a" "AND" "b" "c"'
+    assert build_query('"" ,.;') == ''
+
+
+def test_parse_timestamp():
+    assert parse_timestamp('01:02:03,456') == 3723.456
+    assert parse_timestamp('02:03.5') == 123.5
+    with pytest.raises(ValueError):
+        parse_timestamp('нет времени')
+
+
+def test_read_transcript_formats(tmp_path):
+    (tmp_path / 'a.srt').write_text('1\n00:00:01,000 --> 00:00:02,500\nпервый\nсегмент\n\n'
+                                    '2\n00:00:03,000 --> 00:00:04,000\nвторой\n', encoding='utf-8')
+    (tmp_path / 'b.tsv').write_text('start\tend\ttext\n1000\t2500\tпервый\n', encoding='utf-8')
+    (tmp_path / 'c.txt').write_text('просто текст', encoding='utf-8')
+    assert read_transcript(str(tmp_path / 'a.srt')) == [
+        {'start': 1.0, 'end': 2.5, 'text': 'первый сегмент'},
+        {'start': 3.0, 'end': 4.0, 'text': 'второй'},
+    ]
+    assert read_transcript(str(tmp_path / 'b.tsv')) == [{'start': 1.0, 'end': 2.5, 'text': 'первый'}]
+    assert read_transcript(str(tmp_path / 'c.txt')) == [{'start': None, 'end': None, 'text': 'просто текст'}]
+
+
+@pytest.mark.parametrize('content', [[1, 2], 'строка', {'model': 'base', 'files': []}])
+def test_read_transcript_rejects_other_json(tmp_path, content):
+    path = tmp_path / 'other.json'
+    path.write_text(json.dumps(content), encoding='utf-8')
+    with pytest.raises(ValueError):
+        read_transcript(str(path))
+
+
+def test_find_transcripts_orders_formats_by_preference(tmp_path):
+    for name in ('talk.txt', 'talk.srt', 'talk.json', 'notes.md', 'sub/other.vtt'):
+        path = tmp_path / name
+        path.parent.mkdir(exist_ok=True)
+        path.write_text('', encoding='utf-8')
+    found = find_transcripts([str(tmp_path)])
+    assert [p.rsplit('.', 1)[1] for p in found[str(tmp_path / 'talk')]] == ['json', 'srt', 'txt']
+    assert list(found[str(tmp_path / 'sub' / 'other')]) == [str(tmp_path / 'sub' / 'other.vtt')]
+    assert len(found) == 2
+
+
+def test_add_search_replace_delete(tmp_path):
+    index = SearchIndex(str(tmp_path / 'search.db'))
+    index.add('t1', [{'start': 0.0, 'end': 2.0, 'text': ' Квантовая механика и опыт'},
+                     {'start': 2.0, 'end': 4.0, 'text': '   '}])
+    index.add('t2', [{'start': 5.0, 'end': 6.0, 'text': ' механика жидкостей'}])
+    hits = index.search('"квантовая механика"')
+    assert [(hit['transcription_id'], hit['start']) for hit in hits] == [('t1', 0.0)]
+    # Соседние найденные слова выделяются вместе
+    assert hits[0]['snippet'] == '[Квантовая механика] и опыт'
+    assert {hit['transcription_id'] for hit in index.search('механ*')} == {'t1', 't2'}
+
+    index.replace('t1', [{'start': 0.0, 'end': 1.0, 'text': ' другой текст'}])
+    assert index.search('квантовая') == []
+    index.delete('t2')
+    assert index.search('механика') == []
+    assert index.search('""') == []
+
+
+def test_expired_transcripts_are_hidden_and_purged(tmp_path):
+    index = SearchIndex(str(tmp_path / 'search.db'), ttl=0.05)
+    index.add('t1', [{'start': 0.0, 'end': 1.0, 'text': ' временный'}])
+    assert index.search('временный')
+    time.sleep(0.1)
+    assert index.search('временный') == []
+    index.purge_expired()
+    assert index._connection().execute('SELECT COUNT(*) FROM segments').fetchone()[0] == 0
+
+
+def test_rebuild_skips_non_transcripts_and_falls_back(tmp_path):
+    (tmp_path / 'batch_summary.json').write_text(json.dumps({'model': 'base', 'files': []}), encoding='utf-8')
+    (tmp_path / 'list.json').write_text('[1, 2]', encoding='utf-8')
+    (tmp_path / 'lecture.json').write_text('{"foo": 1}', encoding='utf-8')
+    (tmp_path / 'lecture.txt').write_text('квантовая механика', encoding='utf-8')
+    (tmp_path / 'talk.json').write_text(json.dumps({
+        'text': ' привет', 'segments': [{'start': 1.0, 'end': 2.0, 'text': ' привет'}]
+    }), encoding='utf-8')
+    index = SearchIndex(str(tmp_path / 'search.db'))
+    assert index.rebuild([str(tmp_path)]) == 2
+    assert index.search('механика')[0]['source'] == str(tmp_path / 'lecture.txt')
+    assert index.search('привет')[0]['start'] == 1.0
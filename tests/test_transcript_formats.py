@@ -0,0 +1,104 @@
+"""Тесты форматов файлов транскрипции и кэша готовых файлов"""
+
+import copy
+import json
+
+import pytest
+
+from result_store import create_result_store
+from transcript_formats import RenderedCache, format_timestamp, render, transcript_etag
+
+
+RESULT = {
+    'text': ' Привет, мир. Второй\tсегмент.',
+    'language': 'ru',
+    'segments': [
+        {'id': 0, 'start': 0.0, 'end': 1.5, 'text': ' Привет, мир.'},
+        {'id': 1, 'start': 3661.25, 'end': 3662.5, 'text': ' Второй\tсегмент.',
+         'words': [{'word': ' Второй', 'start': 3661.25, 'end': 3661.75, 'probability': 0.9}]},
+    ],
+}
+
+
+def rendered(format, result=RESULT, **kwargs):
+    return b''.join(render(result, format, **kwargs)).decode('utf-8')
+
+
+def test_format_timestamp():
+    assert format_timestamp(0) == '00:00:00,000'
+    assert format_timestamp(3661.25) == '01:01:01,250'
+    assert format_timestamp(59.5, '.') == '00:00:59.500'
+
+
+def test_render_txt_srt_vtt_tsv():
+    assert rendered('txt') == RESULT['text']
+    assert rendered('srt') == (
+        '1\n00:00:00,000 --> 00:00:01,500\nПривет, мир.\n\n'
+        '2\n01:01:01,250 --> 01:01:02,500\nВторой\tсегмент.\n\n'
+    )
+    assert rendered('vtt') == (
+        'WEBVTT\n\n'
+        '00:00:00.000 --> 00:00:01.500\nПривет, мир.\n\n'
+        '01:01:01.250 --> 01:01:02.500\nВторой\tсегмент.\n\n'
+    )
+    assert rendered('tsv') == 'start\tend\ttext\n0\t1500\tПривет, мир.\n3661250\t3662500\tВторой сегмент.\n'
+
+
+def test_render_json_is_valid_and_keeps_words():
+    data = json.loads(rendered('json'))
+    assert data['text'] == RESULT['text'] and data['language'] == 'ru'
+    assert [s['text'] for s in data['segments']] == ['Привет, мир.', 'Второй\tсегмент.']
+    assert 'words' not in data['segments'][0]
+    assert data['segments'][1]['words'] == [{'word': ' Второй', 'start': 3661.25, 'end': 3661.75,
+                                             'probability': 0.9}]
+    assert json.loads(rendered('json', {'text': '', 'segments': []})) == {
+        'text': '', 'language': 'unknown', 'segments': []
+    }
+
+
+def test_render_groups_parts_into_blocks():
+    result = {'text': '', 'segments': [{'start': i, 'end': i + 1, 'text': f' {i}'} for i in range(1000)]}
+    blocks = list(render(result, 'srt', chunk_size=1024))
+    assert len(blocks) > 1 and all(len(block) >= 1024 for block in blocks[:-1])
+    assert b''.join(blocks) == b''.join(render(result, 'srt'))
+
+
+@pytest.mark.parametrize('backend', ['memory', 'sqlite'])
+def test_etag_changes_with_any_part_of_result(backend, tmp_path):
+    store = create_result_store(backend, db_path=str(tmp_path / 'results.db'))
+
+    def etag(result, format='srt'):
+        store.put('id', result)
+        meta = store.get_meta('id')
+        assert store.get_with_meta('id')[1] == meta
+        return transcript_etag('id', format, meta['version'], meta['digest'])
+
+    original = etag(RESULT)
+    assert etag(copy.deepcopy(RESULT)) == original
+    assert etag(RESULT, 'vtt') != original
+    retimed = copy.deepcopy(RESULT)
+    retimed['segments'][0]['end'] = 1.4
+    assert etag(retimed) != original
+    assert etag(dict(RESULT, version=2)) != original
+    assert store.get_meta('id') == dict(store.get_meta('id'), version=2, draft=False)
+    assert store.get_meta('missing') is None
+
+
+def test_rendered_cache_keeps_matching_etag_only():
+    cache = RenderedCache(max_size_mb=1, max_entry_mb=1)
+    assert b''.join(cache.stream('a', 'v1', [b'ab', b'cd'])) == b'abcd'
+    assert cache.get('a', 'v1') == b'abcd'
+    assert cache.get('a', 'v2') is None
+
+
+def test_rendered_cache_skips_large_files_and_evicts_oldest():
+    cache = RenderedCache(max_size_mb=1, max_entry_mb=1)
+    half = b'x' * (512 * 1024)
+    list(cache.stream('big', 'v', [half, half, b'y']))
+    assert cache.get('big', 'v') is None
+    list(cache.stream('a', 'v', [half]))
+    list(cache.stream('b', 'v', [half]))
+    cache.get('a', 'v')
+    list(cache.stream('c', 'v', [half]))
+    assert cache.get('b', 'v') is None
+    assert cache.get('a', 'v') == half and cache.get('c', 'v') == half
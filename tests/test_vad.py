@@ -0,0 +1,87 @@
+"""Тесты поиска речи и переноса времени на шкалу исходной записи"""
+
+import numpy as np
+
+from vad import SAMPLE_RATE, extract_speech, remap_segments, remap_time, speech_regions, transcribe_speech_only
+
+
+def seconds(value):
+    return int(value * SAMPLE_RATE)
+
+
+def with_speech(total, regions, seed=0):
+    """Тишина длиной total секунд с шумом на участках regions (секунды)"""
+    rng = np.random.default_rng(seed)
+    audio = np.zeros(seconds(total), dtype=np.float32)
+    for start, end in regions:
+        audio[seconds(start):seconds(end)] = rng.normal(0, 0.2, seconds(end) - seconds(start))
+    return audio
+
+
+def test_speech_regions_find_bursts_with_padding():
+    regions = speech_regions(with_speech(10, [(1, 3), (6, 7)]))
+    assert len(regions) == 2
+    (first_start, first_end), (second_start, second_end) = regions
+    assert 0.7 <= first_start / SAMPLE_RATE <= 1.0 and 3.0 <= first_end / SAMPLE_RATE <= 3.3
+    assert 5.7 <= second_start / SAMPLE_RATE <= 6.0 and 7.0 <= second_end / SAMPLE_RATE <= 7.3
+
+
+def test_short_pauses_do_not_split_regions():
+    assert len(speech_regions(with_speech(6, [(1, 2), (2.2, 4)]))) == 1
+
+
+def test_silence_has_no_regions():
+    assert speech_regions(np.zeros(seconds(5), dtype=np.float32)) == []
+
+
+def test_extract_speech_builds_time_map():
+    audio = with_speech(10, [(2, 3), (6, 8)])
+    regions = [(seconds(2), seconds(3)), (seconds(6), seconds(8))]
+    speech, mapping = extract_speech(audio, regions, gap_seconds=0.5)
+    assert len(speech) == seconds(3.5)
+    assert np.array_equal(speech[:seconds(1)], audio[seconds(2):seconds(3)])
+    speech_starts, original_starts, lengths = mapping
+    assert list(speech_starts) == [0.0, 1.5]
+    assert list(original_starts) == [2.0, 6.0]
+    assert list(lengths) == [1.0, 2.0]
+
+
+def test_remap_time_inside_regions_and_gaps():
+    mapping = (np.array([0.0, 1.5]), np.array([2.0, 6.0]), np.array([1.0, 2.0]))
+    assert remap_time(0.25, mapping) == 2.25
+    assert remap_time(2.0, mapping) == 6.5
+    # Время во вставленной паузе - конец предыдущего участка
+    assert remap_time(1.2, mapping) == 3.0
+    # Время за концом последнего участка не выходит за него
+    assert remap_time(9.0, mapping) == 8.0
+    assert remap_time(1.5, (np.array([]), np.array([]), np.array([]))) == 1.5
+
+
+def test_remap_segments_copies_segments_and_words():
+    mapping = (np.array([0.0, 1.5]), np.array([2.0, 6.0]), np.array([1.0, 2.0]))
+    segments = [{'start': 0.0, 'end': 1.0, 'text': ' a',
+                 'words': [{'start': 1.5, 'end': 2.5, 'word': ' a'}]}]
+    remapped = remap_segments(segments, mapping)
+    assert (remapped[0]['start'], remapped[0]['end']) == (2.0, 3.0)
+    assert (remapped[0]['words'][0]['start'], remapped[0]['words'][0]['end']) == (6.0, 7.0)
+    assert segments[0]['start'] == 0.0 and segments[0]['words'][0]['start'] == 1.5
+
+
+def test_transcribe_speech_only_returns_original_timeline():
+    audio = with_speech(20, [(10, 12)])
+    received = []
+
+    def transcribe(speech, **options):
+        received.append(len(speech) / SAMPLE_RATE)
+        return {'text': ' a', 'segments': [{'start': 0.5, 'end': 1.5, 'text': ' a'}], 'language': 'ru'}
+
+    result = transcribe_speech_only(transcribe, audio)
+    assert received[0] < 3
+    assert 10.0 <= result['segments'][0]['start'] <= 10.5
+    assert result['speech_seconds'] == received[0]
+
+
+def test_transcribe_speech_only_skips_model_on_silence():
+    result = transcribe_speech_only(lambda speech, **options: 1 / 0, np.zeros(seconds(3), dtype=np.float32),
+                                    language='ru')
+    assert result == {'text': '', 'segments': [], 'language': 'ru', 'speech_seconds': 0.0}
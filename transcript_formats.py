@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Форматы файлов транскрипции
+
+Каждый формат - генератор строк: файл отдается клиенту или пишется на
+диск по частям, без сборки всего текста в одну строку. Используется и
+веб-приложением (/download), и командной строкой (save_transcription).
+"""
+
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+
+def format_timestamp(seconds, decimal_marker=','):
+    """Время в формате ЧЧ:ММ:СС,ммм (для WebVTT - с точкой)"""
+    hours = int(seconds // 3600)
+    minutes = int((seconds % 3600) // 60)
+    secs = int(seconds % 60)
+    millisecs = int((seconds % 1) * 1000)
+    return f"{hours:02d}:{minutes:02d}:{secs:02d}{decimal_marker}{millisecs:03d}"
+
+
+def iter_txt(result):
+    yield result['text']
+
+
+def iter_srt(result):
+    for i, segment in enumerate(result['segments'], 1):
+        start_time = format_timestamp(segment['start'])
+        end_time = format_timestamp(segment['end'])
+        yield f"{i}\n{start_time} --> {end_time}\n{segment['text'].strip()}\n\n"
+
+
+def iter_vtt(result):
+    yield "WEBVTT\n\n"
+    for segment in result['segments']:
+        start_time = format_timestamp(segment['start'], '.')
+        end_time = format_timestamp(segment['end'], '.')
+        yield f"{start_time} --> {end_time}\n{segment['text'].strip()}\n\n"
+
+
+def iter_tsv(result):
+    """Начало и конец в миллисекундах, как в TSV самого Whisper"""
+    yield "start\tend\ttext\n"
+    for segment in result['segments']:
+        text = segment['text'].strip().replace('\t', ' ')
+        yield f"{round(segment['start'] * 1000)}\t{round(segment['end'] * 1000)}\t{text}\n"
+
+
+def iter_json(result):
+    """Текст, язык и сегменты (со словами, если транскрипция их содержит)"""
+    yield '{"text": ' + json.dumps(result['text'], ensure_ascii=False)
+    yield ', "language": ' + json.dumps(result.get('language', 'unknown'))
+    yield ', "segments": ['
+    for i, segment in enumerate(result['segments']):
+        item = {
+            'id': segment.get('id', i),
+            'start': segment['start'],
+            'end': segment['end'],
+            'text': segment['text'].strip()
+        }
+        if segment.get('words'):
+            item['words'] = [
+                {'word': word['word'], 'start': word['start'], 'end': word['end'],
+                 'probability': word.get('probability')}
+                for word in segment['words']
+            ]
+        yield (', ' if i else '') + json.dumps(item, ensure_ascii=False)
+    yield ']}\n'
+
+
+# Формат: (генератор, MIME-тип, нужны ли сегменты)
+FORMATS = {
+    'txt': (iter_txt, 'text/plain', False),
+    'srt': (iter_srt, 'text/plain', True),
+    'vtt': (iter_vtt, 'text/vtt', True),
+    'tsv': (iter_tsv, 'text/tab-separated-values', True),
+    'json': (iter_json, 'application/json', False),
+}
+
+
+def render(result, format, chunk_size=64 * 1024):
+    """
+    Генератор байтов файла транскрипции
+
+    Мелкие строки формата склеиваются в блоки около chunk_size байт,
+    чтобы не отправлять каждый сегмент отдельной записью в сокет.
+    """
+    generate = FORMATS[format][0]
+    buffer = []
+    size = 0
+    for part in generate(result):
+        buffer.append(part)
+        size += len(part)
+        if size >= chunk_size:
+            yield ''.join(buffer).encode('utf-8')
+            buffer = []
+            size = 0
+    if buffer:
+        yield ''.join(buffer).encode('utf-8')
+
+
+def write_transcript(result, path, format):
+    """Записывает транскрипцию в файл по частям"""
+    with open(path, 'wb') as f:
+        for chunk in render(result, format):
+            f.write(chunk)
+
+
+def transcript_etag(transcription_id, format, version, digest):
+    """
+    ETag файла: меняется при любом изменении результата
+
+    Args:
+        transcription_id (str): Идентификатор транскрипции
+        format (str): Формат файла
+        version (int): Версия результата
+        digest (str): Хэш содержимого, сохраненный вместе с результатом
+            (см. result_store.result_meta)
+    """
+    return hashlib.sha1(f"{transcription_id}:{format}:{version}:{digest}".encode()).hexdigest()
+
+
+class RenderedCache:
+    def __init__(self, max_size_mb=64, max_entry_mb=8):
+        """
+        Кэш готовых файлов транскрипций в памяти
+
+        Args:
+            max_size_mb (int): Общий объем кэша в МБ
+            max_entry_mb (int): Файлы больше этого не кэшируются, а только отдаются потоком
+        """
+        self.max_size = max_size_mb * 1024 * 1024
+        self.max_entry = min(max_entry_mb * 1024 * 1024, self.max_size)
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key, etag):
+        """Готовый файл для ключа, если он построен по той же версии результата"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != etag:
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def stream(self, key, etag, chunks):
+        """Отдает блоки chunks и, если файл не слишком большой, сохраняет его в кэш"""
+        parts = []
+        size = 0
+        for chunk in chunks:
+            if parts is not None:
+                size += len(chunk)
+                if size <= self.max_entry:
+                    parts.append(chunk)
+                else:
+                    parts = None
+            yield chunk
+        if parts is not None:
+            self._put(key, etag, b''.join(parts))
+
+    def _put(self, key, etag, content):
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= len(old[1])
+            self._entries[key] = (etag, content)
+            self._size += len(content)
+            while self._size > self.max_size:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._size -= len(evicted)
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+Локальный демон транскрипции
+
+Держит модели Whisper загруженными и принимает задачи через Unix-сокет,
+поэтому скрипты командной строки не тратят секунды на импорт torch и
+загрузку модели при каждом запуске. Клиентская часть (transcribe_via_daemon)
+использует только стандартную библиотеку; если демон не запущен, она
+возвращает None, и скрипт транскрибирует файл сам.
+
+Протокол: одна строка JSON на запрос и одна строка JSON на ответ.
+Аудио не передается через сокет: демон читает файл по пути, поэтому
+работает только на той же машине.
+
+Пример:
+    python transcription_daemon.py --preload base,tiny
+    python audio_to_text.py audio.mp3 base      # использует демон
+    python transcription_daemon.py --status
+"""
+
+import argparse
+import json
+import os
+import signal
+import socket
+import sys
+
+
+DEFAULT_SOCKET = os.environ.get(
+    'ARUUNOTE_DAEMON_SOCKET',
+    os.path.join(os.path.expanduser('~'), '.cache', 'aruunote', 'daemon.sock')
+)
+
+
+class DaemonError(Exception):
+    """Демон не смог выполнить запрос"""
+
+
+def request(message, socket_path=None, timeout=None):
+    """
+    Отправляет запрос демону и возвращает ответ
+
+    Raises:
+        OSError: Демон не запущен (нет сокета или соединение отклонено)
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conn:
+        conn.settimeout(timeout)
+        conn.connect(socket_path or DEFAULT_SOCKET)
+        conn.sendall(json.dumps(message).encode('utf-8') + b'\n')
+        with conn.makefile('rb') as reader:
+            line = reader.readline()
+    if not line:
+        raise DaemonError("Демон закрыл соединение без ответа")
+    return json.loads(line)
+
+
+def transcribe_via_daemon(audio_file_path, model_size='base', socket_path=None, **options):
+    """
+    Транскрибирует файл в запущенном демоне
+
+    Args:
+        audio_file_path (str): Путь к аудиофайлу
+        model_size (str): Модель (можно с суффиксом бэкенда, base-int8)
+        socket_path (str): Путь к сокету демона (по умолчанию DEFAULT_SOCKET)
+        **options: language, vad, word_timestamps
+
+    Returns:
+        dict: 'text', 'segments', 'language', 'duration' или None, если демон не запущен
+
+    Raises:
+        DaemonError: Демон запущен, но транскрипция не удалась
+    """
+    if not hasattr(socket, 'AF_UNIX'):
+        return None
+    message = {
+        'command': 'transcribe',
+        'path': os.path.abspath(audio_file_path),
+        'model': model_size,
+        'options': {name: value for name, value in options.items() if value}
+    }
+    try:
+        response = request(message, socket_path)
+    except (FileNotFoundError, ConnectionRefusedError):
+        return None
+    if not response.get('ok'):
+        raise DaemonError(response.get('error', 'неизвестная ошибка'))
+    return response['result']
+
+
+class TranscriptionDaemon:
+    def __init__(self, socket_path=DEFAULT_SOCKET, idle_timeout=None, memory_budget_mb=None):
+        """
+        Демон с кэшем моделей
+
+        Args:
+            socket_path (str): Путь к Unix-сокету
+            idle_timeout (float): Выгружать модель после стольких секунд простоя
+            memory_budget_mb (int): Бюджет памяти под модели в МБ
+        """
+        import backends
+        from model_cache import ModelCache
+
+        self.socket_path = socket_path
+        # Одна модель обслуживает один запрос за раз (ModelCache.lock)
+        self.model_cache = ModelCache(backends.load_model, memory_budget_mb, idle_timeout)
+
+    def preload(self, model_sizes, warmup=True):
+        from backends import warm_up
+
+        for model_size in model_sizes:
+            model = self.model_cache.get(model_size)
+            if warmup:
+                warm_up(model)
+
+    def handle(self, message):
+        """Выполняет один запрос и возвращает ответ"""
+        command = message.get('command')
+        if command == 'ping':
+            return {'ok': True, 'pid': os.getpid(), 'models': self.model_cache.stats()['resident_models']}
+        if command == 'transcribe':
+            return {'ok': True, 'result': self.transcribe(
+                message['path'], message.get('model', 'base'), **message.get('options', {})
+            )}
+        return {'ok': False, 'error': f"Неизвестная команда: {command}"}
+
+    def transcribe(self, path, model_size, vad=False, **options):
+        from audio_io import SAMPLE_RATE, decode_audio
+        from result_store import compact_segments
+        from vad import transcribe_speech_only
+
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Файл {path} не найден")
+        audio = decode_audio(path)
+        with self.model_cache.lock(model_size):
+            model = self.model_cache.get(model_size)
+            if vad:
+                result = transcribe_speech_only(model.transcribe, audio, **options)
+            else:
+                result = model.transcribe(audio, **options)
+        return {
+            'text': result['text'],
+            'segments': compact_segments(result.get('segments', [])),
+            'language': result.get('language', 'unknown'),
+            'duration': len(audio) / SAMPLE_RATE
+        }
+
+    def serve_forever(self):
+        import socketserver
+
+        daemon = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                line = self.rfile.readline()
+                if not line:
+                    return
+                try:
+                    response = daemon.handle(json.loads(line))
+                except Exception as e:
+                    response = {'ok': False, 'error': str(e)}
+                self.wfile.write(json.dumps(response, ensure_ascii=False).encode('utf-8') + b'\n')
+
+        self.remove_stale_socket()
+        os.makedirs(os.path.dirname(self.socket_path) or '.', exist_ok=True)
+        # Сокет доступен только владельцу: через него читаются любые его файлы
+        old_umask = os.umask(0o177)
+        try:
+            server = socketserver.ThreadingUnixStreamServer(self.socket_path, Handler)
+        finally:
+            os.umask(old_umask)
+        server.daemon_threads = True
+        print(f"Демон транскрипции слушает {self.socket_path} (PID {os.getpid()})")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            print("\nДемон остановлен")
+        finally:
+            server.server_close()
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+
+    def remove_stale_socket(self):
+        """Удаляет сокет, оставшийся от завершившегося демона"""
+        if not os.path.exists(self.socket_path):
+            return
+        try:
+            request({'command': 'ping'}, self.socket_path, timeout=2)
+        except OSError:
+            os.unlink(self.socket_path)
+            return
+        raise RuntimeError(f"Демон уже запущен на {self.socket_path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Демон транскрипции для скриптов командной строки')
+    parser.add_argument('--socket', default=DEFAULT_SOCKET, help='Путь к Unix-сокету')
+    parser.add_argument('--preload', default='',
+                       help='Модели для загрузки при старте через запятую, например base,tiny')
+    parser.add_argument('--no-warmup', action='store_true', help='Не прогревать предзагруженные модели')
+    parser.add_argument('--idle-timeout', type=int, default=0,
+                       help='Выгружать модель после стольких секунд простоя (0 - никогда)')
+    parser.add_argument('--memory-budget-mb', type=int, default=0,
+                       help='Бюджет памяти под модели в МБ (0 - без ограничения)')
+    parser.add_argument('--threads', type=int, default=0,
+                       help='Потоков PyTorch (по умолчанию все ядра)')
+    parser.add_argument('--status', action='store_true', help='Проверить, запущен ли демон')
+    args = parser.parse_args()
+
+    if args.status:
+        try:
+            response = request({'command': 'ping'}, args.socket, timeout=5)
+        except OSError:
+            print(f"Демон не запущен ({args.socket})")
+            sys.exit(1)
+        print(f"Демон запущен, PID {response['pid']}, модели в памяти: {response['models'] or 'нет'}")
+        return
+
+    from cpu_threads import configure_worker, threads_per_worker
+
+    configure_worker(threads_per_worker(1, args.threads))
+    daemon = TranscriptionDaemon(args.socket, args.idle_timeout or None, args.memory_budget_mb or None)
+    try:
+        daemon.remove_stale_socket()
+    except RuntimeError as e:
+        print(e)
+        sys.exit(1)
+    daemon.preload([size.strip() for size in args.preload.split(',') if size.strip()],
+                   warmup=not args.no_warmup)
+    # По SIGTERM выходим через finally в serve_forever и удаляем сокет
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    daemon.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
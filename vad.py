@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Определение участков речи (VAD) перед транскрипцией
+
+Речь ищется по энергии сигнала и числу переходов через ноль в коротких
+кадрах, полностью векторно в NumPy. В модель передаются только участки
+речи, склеенные с короткими паузами, а временные метки результата затем
+переносятся обратно на шкалу исходной записи, поэтому SRT/VTT остаются
+синхронными с оригиналом.
+"""
+
+import numpy as np
+
+from audio_io import SAMPLE_RATE
+
+
+FRAME_SECONDS = 0.03
+
+
+def frame_features(audio, frame_seconds=FRAME_SECONDS):
+    """
+    Энергия (дБ) и доля переходов через ноль для кадров фиксированной длины
+
+    Returns:
+        tuple: (энергия в дБ, доля переходов через ноль) по кадрам
+    """
+    frame = int(frame_seconds * SAMPLE_RATE)
+    n_frames = len(audio) // frame
+    if n_frames == 0:
+        return np.zeros(0, dtype=np.float32), np.zeros(0, dtype=np.float32)
+    frames = audio[:n_frames * frame].reshape(n_frames, frame)
+    energy_db = 10 * np.log10(np.mean(frames * frames, axis=1) + 1e-10)
+    signs = np.signbit(frames)
+    zcr = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / (frame - 1)
+    return energy_db, zcr
+
+
+def _runs(mask):
+    """Границы непрерывных участков True в булевом массиве: пары (начало, конец)"""
+    padded = np.concatenate([[False], mask, [False]])
+    changes = np.flatnonzero(padded[1:] != padded[:-1])
+    return list(zip(changes[::2], changes[1::2]))
+
+
+def speech_regions(audio, threshold_db=12.0, min_speech_seconds=0.25,
+                   min_silence_seconds=0.5, pad_seconds=0.2, frame_seconds=FRAME_SECONDS):
+    """
+    Находит участки речи в записи
+
+    Порог энергии адаптивный: отсчитывается от уровня шума (10-й перцентиль
+    энергии кадров) и ограничен диапазоном -60..-40 дБ, чтобы запись без
+    пауз или с громким фоном не резалась. Тихие кадры с большим числом
+    переходов через ноль (шипящие согласные) тоже считаются речью.
+
+    Args:
+        audio (np.ndarray): Аудио 16 кГц моно float32
+        threshold_db (float): Насколько громче шума должен быть кадр речи
+        min_speech_seconds (float): Более короткие всплески отбрасываются
+        min_silence_seconds (float): Более короткие паузы не разрывают участок
+        pad_seconds (float): Запас вокруг каждого участка
+        frame_seconds (float): Длина кадра анализа
+
+    Returns:
+        list: Пары (начало, конец) в отсчетах, по возрастанию
+    """
+    energy_db, zcr = frame_features(audio, frame_seconds)
+    if len(energy_db) == 0:
+        return [(0, len(audio))] if len(audio) else []
+
+    noise_floor = np.percentile(energy_db, 10)
+    threshold = np.clip(noise_floor + threshold_db, -60.0, -40.0)
+    loud = energy_db > threshold
+    fricative = (energy_db > threshold - threshold_db / 2) & (zcr > 0.3)
+    speech = loud | fricative
+
+    # Закрываем короткие паузы внутри речи
+    min_silence = int(min_silence_seconds / frame_seconds)
+    for start, end in _runs(~speech):
+        if start > 0 and end < len(speech) and end - start < min_silence:
+            speech[start:end] = True
+
+    frame = int(frame_seconds * SAMPLE_RATE)
+    pad = int(pad_seconds * SAMPLE_RATE)
+    min_speech = int(min_speech_seconds / frame_seconds)
+    regions = []
+    for start, end in _runs(speech):
+        if end - start < min_speech:
+            continue
+        start = max(0, int(start) * frame - pad)
+        end = min(len(audio), int(end) * frame + pad)
+        if regions and start <= regions[-1][1]:
+            regions[-1] = (regions[-1][0], end)
+        else:
+            regions.append((start, end))
+    return regions
+
+
+def extract_speech(audio, regions, gap_seconds=0.3):
+    """
+    Склеивает участки речи, разделяя их короткой тишиной
+
+    Returns:
+        tuple: (аудио только с речью, карта времени для remap_segments)
+    """
+    gap = np.zeros(int(gap_seconds * SAMPLE_RATE), dtype=np.float32)
+    pieces = []
+    speech_starts = []
+    original_starts = []
+    lengths = []
+    position = 0
+    for start, end in regions:
+        if pieces:
+            pieces.append(gap)
+            position += len(gap)
+        speech_starts.append(position / SAMPLE_RATE)
+        original_starts.append(start / SAMPLE_RATE)
+        lengths.append((end - start) / SAMPLE_RATE)
+        pieces.append(audio[start:end])
+        position += end - start
+
+    speech = np.concatenate(pieces) if pieces else np.zeros(0, dtype=np.float32)
+    mapping = (np.array(speech_starts), np.array(original_starts), np.array(lengths))
+    return speech, mapping
+
+
+def remap_time(t, mapping):
+    """Переводит время на склеенной записи во время исходной записи"""
+    speech_starts, original_starts, lengths = mapping
+    if len(speech_starts) == 0:
+        return t
+    i = max(0, int(np.searchsorted(speech_starts, t, side='right')) - 1)
+    # Время внутри вставленной паузы относится к концу предыдущего участка
+    return float(original_starts[i] + min(max(t - speech_starts[i], 0.0), lengths[i]))
+
+
+def remap_segments(segments, mapping):
+    """Возвращает копии сегментов (и слов) с временем исходной записи"""
+    remapped = []
+    for segment in segments:
+        segment = dict(segment)
+        segment['start'] = remap_time(segment['start'], mapping)
+        segment['end'] = remap_time(segment['end'], mapping)
+        if 'words' in segment:
+            segment['words'] = [
+                dict(word, start=remap_time(word['start'], mapping), end=remap_time(word['end'], mapping))
+                for word in segment['words']
+            ]
+        remapped.append(segment)
+    return remapped
+
+
+def transcribe_speech_only(transcribe, audio, on_progress=None, **options):
+    """
+    Транскрибирует только участки речи
+
+    Args:
+        transcribe: Функция transcribe(audio, **options) в формате model.transcribe
+        audio (np.ndarray): Аудио 16 кГц моно float32
+        on_progress (callable): Если указан, передается в transcribe, а его
+            сегменты и обработанные секунды переводятся на шкалу исходной записи
+        **options: Параметры transcribe
+
+    Returns:
+        dict: Результат transcribe с временем исходной записи и
+            дополнительным полем 'speech_seconds'
+    """
+    regions = speech_regions(audio)
+    speech, mapping = extract_speech(audio, regions)
+    total = len(audio) / SAMPLE_RATE
+    print(f"VAD: речь {len(speech) / SAMPLE_RATE:.1f} с из {total:.1f} с")
+    if len(speech) == 0:
+        return {'text': '', 'segments': [], 'language': options.get('language') or 'unknown',
+                'speech_seconds': 0.0}
+
+    if on_progress is not None:
+        options['on_progress'] = lambda segments, decoded_seconds, speech_seconds: on_progress(
+            remap_segments(segments, mapping), remap_time(decoded_seconds, mapping), total
+        )
+    result = dict(transcribe(speech, **options))
+    result['segments'] = remap_segments(result.get('segments', []), mapping)
+    result['speech_seconds'] = len(speech) / SAMPLE_RATE
+    return result